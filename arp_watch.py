@@ -0,0 +1,357 @@
+"""Continuous ARP spoofing watcher based on the kernel neighbour table.
+
+On Linux the watcher subscribes to rtnetlink neighbour events, so it only
+wakes up when the kernel learns or changes an entry, and re-reads
+``/proc/net/arp`` every ``resync`` seconds to catch anything missed.
+Without netlink it falls back to polling ``/proc/net/arp``.
+
+Each IP keeps a short history of the MACs it resolved to. Alerts are raised
+when an IP changes MAC (``mac_change``), when that IP is a default gateway
+(``gateway_impersonation``) and when one MAC answers for many IPs
+(``mac_many_ips``).
+"""
+from __future__ import annotations
+
+import select
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import metrics
+from netlink import NDA_DST, NDA_LLADDR, NDMSG, NLMSGHDR, NUD_VALID, RTATTR, RTM_NEWNEIGH, RTMGRP_NEIGH
+
+PROC_ARP = "/proc/net/arp"
+PROC_ROUTE = "/proc/net/route"
+
+# MAC changes remembered per IP
+HISTORY_PER_IP = 8
+# IPs tracked at once; the least recently seen are forgotten first
+MAX_TRACKED_IPS = 4096
+# Alerts kept for the API
+MAX_ALERTS = 256
+# A MAC answering for more IPs than this is reported
+MANY_IPS_THRESHOLD = 8
+# Seconds a binding still counts towards MANY_IPS_THRESHOLD after it was last seen
+BINDING_TTL = 900.0
+# Seconds between full re-reads of the neighbour table
+RESYNC_INTERVAL = 60.0
+# Seconds between polls when netlink is not available
+POLL_INTERVAL = 5.0
+
+_ZERO_MAC = "00:00:00:00:00:00"
+
+
+@dataclass(slots=True)
+class ArpAlert:
+    kind: str
+    ip: str
+    mac: str
+    time: float
+    previous_mac: Optional[str] = None
+    details: str = ""
+
+
+def _format_mac(raw: bytes) -> str:
+    return ":".join(f"{b:02x}" for b in raw)
+
+
+def read_proc_arp(path: str = PROC_ARP) -> Dict[str, str]:
+    """Return complete entries of ``/proc/net/arp`` as ``{ip: mac}``."""
+    table: Dict[str, str] = {}
+    try:
+        with open(path, encoding="ascii", errors="replace") as fh:
+            next(fh, None)
+            for line in fh:
+                fields = line.split()
+                if len(fields) < 4:
+                    continue
+                ip, _, flags, mac = fields[:4]
+                # ATF_COM (0x2) marks a completed entry
+                if not int(flags, 16) & 0x2 or mac == _ZERO_MAC:
+                    continue
+                table[ip] = mac.lower()
+    except (OSError, ValueError):
+        return table
+    return table
+
+
+def default_gateways(path: str = PROC_ROUTE) -> Set[str]:
+    """Return IPv4 default gateways from ``/proc/net/route``."""
+    gateways: Set[str] = set()
+    try:
+        with open(path, encoding="ascii") as fh:
+            next(fh, None)
+            for line in fh:
+                fields = line.split()
+                if len(fields) < 3 or fields[1] != "00000000":
+                    continue
+                gw = socket.inet_ntoa(struct.pack("<I", int(fields[2], 16)))
+                if gw != "0.0.0.0":
+                    gateways.add(gw)
+    except (OSError, ValueError):
+        pass
+    return gateways
+
+
+def parse_neigh_messages(data: bytes) -> Iterator[Tuple[str, str]]:
+    """Yield IPv4 ``(ip, mac)`` from rtnetlink ``RTM_NEWNEIGH`` messages in ``data``.
+
+    IPv6 neighbours are skipped, matching ``/proc/net/arp`` used by
+    :meth:`ArpWatcher.sync`.
+    """
+    for ip, mac, state in parse_neigh_states(data, socket.AF_INET):
+        if state & NUD_VALID:
+            yield ip, mac
+
+
+def parse_neigh_states(data: bytes, family: Optional[int] = None) -> Iterator[Tuple[str, str, int]]:
+    """Yield ``(ip, mac, nud_state)`` for every neighbour with a MAC in ``data``.
+
+    Only neighbours of address ``family`` are returned when it is given.
+    """
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        end = offset + length
+        body = offset + NLMSGHDR.size
+        if msg_type == RTM_NEWNEIGH and body + NDMSG.size <= end:
+            entry_family, _, state, _, _ = NDMSG.unpack_from(data, body)
+            attrs: Dict[int, bytes] = {}
+            pos = body + NDMSG.size
+            while pos + RTATTR.size <= end:
+                alen, atype = RTATTR.unpack_from(data, pos)
+                if alen < RTATTR.size:
+                    break
+                attrs[atype] = data[pos + RTATTR.size:pos + alen]
+                pos += (alen + 3) & ~3
+            dst, lladdr = attrs.get(NDA_DST), attrs.get(NDA_LLADDR)
+            if dst and lladdr and len(lladdr) == 6 and family in (None, entry_family):
+                try:
+                    ip = socket.inet_ntop(entry_family, dst)
+                except (OSError, ValueError):
+                    ip = None
+                mac = _format_mac(lladdr)
+                if ip and mac != _ZERO_MAC:
+                    yield ip, mac, state
+        offset += (length + 3) & ~3
+
+
+def _open_netlink() -> Optional[socket.socket]:
+    if not hasattr(socket, "AF_NETLINK"):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_NEIGH))
+    except OSError:
+        return None
+    sock.setblocking(False)
+    return sock
+
+
+class ArpWatcher:
+    """Track IP→MAC bindings and raise alerts on suspicious changes.
+
+    All state is bounded: ``history`` entries per IP, ``max_ips`` IPs
+    (least recently seen evicted) and ``max_alerts`` alerts. Bindings not
+    seen for ``binding_ttl`` seconds no longer count towards the IPs of a
+    MAC, so address churn of one host does not look like spoofing.
+    """
+
+    def __init__(
+        self,
+        *,
+        gateways: Optional[Set[str]] = None,
+        history: int = HISTORY_PER_IP,
+        max_ips: int = MAX_TRACKED_IPS,
+        max_alerts: int = MAX_ALERTS,
+        many_ips_threshold: int = MANY_IPS_THRESHOLD,
+        binding_ttl: float = BINDING_TTL,
+        proc_path: str = PROC_ARP,
+    ) -> None:
+        self._fixed_gateways = gateways
+        self.gateways: Set[str] = set(gateways) if gateways is not None else default_gateways()
+        self.history_len = history
+        self.max_ips = max_ips
+        self.many_ips_threshold = many_ips_threshold
+        self.binding_ttl = binding_ttl
+        self.proc_path = proc_path
+        self.alerts: Deque[ArpAlert] = deque(maxlen=max_alerts)
+        self.alert_count = 0
+        # ip -> [[mac, first_seen, last_seen], ...] oldest first
+        self._history: "OrderedDict[str, Deque[List[Any]]]" = OrderedDict()
+        self._ips_by_mac: Dict[str, Set[str]] = {}
+        self._flagged_macs: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _alert(self, alert: ArpAlert) -> ArpAlert:
+        self.alerts.append(alert)
+        self.alert_count += 1
+        metrics.ARP_ALERTS.inc(kind=alert.kind)
+        return alert
+
+    def _forget(self, ip: str) -> None:
+        entries = self._history.pop(ip)
+        ips = self._ips_by_mac.get(entries[-1][0])
+        if ips is not None:
+            ips.discard(ip)
+            if not ips:
+                del self._ips_by_mac[entries[-1][0]]
+
+    def _expire(self, mac: str, ips: Set[str], now: float) -> None:
+        for other in list(ips):
+            entries = self._history.get(other)
+            if entries is None or now - entries[-1][2] > self.binding_ttl:
+                ips.discard(other)
+        if len(ips) <= self.many_ips_threshold:
+            self._flagged_macs.discard(mac)
+
+    def observe(self, ip: str, mac: str, when: Optional[float] = None) -> List[ArpAlert]:
+        """Record that ``ip`` resolves to ``mac`` and return new alerts."""
+        when = time.time() if when is None else when
+        mac = mac.lower()
+        raised: List[ArpAlert] = []
+        with self._lock:
+            entries = self._history.get(ip)
+            if entries is None:
+                entries = deque(maxlen=self.history_len)
+                self._history[ip] = entries
+                while len(self._history) > self.max_ips:
+                    self._forget(next(iter(self._history)))
+            else:
+                self._history.move_to_end(ip)
+            previous = entries[-1][0] if entries else None
+            if previous == mac:
+                entries[-1][2] = when
+                ips = self._ips_by_mac.setdefault(mac, set())
+                if ip in ips:
+                    return raised
+                # the binding had expired and is counted again
+                ips.add(ip)
+            else:
+                entries.append([mac, when, when])
+                if previous is not None:
+                    old = self._ips_by_mac.get(previous)
+                    if old is not None:
+                        old.discard(ip)
+                        if not old:
+                            del self._ips_by_mac[previous]
+                        if len(old) <= self.many_ips_threshold:
+                            self._flagged_macs.discard(previous)
+                ips = self._ips_by_mac.setdefault(mac, set())
+                ips.add(ip)
+
+            if previous is not None and previous != mac:
+                if ip in self.gateways:
+                    others = sorted(ips - {ip})
+                    details = f"gateway {ip} moved from {previous} to {mac}"
+                    if others:
+                        details += f" (also used by {', '.join(others)})"
+                    raised.append(self._alert(ArpAlert("gateway_impersonation", ip, mac, when, previous, details)))
+                else:
+                    raised.append(
+                        self._alert(ArpAlert("mac_change", ip, mac, when, previous, f"{ip} moved from {previous} to {mac}"))
+                    )
+            self._expire(mac, ips, when)
+            if len(ips) > self.many_ips_threshold and mac not in self._flagged_macs:
+                self._flagged_macs.add(mac)
+                raised.append(
+                    self._alert(ArpAlert("mac_many_ips", ip, mac, when, None, f"{mac} answers for {len(ips)} IPs"))
+                )
+        return raised
+
+    def sync(self) -> List[ArpAlert]:
+        """Re-read the neighbour table (and gateways) and observe every entry."""
+        if self._fixed_gateways is None:
+            self.gateways = default_gateways()
+        raised: List[ArpAlert] = []
+        for ip, mac in read_proc_arp(self.proc_path).items():
+            raised.extend(self.observe(ip, mac))
+        return raised
+
+    def table(self) -> Dict[str, str]:
+        """Return the current ``{ip: mac}`` bindings."""
+        with self._lock:
+            return {ip: entries[-1][0] for ip, entries in self._history.items()}
+
+    def history(self, ip: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"mac": mac, "first_seen": first, "last_seen": last}
+                for mac, first, last in self._history.get(ip, ())
+            ]
+
+    def alert_dicts(self) -> List[Dict[str, Any]]:
+        return [asdict(a) for a in list(self.alerts)]
+
+    def run(
+        self,
+        stop: threading.Event,
+        *,
+        resync: float = RESYNC_INTERVAL,
+        poll_interval: float = POLL_INTERVAL,
+    ) -> None:
+        """Watch until ``stop`` is set."""
+        sock = _open_netlink()
+        try:
+            self.sync()
+            last_sync = time.monotonic()
+            while not stop.is_set():
+                if sock is None:
+                    if stop.wait(poll_interval):
+                        break
+                    self.sync()
+                    continue
+                # Wake at least once a second so that stop is honoured promptly
+                readable, _, _ = select.select([sock], [], [], min(1.0, resync))
+                if readable:
+                    try:
+                        data = sock.recv(65536)
+                    except (BlockingIOError, InterruptedError):
+                        data = b""
+                    except OSError:
+                        # e.g. ENOBUFS after an event burst: resync below
+                        data = b""
+                        last_sync = 0.0
+                    for ip, mac in parse_neigh_messages(data):
+                        self.observe(ip, mac)
+                if time.monotonic() - last_sync >= resync:
+                    self.sync()
+                    last_sync = time.monotonic()
+        finally:
+            if sock is not None:
+                sock.close()
+
+    def start(self, stop: threading.Event, **kwargs: Any) -> threading.Thread:
+        thread = threading.Thread(target=self.run, args=(stop,), kwargs=kwargs, name="arp-watch", daemon=True)
+        thread.start()
+        return thread
+
+
+def main() -> None:
+    import json
+
+    watcher = ArpWatcher()
+    stop = threading.Event()
+    print(f"watching neighbour table (gateways: {', '.join(sorted(watcher.gateways)) or 'none'})", flush=True)
+    printed = 0
+    thread = watcher.start(stop)
+    try:
+        while thread.is_alive():
+            thread.join(1.0)
+            new = min(watcher.alert_count - printed, len(watcher.alerts))
+            for alert in watcher.alert_dicts()[len(watcher.alerts) - new:]:
+                print(json.dumps(alert), flush=True)
+            printed = watcher.alert_count
+    except KeyboardInterrupt:
+        stop.set()
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the pure-Python hot paths.
+
+Covers nmap XML parsing (``port_scan._parse_scan_xml`` used by ``run_scan``
+and ``network_utils._parse_discovery_xml`` used by ``_run_nmap_scan``),
+``parse_arp_table``, ``parse_netbios_output``, ``calc_security_score``,
+``calc_utm_items``, ``generate_html`` and ``generate_csv_rows``. Fixtures are
+generated in memory at increasing sizes. Each case reports operations per
+second and the peak traced memory of a single call.
+
+Results can be stored as a JSON baseline and later runs compared against it:
+
+    python benchmarks/bench_micro.py --save benchmarks/micro_baseline.json
+    python benchmarks/bench_micro.py --compare benchmarks/micro_baseline.json
+    python benchmarks/bench_micro.py --full --filter scan_xml   # up to 50 MB XML
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Iterator, NamedTuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from generate_html_report import generate_csv_rows, generate_html  # noqa: E402
+from lan_security_check import parse_arp_table, parse_netbios_output  # noqa: E402
+from network_utils import _parse_discovery_xml  # noqa: E402
+from port_scan import _parse_scan_xml  # noqa: E402
+from report_utils import calc_utm_items  # noqa: E402
+from security_score import calc_security_score  # noqa: E402
+
+SERVICES = ["ssh", "http", "https", "microsoft-ds", "ms-wbt-server", "telnet"]
+COUNTRIES = ["JP", "US", "CN", "DE", "RU", "BR"]
+
+
+class Case(NamedTuple):
+    name: str
+    size: str
+    setup: Callable[[], Any]
+    run: Callable[[Any], Any]
+
+
+def _ip(i: int) -> str:
+    return f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+
+
+def scan_xml(target_bytes: int) -> str:
+    """nmap ``-oX`` port scan output of roughly ``target_bytes`` bytes."""
+    port_tpl = (
+        '<port protocol="tcp" portid="{p}"><state state="{st}" reason="syn-ack"/>'
+        '<service name="{svc}" product="Prod" version="1.{p}" method="probed"/></port>\n'
+    )
+    parts = ['<?xml version="1.0"?>\n<nmaprun>\n']
+    size = 0
+    host = 0
+    while size < target_bytes:
+        chunk = [f'<host><status state="up"/><address addr="{_ip(host)}" addrtype="ipv4"/><ports>\n']
+        for p in range(1, 201):
+            chunk.append(port_tpl.format(p=p, st="open" if p % 7 == 0 else "closed", svc=SERVICES[p % 6]))
+        chunk.append('</ports><os><osmatch name="Linux 5.4" accuracy="96"/></os></host>\n')
+        text = "".join(chunk)
+        parts.append(text)
+        size += len(text)
+        host += 1
+    parts.append("</nmaprun>\n")
+    return "".join(parts)
+
+
+def discovery_xml(hosts: int) -> str:
+    rows = [
+        f'<host><status state="up"/><address addr="{_ip(i)}" addrtype="ipv4"/>'
+        f'<address addr="02:00:00:{i >> 16 & 255:02X}:{i >> 8 & 255:02X}:{i & 255:02X}" addrtype="mac" vendor="Acme"/>'
+        f'<hostnames><hostname name="host{i}.lan"/></hostnames></host>'
+        for i in range(hosts)
+    ]
+    return "<nmaprun>" + "".join(rows) + "</nmaprun>"
+
+
+def arp_table(rows: int) -> str:
+    lines = ["Interface: 10.0.0.2 --- 0x3", "  Internet Address      Physical Address      Type"]
+    lines += [
+        f"  {_ip(i):<20}  02-00-00-{i >> 16 & 255:02x}-{i >> 8 & 255:02x}-{i & 255:02x}     dynamic"
+        for i in range(rows)
+    ]
+    return "\n".join(lines)
+
+
+def netbios_grepable(hosts: int) -> str:
+    lines = ["# Nmap 7.94 scan initiated"]
+    for i in range(hosts):
+        lines.append(f"Host: {_ip(i)} ()\tStatus: Up")
+        state = "open" if i % 3 == 0 else "closed"
+        lines.append(f"Host: {_ip(i)} ()\tPorts: 139/{state}/tcp//netbios-ssn///, 445/{state}/tcp//microsoft-ds///")
+    return "\n".join(lines)
+
+
+def devices(count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "ip": _ip(i),
+            "mac": f"02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+            "vendor": "Acme",
+            "open_ports": [str(p) for p in (22, 80, 443, 445, 3389)[: i % 5 + 1]],
+            "communications": [{"ip": "8.8.8.8", "domain": "dns.google", "country": COUNTRIES[i % 6]}],
+        }
+        for i in range(count)
+    ]
+
+
+def score_inputs(count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "danger_ports": ["3389"] if i % 4 == 0 else [],
+            "geoip": COUNTRIES[i % 6],
+            "ssl": "invalid" if i % 5 == 0 else "valid",
+            "open_port_count": i % 20,
+            "dns_fail_rate": (i % 10) / 10,
+            "upnp": i % 2 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+MB = 1024 * 1024
+
+
+def cases(full: bool) -> Iterator[Case]:
+    xml_sizes = [("100KB", 100 * 1024), ("1MB", MB), ("10MB", 10 * MB)]
+    if full:
+        xml_sizes.append(("50MB", 50 * MB))
+    for label, size in xml_sizes:
+        yield Case("scan_xml", label, lambda size=size: scan_xml(size), lambda x: _parse_scan_xml(x, True))
+    for n in (100, 1000, 10000):
+        yield Case("discovery_xml", str(n), lambda n=n: discovery_xml(n), _parse_discovery_xml)
+        yield Case("parse_arp_table", str(n), lambda n=n: arp_table(n), parse_arp_table)
+        yield Case("parse_netbios_output", str(n), lambda n=n: netbios_grepable(n), parse_netbios_output)
+    yield Case(
+        "calc_security_score", "1000", lambda: score_inputs(1000),
+        lambda items: [calc_security_score(d) for d in items],
+    )
+    yield Case(
+        "calc_utm_items", "1000", lambda: score_inputs(1000),
+        lambda items: [calc_utm_items(i % 11, ["22"], [d["geoip"]]) for i, d in enumerate(items)],
+    )
+    dev_sizes = [100, 1000, 10000] + ([100000] if full else [])
+    for n in dev_sizes:
+        yield Case("generate_html", str(n), lambda n=n: devices(n), generate_html)
+        yield Case("generate_csv_rows", str(n), lambda n=n: devices(n), generate_csv_rows)
+
+
+def measure(case: Case, min_time: float) -> dict[str, float]:
+    data = case.setup()
+    # Peak memory of one call
+    gc.collect()
+    tracemalloc.start()
+    case.run(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Throughput: repeat until min_time has elapsed (at least 3 rounds)
+    rounds = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while rounds < 3 or elapsed < min_time:
+        case.run(data)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+    return {"ops_per_sec": round(rounds / elapsed, 3), "peak_kb": round(peak / 1024, 1)}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    problems = []
+    for key, res in results.items():
+        ref = baseline.get(key)
+        if not ref:
+            continue
+        if res["ops_per_sec"] < ref["ops_per_sec"] * (1 - tolerance):
+            problems.append(f"{key}: {res['ops_per_sec']} ops/s < {ref['ops_per_sec']} (-{tolerance:.0%})")
+        if res["peak_kb"] > ref["peak_kb"] * (1 + tolerance):
+            problems.append(f"{key}: {res['peak_kb']} KB > {ref['peak_kb']} KB (+{tolerance:.0%})")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for parsers, scoring and reports")
+    parser.add_argument("--full", action="store_true", help="Include 50 MB XML and 100k devices")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds spent per case")
+    parser.add_argument("--save", help="Write results to this baseline file")
+    parser.add_argument("--compare", help="Compare results with this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+
+    results: dict[str, dict[str, float]] = {}
+    for case in cases(args.full):
+        if args.filter and args.filter not in case.name:
+            continue
+        key = f"{case.name}[{case.size}]"
+        results[key] = measure(case, args.min_time)
+        print(f"{key:<32} {results[key]['ops_per_sec']:>12.2f} ops/s {results[key]['peak_kb']:>12.1f} KB", flush=True)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        problems = compare(results, baseline, args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
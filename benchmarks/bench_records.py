@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Compare memory use of dict and slotted scan result representations.
+
+Builds ``--hosts`` scanned hosts with ``--ports`` ports each, once as the
+plain dictionaries produced by ``scan_hosts`` and once as
+:class:`scan_records.Host` records, and reports the traced allocation size of
+each.
+
+    python benchmarks/bench_records.py --hosts 5000 --ports 200
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from scan_records import Host, PortResult  # noqa: E402
+
+STATES = ["open", "closed", "filtered"]
+SERVICES = ["ssh", "http", "https", "microsoft-ds", "ms-wbt-server", "unknown"]
+
+
+def _raw_port(i: int) -> dict[str, str]:
+    # Build strings at runtime, as XML parsing does, so they are not shared
+    return {
+        "port": str(i + 1),
+        "state": "".join(STATES[i % len(STATES)]),
+        "service": "".join(SERVICES[i % len(SERVICES)]),
+    }
+
+
+def build_dicts(hosts: int, ports: int) -> list[dict]:
+    return [
+        {
+            "ip": f"10.{h >> 16 & 255}.{h >> 8 & 255}.{h & 255}",
+            "mac": f"02:00:00:{h >> 16 & 255:02x}:{h >> 8 & 255:02x}:{h & 255:02x}",
+            "vendor": "".join("Acme"),
+            "os": "",
+            "ports": [_raw_port(i) for i in range(ports)],
+        }
+        for h in range(hosts)
+    ]
+
+
+def build_records(hosts: int, ports: int) -> list[Host]:
+    return [
+        Host(
+            f"10.{h >> 16 & 255}.{h >> 8 & 255}.{h & 255}",
+            f"02:00:00:{h >> 16 & 255:02x}:{h >> 8 & 255:02x}:{h & 255:02x}",
+            "".join("Acme"),
+            ports=[PortResult.from_dict(_raw_port(i)) for i in range(ports)],
+        )
+        for h in range(hosts)
+    ]
+
+
+def measure(builder, hosts: int, ports: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    data = builder(hosts, ports)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--ports", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    dict_bytes = measure(build_dicts, args.hosts, args.ports)
+    record_bytes = measure(build_records, args.hosts, args.ports)
+    print(
+        json.dumps(
+            {
+                "hosts": args.hosts,
+                "ports_per_host": args.ports,
+                "dict_bytes": dict_bytes,
+                "record_bytes": record_bytes,
+                "ratio": round(record_bytes / dict_bytes, 3) if dict_bytes else None,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""End-to-end scan load harness driven by the synthetic nmap.
+
+Runs host discovery, LAN scan and LAN check against a virtual LAN served by
+``benchmarks/fakebin/nmap`` and reports wall time, peak RSS of the scanning
+process and how many nmap processes were started (in total and at once).
+Each scenario runs in a fresh interpreter so RSS figures do not leak between
+runs. The native DHCP/SSDP/NetBIOS/SMB probes are disabled
+(``NWCD_NATIVE_PROBES=0``) so every check goes through the synthetic nmap
+and no network access is needed.
+
+    python benchmarks/bench_scan_load.py --sizes 10,100,1000,5000
+    python benchmarks/bench_scan_load.py --sizes 10,100 --baseline benchmarks/load_baseline.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKEBIN = Path(__file__).resolve().parent / "fakebin"
+SCENARIOS = ("discovery", "lan-scan", "lan-check")
+NETWORK = "10.0.0.0/16"
+
+
+def subnet_for(hosts: int) -> str:
+    """Return the smallest subnet of NETWORK holding ``hosts`` live hosts."""
+    bits = max(2, math.ceil(math.log2(hosts + 2)))
+    return f"10.0.0.0/{32 - bits}"
+
+
+def fake_env(hosts: int, log: str, **overrides: object) -> dict[str, str]:
+    """Environment putting the synthetic nmap first on ``PATH``."""
+    env = dict(os.environ)
+    env["PATH"] = str(FAKEBIN) + os.pathsep + env.get("PATH", "")
+    env["PYTHONPATH"] = str(ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    env["FAKE_NMAP_NETWORK"] = NETWORK
+    env["FAKE_NMAP_HOSTS"] = str(hosts)
+    env["FAKE_NMAP_LOG"] = log
+    # native probes would wait on real UDP/TCP replies the virtual LAN never sends
+    env["NWCD_NATIVE_PROBES"] = "0"
+    for key, value in overrides.items():
+        env[f"FAKE_NMAP_{key.upper()}"] = str(value)
+    return env
+
+
+def _child(scenario: str, subnet: str) -> None:
+    """Run one scenario in this process and print a JSON summary."""
+    sys.path.insert(0, str(ROOT))
+    import io
+    from contextlib import redirect_stdout
+
+    with redirect_stdout(io.StringIO()):
+        if scenario == "discovery":
+            from discover_hosts import discover_hosts
+
+            count = len(discover_hosts(subnet))
+        elif scenario == "lan-scan":
+            from lan_port_scan import DEFAULT_PORTS, scan_hosts
+
+            count = len(scan_hosts(subnet, DEFAULT_PORTS))
+        else:
+            from lan_security_check import run_checks
+
+            count = len(run_checks(subnet))
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024
+    print(json.dumps({"count": count, "peak_rss_kb": rss}))
+
+
+def _process_stats(log: Path) -> tuple[int, int]:
+    events = []
+    if log.exists():
+        for line in log.read_text().splitlines():
+            entry = json.loads(line)
+            events.append((entry["start"], 1))
+            events.append((entry.get("end", entry["start"]), -1))
+    peak = cur = 0
+    for _, delta in sorted(events):
+        cur += delta
+        peak = max(peak, cur)
+    return len(events) // 2, peak
+
+
+def run_scenario(scenario: str, hosts: int, **overrides: object) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "nmap.log"
+        env = fake_env(hosts, str(log), **overrides)
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", scenario, subnet_for(hosts)],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=tmp,
+        )
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            raise RuntimeError(f"{scenario}/{hosts} failed: {proc.stderr.strip()}")
+        summary = json.loads(proc.stdout.strip().splitlines()[-1])
+        spawned, peak_procs = _process_stats(log)
+    return {
+        "scenario": scenario,
+        "hosts": hosts,
+        "wall_s": round(wall, 3),
+        "peak_rss_kb": summary["peak_rss_kb"],
+        "nmap_processes": spawned,
+        "peak_concurrent_nmap": peak_procs,
+        "result_count": summary["count"],
+    }
+
+
+# Seconds of wall time any scenario may exceed its scaled baseline by
+# (interpreter start-up and cold caches dominate the small scenarios)
+WALL_SLACK_S = 0.25
+
+
+def speed_factor(results: list[dict], baseline: list[dict]) -> float:
+    """Return the median ratio of measured to baseline wall time.
+
+    Dividing by it normalises wall times for a runner that is uniformly
+    faster or slower than the machine the baseline was recorded on.
+    """
+    base = {(b["scenario"], b["hosts"]): b for b in baseline}
+    ratios = sorted(
+        res["wall_s"] / ref["wall_s"]
+        for res in results
+        if (ref := base.get((res["scenario"], res["hosts"]))) and ref["wall_s"]
+    )
+    if not ratios:
+        return 1.0
+    mid = len(ratios) // 2
+    return ratios[mid] if len(ratios) % 2 else (ratios[mid - 1] + ratios[mid]) / 2
+
+
+def compare(
+    results: list[dict],
+    baseline: list[dict],
+    tolerance: float,
+    wall_slack: float = WALL_SLACK_S,
+) -> list[str]:
+    """Return regressions against ``baseline``.
+
+    The deterministic counters must match exactly: no more nmap processes
+    than recorded and the same number of results. Peak RSS may grow by
+    ``tolerance``. Wall time is first normalised by :func:`speed_factor`
+    and may then exceed the baseline by ``tolerance`` plus ``wall_slack``
+    seconds, so a slow shared runner does not fail the gate but one
+    scenario slowing down relative to the others does.
+    """
+    base = {(b["scenario"], b["hosts"]): b for b in baseline}
+    factor = speed_factor(results, baseline)
+    problems = []
+    for res in results:
+        ref = base.get((res["scenario"], res["hosts"]))
+        if not ref:
+            continue
+        name = f"{res['scenario']}@{res['hosts']}"
+        if res["nmap_processes"] > ref["nmap_processes"]:
+            problems.append(f"{name}: nmap_processes {res['nmap_processes']} > {ref['nmap_processes']}")
+        if res["result_count"] != ref["result_count"]:
+            problems.append(f"{name}: result_count {res['result_count']} != {ref['result_count']}")
+        if ref["peak_rss_kb"] and res["peak_rss_kb"] > ref["peak_rss_kb"] * (1 + tolerance):
+            problems.append(
+                f"{name}: peak_rss_kb {res['peak_rss_kb']} > {ref['peak_rss_kb']} (+{tolerance:.0%})"
+            )
+        limit = ref["wall_s"] * (1 + tolerance) + wall_slack
+        if ref["wall_s"] and res["wall_s"] / factor > limit:
+            problems.append(
+                f"{name}: wall_s {res['wall_s']} (x{1 / factor:.2f} normalised) > {ref['wall_s']} "
+                f"(+{tolerance:.0%} +{wall_slack}s)"
+            )
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Scan load harness using a fake nmap")
+    parser.add_argument("--child", nargs=2, metavar=("SCENARIO", "SUBNET"), help=argparse.SUPPRESS)
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma separated host counts")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean per-host scan latency")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results stored in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative regression")
+    parser.add_argument(
+        "--wall-slack", type=float, default=WALL_SLACK_S, help="Allowed absolute wall time regression in seconds"
+    )
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(*args.child)
+        return 0
+
+    results = []
+    for hosts in (int(s) for s in args.sizes.split(",") if s):
+        for scenario in (s for s in args.scenarios.split(",") if s):
+            res = run_scenario(scenario, hosts, latency_ms=args.latency_ms)
+            print(json.dumps(res), flush=True)
+            results.append(res)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        print(f"speed factor vs baseline: {speed_factor(results, baseline):.2f}", file=sys.stderr)
+        problems = compare(results, baseline, args.tolerance, args.wall_slack)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark topology graph generation for large host sets.
+
+Builds a synthetic network of ``--hosts`` hosts spread over /24 subnets,
+each reached through a shared core router and a per-site gateway, and
+reports build time, DOT source size, node/edge counts and the edges the
+previous one-edge-per-hop approach would have emitted. With ``--render`` the
+graph is also laid out with the automatically chosen Graphviz engine (needs
+the Graphviz binaries).
+
+    python benchmarks/bench_topology.py --hosts 5000
+    python benchmarks/bench_topology.py --hosts 5000 --render --cluster-threshold 0
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from generate_topology import CLUSTER_THRESHOLD, build_graph, save_graph  # noqa: E402
+
+
+def synthetic_topology(hosts: int, per_subnet: int = 100, sites: int = 8) -> tuple[dict, dict]:
+    """Return ``(scan_data, paths_data)`` for ``hosts`` hosts."""
+    devices = []
+    paths = []
+    for i in range(hosts):
+        subnet, last = divmod(i, per_subnet)
+        ip = f"10.{subnet // 250}.{subnet % 250}.{last + 2}"
+        site = subnet % sites
+        devices.append({"ip": ip, "hostname": f"host{i}", "vendor": "Acme"})
+        paths.append({"ip": ip, "path": ["LAN", "10.255.0.1", f"10.254.{site}.1", f"10.{subnet // 250}.{subnet % 250}.1", "Host"]})
+    return {"hosts": devices}, {"paths": paths}
+
+
+def run(hosts: int, cluster_threshold: int | None, render: bool) -> dict:
+    data, paths = synthetic_topology(hosts)
+    start = time.perf_counter()
+    graph = build_graph(data, paths, cluster_threshold=cluster_threshold)
+    build_s = time.perf_counter() - start
+    source = graph.source
+    result = {
+        "hosts": hosts,
+        "cluster_threshold": cluster_threshold,
+        "engine": graph.engine,
+        "build_s": round(build_s, 3),
+        "dot_bytes": len(source),
+        "edges": source.count(" -- "),
+        "legacy_edges": sum(len(p["path"]) - 1 for p in paths["paths"]),
+    }
+    if render:
+        if not shutil.which(graph.engine):
+            result["render_s"] = None
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                out = Path(tmp) / "topology.svg"
+                start = time.perf_counter()
+                save_graph(graph, str(out))
+                result["render_s"] = round(time.perf_counter() - start, 3)
+                result["svg_bytes"] = out.stat().st_size
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark topology graph generation")
+    parser.add_argument("--hosts", default="5000", help="Comma separated host counts")
+    parser.add_argument("--cluster-threshold", type=int, default=CLUSTER_THRESHOLD, help="0 disables clustering")
+    parser.add_argument("--render", action="store_true", help="Also lay out and render SVG")
+    args = parser.parse_args(argv)
+    for hosts in (int(h) for h in args.hosts.split(",") if h):
+        print(json.dumps(run(hosts, args.cluster_threshold or None, args.render)), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Merge host records that belong to the same physical device.
+
+One device can appear under several records: its IPv4 and IPv6 addresses,
+a new lease after DHCP churn, or a hostname that only nbtscan or avahi
+reported this time. :class:`DeviceIndex` keeps dict lookups from MAC
+address, hostname and IP address to a device id, so each observation is
+matched and merged in constant time. Matching prefers the MAC, then the
+hostname, then the address. A hostname or address only matches when the
+record or the device has no MAC: two devices with different MACs stay
+apart even when both use a default name such as ``raspberrypi`` or one
+took over the other's lease.
+
+Device ids are derived from the first key a device was seen with (usually
+its MAC), so they stay the same across sweeps and processes.
+"""
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from scan_records import as_dict
+
+# MACs reported for hosts whose real address is unknown
+_NO_MACS = frozenset({"00:00:00:00:00:00", "ff:ff:ff:ff:ff:ff"})
+_NO_HOSTNAMES = frozenset({"localhost", "unknown"})
+
+
+@dataclass(slots=True)
+class Device:
+    """Identity of one device: every key it was seen with."""
+
+    id: str
+    macs: Dict[str, None] = field(default_factory=dict)
+    hostnames: Dict[str, None] = field(default_factory=dict)
+    addresses: Dict[str, None] = field(default_factory=dict)
+
+
+def normalize_mac(mac: Any) -> str:
+    mac = str(mac or "").strip().lower().replace("-", ":")
+    return "" if mac in _NO_MACS else mac
+
+
+def normalize_hostname(name: Any) -> str:
+    """Return the first label of ``name`` in lower case (``NAS.local`` -> ``nas``)."""
+    name = str(name or "").strip().rstrip(".").lower()
+    try:
+        ipaddress.ip_address(name)
+        return ""
+    except ValueError:
+        pass
+    name = name.split(".", 1)[0]
+    return "" if name in _NO_HOSTNAMES else name
+
+
+def _address(record: Dict[str, Any]) -> str:
+    return str(record.get("ip") or record.get("device") or "")
+
+
+def _address_rank(address: str) -> tuple:
+    # IPv4 first, then global IPv6, then link-local IPv6 and other names
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return (3,)
+    if ip.version == 4:
+        return (0,)
+    return (2,) if ip.is_link_local else (1,)
+
+
+class DeviceIndex:
+    """Assign device ids to host records and group records per device."""
+
+    def __init__(self) -> None:
+        self.devices: Dict[str, Device] = {}
+        self._by_mac: Dict[str, str] = {}
+        self._by_hostname: Dict[str, str] = {}
+        self._by_address: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def lookup(self, record: Dict[str, Any]) -> Optional[Device]:
+        """Return the known device ``record`` belongs to, if any."""
+        record = as_dict(record)
+        mac = normalize_mac(record.get("mac"))
+        device_id = self._by_mac.get(mac) if mac else None
+        if device_id is None:
+            hostname = normalize_hostname(record.get("hostname"))
+            device_id = self._without_other_mac(self._by_hostname.get(hostname) if hostname else None, mac)
+        if device_id is None:
+            device_id = self._without_other_mac(self._by_address.get(_address(record)), mac)
+        return self.devices.get(device_id) if device_id is not None else None
+
+    def _without_other_mac(self, device_id: Optional[str], mac: str) -> Optional[str]:
+        # ``mac`` is not one of the device's MACs, or the MAC lookup had matched
+        if not device_id or mac and self.devices[device_id].macs:
+            return None
+        return device_id
+
+    def observe(self, record: Dict[str, Any]) -> Device:
+        """Match ``record`` to a device, creating one if needed, and index its keys."""
+        record = as_dict(record)
+        mac = normalize_mac(record.get("mac"))
+        hostname = normalize_hostname(record.get("hostname"))
+        address = _address(record)
+        device = self.lookup(record)
+        if device is None:
+            device = self._new_device(mac and f"mac:{mac}" or hostname and f"host:{hostname}" or f"ip:{address}")
+        if mac:
+            device.macs[mac] = None
+            self._by_mac[mac] = device.id
+        if hostname:
+            device.hostnames[hostname] = None
+            owner = self._by_hostname.get(hostname)
+            # a name shared by several devices identifies none of them
+            self._by_hostname[hostname] = device.id if owner in (None, device.id) else ""
+        if address:
+            old = self._by_address.get(address)
+            if old is not None and old != device.id:
+                self.devices[old].addresses.pop(address, None)
+            device.addresses[address] = None
+            self._by_address[address] = device.id
+        return device
+
+    def _new_device(self, key: str) -> Device:
+        device_id = hashlib.sha1(key.encode()).hexdigest()[:12]
+        n = 1
+        while device_id in self.devices:
+            n += 1
+            device_id = hashlib.sha1(f"{key}#{n}".encode()).hexdigest()[:12]
+        device = Device(device_id)
+        self.devices[device_id] = device
+        return device
+
+    def group(self, records: Iterable[Any]) -> List[Dict[str, Any]]:
+        """Return one merged dictionary per device for ``records``.
+
+        Each row keeps the record fields, with ``device_id`` added, ``ip``
+        set to the preferred address (IPv4 first) and ``addresses`` listing
+        every address of the device in ``records``. Open ports and list
+        fields of all records are combined.
+        """
+        rows: Dict[str, Dict[str, Any]] = {}
+        for record in map(as_dict, records):
+            device = self.observe(record)
+            row = rows.get(device.id)
+            if row is None:
+                row = rows[device.id] = {"device_id": device.id, "addresses": []}
+            _merge(row, record)
+        for row in rows.values():
+            row["addresses"].sort(key=_address_rank)
+            if row["addresses"] and "ip" in row:
+                row["ip"] = row["addresses"][0]
+        return list(rows.values())
+
+
+def _merge(row: Dict[str, Any], record: Dict[str, Any]) -> None:
+    address = _address(record)
+    if address and address not in row["addresses"]:
+        row["addresses"].append(address)
+    for key, value in record.items():
+        if key in ("addresses", "device_id"):
+            continue
+        current = row.get(key)
+        if key == "ports" and current is not None and value is not None:
+            row[key] = _merge_ports(current, value)
+        elif isinstance(current, list) and isinstance(value, list):
+            current.extend(v for v in value if v not in current)
+        elif not current and current != 0:
+            row[key] = list(value) if isinstance(value, list) else value
+
+
+def _merge_ports(current: List[Any], new: Iterable[Any]) -> List[Any]:
+    by_port: Dict[str, Any] = {}
+    for p in [*current, *new]:
+        port = str(p.get("port")) if isinstance(p, dict) else str(p)
+        seen = by_port.get(port)
+        # an open result wins over filtered/closed ones from other addresses
+        if seen is None or _port_state(seen) != "open" and _port_state(p) == "open":
+            by_port[port] = p
+    return list(by_port.values())
+
+
+def _port_state(port: Any) -> str:
+    return port.get("state", "open") if isinstance(port, dict) else "open"
+
+
+def merge_devices(records: Iterable[Any], index: DeviceIndex | None = None) -> List[Dict[str, Any]]:
+    """Return one row per device in ``records`` (see :meth:`DeviceIndex.group`)."""
+    return (index or DeviceIndex()).group(records)
+
+
+def unique_hosts(hosts: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep one discovery record per device, preferring its IPv4 address.
+
+    The other addresses are listed in ``addresses`` of the kept record, so a
+    dual-stack host is port scanned once per sweep.
+    """
+    hosts = list(hosts)
+    if len(hosts) < 2:
+        return hosts
+    index = DeviceIndex()
+    kept: Dict[str, Dict[str, Any]] = {}
+    for h in hosts:
+        device = index.observe(h)
+        first = kept.get(device.id)
+        if first is None:
+            kept[device.id] = h
+            continue
+        if _address_rank(_address(h)) < _address_rank(_address(first)):
+            h, first = first, h
+            kept[device.id] = first
+        addresses = first.setdefault("addresses", [_address(first)])
+        for a in [_address(h), *h.get("addresses", [])]:
+            if a and a not in addresses:
+                addresses.append(a)
+        for key in ("mac", "vendor", "hostname"):
+            if not first.get(key) and h.get(key):
+                first[key] = h[key]
+    return list(kept.values())
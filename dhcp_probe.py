@@ -0,0 +1,157 @@
+"""Detect DHCP servers with a single DHCPDISCOVER broadcast.
+
+A DISCOVER with the broadcast flag set is sent from the DHCP client port and
+OFFERs are collected until ``expected`` distinct servers have answered or the
+collection window closes. No lease is requested: the OFFERs are only read.
+Binding to port 68 normally requires root (or ``CAP_NET_BIND_SERVICE``);
+:func:`discover_servers` raises ``OSError`` when it is not allowed.
+"""
+from __future__ import annotations
+
+import ipaddress
+import os
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+CLIENT_PORT = 68
+SERVER_PORT = 67
+# Seconds to collect OFFERs
+DISCOVER_WINDOW = 3.0
+
+MAGIC_COOKIE = b"\x63\x82\x53\x63"
+OPT_SUBNET_MASK = 1
+OPT_ROUTER = 3
+OPT_DNS = 6
+OPT_LEASE_TIME = 51
+OPT_MESSAGE_TYPE = 53
+OPT_SERVER_ID = 54
+OPT_PARAM_REQUEST = 55
+OPT_END = 255
+DHCPDISCOVER = 1
+DHCPOFFER = 2
+
+_BOOTP = struct.Struct("!BBBBIHH4s4s4s4s16s64s128s")
+
+
+@dataclass(slots=True)
+class DhcpOffer:
+    server_id: str
+    offered_ip: str
+    subnet: Optional[str] = None
+    routers: List[str] = field(default_factory=list)
+    dns: List[str] = field(default_factory=list)
+    lease_time: Optional[int] = None
+    source: Optional[str] = None
+
+
+def build_discover(xid: int, mac: bytes) -> bytes:
+    """Return a DHCPDISCOVER packet for transaction ``xid`` and client ``mac``."""
+    header = _BOOTP.pack(
+        1, 1, 6, 0, xid, 0, 0x8000,
+        b"\0" * 4, b"\0" * 4, b"\0" * 4, b"\0" * 4,
+        mac.ljust(16, b"\0"), b"\0" * 64, b"\0" * 128,
+    )
+    params = bytes([OPT_SUBNET_MASK, OPT_ROUTER, OPT_DNS, OPT_LEASE_TIME, OPT_SERVER_ID])
+    options = (
+        bytes([OPT_MESSAGE_TYPE, 1, DHCPDISCOVER])
+        + bytes([OPT_PARAM_REQUEST, len(params)]) + params
+        + bytes([OPT_END])
+    )
+    return header + MAGIC_COOKIE + options
+
+
+def parse_options(data: bytes) -> Dict[int, bytes]:
+    options: Dict[int, bytes] = {}
+    i = 0
+    while i < len(data):
+        code = data[i]
+        if code == OPT_END:
+            break
+        if code == 0:
+            i += 1
+            continue
+        if i + 1 >= len(data):
+            break
+        length = data[i + 1]
+        options[code] = options.get(code, b"") + data[i + 2:i + 2 + length]
+        i += 2 + length
+    return options
+
+
+def _addresses(raw: bytes) -> List[str]:
+    return [socket.inet_ntoa(raw[i:i + 4]) for i in range(0, len(raw) - 3, 4)]
+
+
+def parse_offer(data: bytes, xid: int, source: Optional[str] = None) -> Optional[DhcpOffer]:
+    """Return the OFFER in ``data`` for transaction ``xid``, or None."""
+    if len(data) < _BOOTP.size + 4 or data[_BOOTP.size:_BOOTP.size + 4] != MAGIC_COOKIE:
+        return None
+    op, _, _, _, rxid, _, _, _, yiaddr, siaddr, _, _, _, _ = _BOOTP.unpack_from(data)
+    if op != 2 or rxid != xid:
+        return None
+    options = parse_options(data[_BOOTP.size + 4:])
+    if options.get(OPT_MESSAGE_TYPE) != bytes([DHCPOFFER]):
+        return None
+    offered = socket.inet_ntoa(yiaddr)
+    server_raw = options.get(OPT_SERVER_ID, b"")
+    server_id = socket.inet_ntoa(server_raw[:4]) if len(server_raw) >= 4 else (source or socket.inet_ntoa(siaddr))
+    offer = DhcpOffer(server_id=server_id, offered_ip=offered, source=source)
+    mask = options.get(OPT_SUBNET_MASK, b"")
+    if len(mask) == 4:
+        try:
+            offer.subnet = str(ipaddress.ip_network(f"{offered}/{socket.inet_ntoa(mask)}", strict=False))
+        except ValueError:
+            pass
+    offer.routers = _addresses(options.get(OPT_ROUTER, b""))
+    offer.dns = _addresses(options.get(OPT_DNS, b""))
+    lease = options.get(OPT_LEASE_TIME, b"")
+    if len(lease) == 4:
+        offer.lease_time = struct.unpack("!I", lease)[0]
+    return offer
+
+
+def discover_servers(
+    *,
+    expected: Optional[int] = None,
+    window: float = DISCOVER_WINDOW,
+    interface: Optional[str] = None,
+    bind: Tuple[str, int] = ("", CLIENT_PORT),
+    target: Tuple[str, int] = ("255.255.255.255", SERVER_PORT),
+) -> List[DhcpOffer]:
+    """Broadcast a DISCOVER and return one OFFER per answering server.
+
+    Returns as soon as ``expected`` distinct servers have answered, otherwise
+    when ``window`` seconds have passed. ``interface`` binds the socket to a
+    network device (Linux, needs root).
+    """
+    xid = int.from_bytes(os.urandom(4), "big")
+    # Locally administered unicast MAC so no real client lease is touched
+    mac = bytes([0x02]) + os.urandom(5)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        if interface and hasattr(socket, "SO_BINDTODEVICE"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, interface.encode())
+        sock.bind(bind)
+        sock.sendto(build_discover(xid, mac), target)
+        offers: Dict[str, DhcpOffer] = {}
+        end = time.monotonic() + window
+        while expected is None or len(offers) < expected:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, addr = sock.recvfrom(4096)
+            except socket.timeout:
+                break
+            offer = parse_offer(data, xid, addr[0])
+            if offer is not None:
+                offers.setdefault(offer.server_id, offer)
+        return list(offers.values())
+    finally:
+        sock.close()
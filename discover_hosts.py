@@ -2,22 +2,39 @@
 """Host discovery utilities."""
 
 import json
+import re
 import sys
+from typing import Iterable, Iterator
 
-from network_utils import _get_subnet, _lookup_vendor, _run_nmap_scan
+from network_utils import _get_subnet, _lookup_vendor, _run_nmap_scan, iter_sweep
 
+# Matches a bare IPv4 or IPv6 address token such as ``192.168.1.1`` or ``fe80::1``
+IP_RE = re.compile(r"(?:\d{1,3}(?:\.\d{1,3}){3}|[0-9A-Fa-f]{0,4}(?::[0-9A-Fa-f]{0,4}){2,7})")
 
-def discover_hosts(subnet: str | None = None) -> list[dict[str, str]]:
-    """Return list of discovered hosts with IP, MAC, vendor, and hostname."""
+
+def iter_discover_hosts(
+    subnet: str | Iterable[str] | None = None,
+) -> Iterator[dict[str, str]]:
+    """Yield discovered hosts as each block of the target range finishes.
+
+    Large ranges are split into blocks (see :func:`network_utils.plan_ranges`)
+    so that a /16 does not run into a single global nmap timeout. Passing a
+    list of subnets (e.g. :func:`network_utils.get_local_subnets`) sweeps all
+    of them in parallel.
+    """
     subnet = subnet or _get_subnet() or "192.168.1.0/24"
-    hosts = _run_nmap_scan(subnet)
-    for host in hosts:
+    for host in iter_sweep(subnet, scan_fn=_run_nmap_scan):
         if not host.get("vendor"):
             host["vendor"] = _lookup_vendor(host.get("mac", ""))
-    return hosts
+        yield host
+
+
+def discover_hosts(subnet: str | Iterable[str] | None = None) -> list[dict[str, str]]:
+    """Return list of discovered hosts with IP, MAC, vendor, and hostname."""
+    return list(iter_discover_hosts(subnet))
 
 
-def get_all_ips(subnet: str | None = None) -> list[str]:
+def get_all_ips(subnet: str | Iterable[str] | None = None) -> list[str]:
     """Return list of IP addresses for all discovered hosts."""
     return [h["ip"] for h in discover_hosts(subnet)]
 
@@ -10,8 +10,10 @@ import csv
 from pathlib import Path
 from typing import Any, Dict, List
 
+from device_index import merge_devices
 from security_score import calc_security_score
 from report_utils import calc_utm_items
+from scan_records import as_dict, open_port_list
 
 try:
     import pdfkit  # type: ignore
@@ -51,22 +53,26 @@ def generate_html(data: Any) -> str:
     if isinstance(data, dict) and "devices" in data:
         devices = data.get("devices", [])
         lan_sec = data.get("lan_security")
+        phases = data.get("scan_phases")
     else:
         devices = data
         lan_sec = None
+        phases = None
+    # records of the same device (IPv4/IPv6, several leases) share one row
+    devices = merge_devices(devices)
 
     parts: List[str] = ["<html><head><meta charset='utf-8'><style>", CSS, "</style></head><body>"]
     parts.append("<h1>Network Report</h1>")
     parts.append("<h2>Devices</h2><table><tr><th>IP</th><th>MAC</th><th>Vendor</th></tr>")
     for dev in devices:
-        ip = dev.get("ip") or dev.get("device") or ""
+        ip = ", ".join(dev.get("addresses") or [dev.get("ip") or dev.get("device") or ""])
         parts.append(f"<tr><td>{_escape(ip)}</td><td>{_escape(dev.get('mac',''))}</td><td>{_escape(dev.get('vendor',''))}</td></tr>")
     parts.append("</table>")
 
     parts.append("<h2>Open Ports</h2>")
     for dev in devices:
         ip = dev.get("ip") or dev.get("device") or ""
-        ports = [str(p) for p in dev.get("open_ports", [])]
+        ports = open_port_list(dev)
         parts.append(f"<h3>{_escape(ip)}</h3>")
         if ports:
             parts.append("<ul>")
@@ -93,7 +99,7 @@ def generate_html(data: Any) -> str:
     all_utm = set()
     for dev in devices:
         ip = dev.get("ip") or dev.get("device") or ""
-        ports = [str(p) for p in dev.get("open_ports", [])]
+        ports = open_port_list(dev)
         countries = _collect_countries(dev)
         danger_list = [p for p in ports if p in {"3389", "445", "23"}]
         data = {
@@ -137,6 +143,20 @@ def generate_html(data: Any) -> str:
             )
         parts.append("</table>")
 
+    if phases:
+        parts.append("<h2>スキャン所要時間</h2>")
+        parts.append("<table><tr><th>フェーズ</th><th>秒</th></tr>")
+        for phase, seconds in phases.items():
+            parts.append(f"<tr><td>{_escape(phase)}</td><td>{_escape(seconds)}</td></tr>")
+        parts.append("</table>")
+        escalated = [d for d in devices if d.get("escalated")]
+        if escalated:
+            parts.append("<table><tr><th>詳細スキャン対象</th><th>理由</th></tr>")
+            for dev in escalated:
+                reasons = ", ".join(dev["escalated"])
+                parts.append(f"<tr><td>{_escape(dev.get('ip', ''))}</td><td>{_escape(reasons)}</td></tr>")
+            parts.append("</table>")
+
     parts.append("</body></html>")
     return "".join(parts)
 
@@ -154,9 +174,9 @@ def _extract_devices(data: Any) -> List[Dict[str, Any]]:
 
 def generate_csv_rows(devices: List[Dict[str, Any]]) -> List[List[str]]:
     rows = []
-    for dev in devices:
+    for dev in map(as_dict, devices):
         name = dev.get("device") or dev.get("ip") or "unknown"
-        ports = [str(p) for p in dev.get("open_ports", [])]
+        ports = open_port_list(dev)
         countries = _collect_countries(dev)
         danger_list = [p for p in ports if p in {"3389", "445", "23"}]
         data = {
@@ -3,12 +3,18 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import ipaddress
 import json
+import os
+import shutil
 from pathlib import Path
-from typing import Any, Iterable, Optional
+from typing import Any, Dict, Iterable, Optional
 
 from graphviz import Graph
 
+import device_index
+
 
 def _extract_hosts(data: Any) -> Iterable[dict]:
     """Return iterable of hosts from discover_hosts or lan_port_scan output."""
@@ -17,13 +23,85 @@ def _extract_hosts(data: Any) -> Iterable[dict]:
     return data
 
 
-def build_graph(data: Any, paths_data: Optional[Any] = None) -> Graph:
+# Leaf hosts sharing a parent hop and subnet are drawn as one node past this count
+CLUSTER_THRESHOLD = 64
+# Graphs with more nodes than this are laid out with neato, then sfdp
+DOT_MAX_NODES = 300
+NEATO_MAX_NODES = 1000
+# Rendered diagrams kept in the render cache
+CACHE_MAX_ENTRIES = 64
+
+
+def _subnet_of(ip: str) -> str:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    prefix = 24 if addr.version == 4 else 64
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+class _PathTrie:
+    """Merge hop paths so that shared prefixes become shared nodes.
+
+    Each trie position gets one graph node. The first position using a hop
+    name keeps the name as node id; later positions with the same name (e.g.
+    two generic ``Router`` hops in a row) get a numbered id and the name as
+    label.
+    """
+
+    def __init__(self, root: str = "LAN") -> None:
+        self._children: Dict[tuple, str] = {(None, root): root}
+        self._used = {root: 1}
+        self.nodes: Dict[str, str] = {root: root}
+        self.edges: Dict[tuple, None] = {}
+
+    def insert(self, path: Iterable[str]) -> Optional[str]:
+        """Add ``path`` (up to ``Host``) and return the id of its last hop."""
+        parent = None
+        for name in path:
+            if name == "Host":
+                break
+            key = (parent, name)
+            node = self._children.get(key)
+            if node is None:
+                count = self._used.get(name, 0)
+                node = name if count == 0 else f"{name} ({count + 1})"
+                self._used[name] = count + 1
+                self._children[key] = node
+                self.nodes[node] = name
+            if parent is not None:
+                self.edges[(parent, node)] = None
+            parent = node
+        return parent
+
+
+def choose_engine(node_count: int) -> str:
+    """Return a Graphviz layout engine suited to ``node_count`` nodes."""
+    if node_count <= DOT_MAX_NODES:
+        return "dot"
+    if node_count <= NEATO_MAX_NODES:
+        return "neato"
+    return "sfdp"
+
+
+def build_graph(
+    data: Any,
+    paths_data: Optional[Any] = None,
+    *,
+    cluster_threshold: Optional[int] = CLUSTER_THRESHOLD,
+    engine: Optional[str] = None,
+) -> Graph:
     """Build a graphviz Graph from parsed scan data.
 
     Args:
         data: JSON data from ``discover_hosts``/``lan_port_scan`` or similar.
         paths_data: Optional JSON produced by ``topology_builder`` containing a
             ``paths`` array.
+        cluster_threshold: Leaf hosts behind the same hop and in the same
+            subnet are collapsed into one node when there are more than this
+            many. ``None`` disables clustering.
+        engine: Layout engine; chosen by graph size when omitted.
     """
 
     hosts = list(_extract_hosts(data))
@@ -43,76 +121,265 @@ def build_graph(data: Any, paths_data: Optional[Any] = None) -> Graph:
                 host = {"ip": ip}
                 hosts.append(host)
                 host_map[ip] = host
+    # one node per device; its other addresses go into the label
+    hosts = device_index.merge_devices(hosts)
 
-    g = Graph("Network")
-    # Use ellipse shapes so that SVG nodes contain <ellipse> elements which can
-    # be tapped in the Flutter UI.
-    g.attr("node", shape="ellipse")
-    g.node("LAN")
-
+    trie = _PathTrie("LAN")
+    # (parent hop, subnet) -> leaf host ips
+    groups: Dict[tuple, Dict[str, None]] = {}
+    labels: Dict[str, str] = {}
     for host in hosts:
         ip = host.get("ip") or host.get("device") or "unknown"
-        label_parts = [ip]
+        addresses = host.get("addresses") or [ip]
+        label_parts = list(addresses)
         hostname = host.get("hostname")
         if hostname:
             label_parts.append(hostname)
         vendor = host.get("vendor")
         if vendor:
             label_parts.append(vendor)
-        label = "\n".join(label_parts)
-        g.node(ip, label=label)
+        labels[ip] = "\n".join(label_parts)
 
         paths = list(host.get("paths", []))
-        if ip in paths_by_ip:
-            paths.append(paths_by_ip[ip])
-        if paths:
-            for path in paths:
-                prev = None
-                for node in path:
-                    if node == "Host":
-                        break
-                    g.node(node)
-                    if prev is not None:
-                        g.edge(prev, node)
-                    prev = node
-                if prev is not None:
-                    g.edge(prev, ip)
+        for address in addresses:
+            if address in paths_by_ip and paths_by_ip[address] not in paths:
+                paths.append(paths_by_ip[address])
+        parents = [trie.insert(path) for path in paths] if paths else ["LAN"]
+        for parent in parents:
+            if parent is not None:
+                groups.setdefault((parent, _subnet_of(ip)), {})[ip] = None
+
+    host_edges: Dict[tuple, None] = {}
+    cluster_nodes: Dict[str, str] = {}
+    shown = set()
+    for (parent, subnet), ips in groups.items():
+        if cluster_threshold is not None and len(ips) > cluster_threshold:
+            node = f"{subnet} via {parent}"
+            cluster_nodes[node] = f"{subnet}\n{len(ips)} hosts"
+            host_edges[(parent, node)] = None
+            continue
+        for ip in ips:
+            host_edges[(parent, ip)] = None
+            shown.add(ip)
+    # Hosts without any usable path are still drawn on their own
+    in_groups = {ip for ips in groups.values() for ip in ips}
+    shown.update(ip for ip in labels if ip not in in_groups)
+
+    g = Graph("Network")
+    # Use ellipse shapes so that SVG nodes contain <ellipse> elements which can
+    # be tapped in the Flutter UI.
+    g.attr("node", shape="ellipse")
+    for node, name in trie.nodes.items():
+        if node == name:
+            g.node(node)
         else:
-            g.edge("LAN", ip)
+            g.node(node, label=name)
+    for ip, label in labels.items():
+        if ip in shown:
+            g.node(ip, label=label)
+    for node, label in cluster_nodes.items():
+        g.node(node, label=label, shape="box")
+    for a, b in trie.edges:
+        g.edge(a, b)
+    for a, b in host_edges:
+        g.edge(a, b)
+
+    node_count = len(trie.nodes) + len(shown) + len(cluster_nodes)
+    g.engine = engine or choose_engine(node_count)
+    if g.engine != "dot":
+        g.attr(overlap="false", splines="false", outputorder="edgesfirst")
     return g
 
 
 def save_graph(graph: Graph, output: str) -> None:
-    """Save graph to PNG/SVG or DOT depending on extension."""
+    """Save graph to PNG/SVG, JSON or DOT depending on extension."""
     path = Path(output)
-    if path.suffix.lower() in {".png", ".svg"}:
-        fmt = path.suffix.lower()[1:]
+    suffix = path.suffix.lower()
+    if suffix in {".png", ".svg"}:
+        fmt = suffix[1:]
         graph.render(path.stem, path.parent, format=fmt, cleanup=True)
+    elif suffix == ".json":
+        path.write_text(
+            json.dumps(export_layout(graph), ensure_ascii=False), encoding="utf-8"
+        )
     else:
         graph.save(filename=str(path))
 
 
+def _points(value: Any) -> float:
+    return round(float(value) * 72, 2)
+
+
+def layout_from_json0(data: Dict[str, Any], engine: str = "") -> Dict[str, Any]:
+    """Convert Graphviz ``json0`` output to a compact node/edge layout.
+
+    Coordinates are in points with the origin at the bottom left, as in the
+    SVG viewBox Graphviz produces; ``bbox`` is ``[x0, y0, x1, y1]``.
+    """
+    nodes = []
+    index: Dict[int, str] = {}
+    for obj in data.get("objects", []):
+        if "nodes" in obj or "subgraphs" in obj or "pos" not in obj:
+            continue
+        name = obj["name"]
+        index[obj["_gvid"]] = name
+        x, y = (float(v) for v in obj["pos"].split(",")[:2])
+        label = obj.get("label", "\\N")
+        label = name if label == "\\N" else label.replace("\\n", "\n")
+        nodes.append(
+            {
+                "id": name,
+                "label": label,
+                "x": x,
+                "y": y,
+                "width": _points(obj.get("width", 0)),
+                "height": _points(obj.get("height", 0)),
+                "shape": obj.get("shape", "ellipse"),
+            }
+        )
+    edges = [
+        {"source": index[e["tail"]], "target": index[e["head"]]}
+        for e in data.get("edges", [])
+        if e.get("tail") in index and e.get("head") in index
+    ]
+    bbox = [float(v) for v in data.get("bb", "0,0,0,0").split(",")]
+    return {"engine": engine, "bbox": bbox, "nodes": nodes, "edges": edges}
+
+
+def export_layout(graph: Graph) -> Dict[str, Any]:
+    """Lay out ``graph`` and return node positions and edges as a dict."""
+    raw = graph.pipe(format="json0", encoding="utf-8")
+    return layout_from_json0(json.loads(raw), graph.engine)
+
+
+def _cache_dir() -> Path:
+    env = os.environ.get("NWCD_TOPOLOGY_CACHE")
+    if env:
+        return Path(env)
+    return Path.home() / ".cache" / "nwcd" / "topology"
+
+
+def _code_hash() -> str:
+    global _CODE_HASH
+    if _CODE_HASH is None:
+        digest = hashlib.sha256(Path(__file__).read_bytes())
+        # hosts are merged per device before the graph is built
+        digest.update(Path(device_index.__file__).read_bytes())
+        _CODE_HASH = digest.hexdigest()
+    return _CODE_HASH
+
+
+_CODE_HASH: Optional[str] = None
+
+
+def cache_key(*parts: Any) -> str:
+    """Return a content hash of ``parts`` and this module's source.
+
+    Including the source (and that of :mod:`device_index`) means cached
+    renders are invalidated whenever the graph building code changes.
+    """
+    digest = hashlib.sha256(_code_hash().encode())
+    for part in parts:
+        data = part if isinstance(part, bytes) else json.dumps(part, sort_keys=True).encode()
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _prune_cache(cache_dir: Path, keep: int = CACHE_MAX_ENTRIES) -> None:
+    entries = sorted(
+        (p for p in cache_dir.iterdir() if p.is_file()),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in entries[keep:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def render_topology(
+    input_path: str,
+    output: str,
+    *,
+    paths_path: Optional[str] = None,
+    cluster_threshold: Optional[int] = CLUSTER_THRESHOLD,
+    engine: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+    use_cache: bool = True,
+) -> bool:
+    """Render the topology of ``input_path`` to ``output`` through the cache.
+
+    The cache key is the hash of the input files, the options and the output
+    format, so an unchanged host list is served without parsing the JSON,
+    rebuilding the graph or running Graphviz. Returns True on a cache hit.
+    """
+    out = Path(output)
+    suffix = out.suffix.lower() or ".dot"
+    inputs = [Path(input_path).read_bytes()]
+    if paths_path:
+        inputs.append(Path(paths_path).read_bytes())
+    key = cache_key(*inputs, [cluster_threshold, engine, suffix])
+    cache = Path(cache_dir) if cache_dir else _cache_dir()
+    cached = cache / f"{key}{suffix}"
+    if use_cache and cached.exists():
+        shutil.copyfile(cached, out)
+        os.utime(cached)
+        return True
+
+    data = json.loads(inputs[0].decode("utf-8"))
+    paths_data = json.loads(inputs[1].decode("utf-8")) if paths_path else None
+    graph = build_graph(data, paths_data, cluster_threshold=cluster_threshold, engine=engine)
+    save_graph(graph, str(out))
+    if use_cache:
+        try:
+            cache.mkdir(parents=True, exist_ok=True)
+            tmp = cache / f".{key}.{os.getpid()}.tmp"
+            shutil.copyfile(out, tmp)
+            os.replace(tmp, cached)
+            _prune_cache(cache)
+        except OSError:
+            pass
+    return False
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Create network topology diagram")
     parser.add_argument("input", help="JSON from discover_hosts.py or lan_port_scan.py")
     parser.add_argument(
-        "-o", "--output", default="topology.svg", help="Output file (.png/.svg/.dot)"
+        "-o",
+        "--output",
+        default="topology.svg",
+        help="Output file (.png/.svg/.dot, or .json for node positions)",
     )
     parser.add_argument(
         "--paths-json", help="JSON from topology_builder.py containing network paths"
     )
+    parser.add_argument(
+        "--engine",
+        choices=["dot", "neato", "sfdp"],
+        help="Graphviz layout engine (default: chosen by graph size)",
+    )
+    parser.add_argument(
+        "--cluster-threshold",
+        type=int,
+        default=CLUSTER_THRESHOLD,
+        help="Collapse more than this many hosts per subnet and hop into one node (0 disables)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always rebuild and re-render the diagram"
+    )
     args = parser.parse_args()
 
-    with open(args.input, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    paths_data = None
-    if args.paths_json:
-        with open(args.paths_json, "r", encoding="utf-8") as f:
-            paths_data = json.load(f)
-
-    graph = build_graph(data, paths_data)
-    save_graph(graph, args.output)
+    render_topology(
+        args.input,
+        args.output,
+        paths_path=args.paths_json,
+        cluster_threshold=args.cluster_threshold or None,
+        engine=args.engine,
+        use_cache=not args.no_cache,
+    )
     print(f"Topology written to {args.output}")
 
 
@@ -2,10 +2,46 @@
 """Discover LAN hosts and run port scan on each."""
 import argparse
 import json
+import sys
+import time
+from dataclasses import dataclass, field
+from threading import Event
+from typing import Any, Iterable, Iterator
 
-from network_utils import _get_subnet, _run_nmap_scan, _lookup_vendor, SCAN_TIMEOUT
-from port_scan import run_scan
+from metrics import (
+    HOST_SCAN_RETRIES,
+    SCAN_QUEUE_DEPTH,
+    SWEEP_ERRORS,
+    SWEEP_HOSTS,
+    SWEEP_PHASE_SECONDS,
+    SWEEP_SECONDS,
+    timed,
+)
+from network_utils import (
+    _get_subnet,
+    _run_nmap_scan,
+    _lookup_vendor,
+    SCAN_TIMEOUT,
+    iter_sweep,
+)
+from device_index import unique_hosts
+from port_scan import ScanCancelled, run_scan
+from scan_journal import ScanJournal
+from scan_records import Host, as_dict
+from security_score import DANGER_PORTS
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+# Seconds between checks of the cancel event while waiting for scans
+_CANCEL_POLL = 0.5
+# Extra attempts for a host whose scan failed, and the first backoff delay
+# (doubled on every further attempt)
+SCAN_RETRIES = 2
+RETRY_BACKOFF = 5.0
+# Failures that another attempt cannot fix
+_PERMANENT_ERRORS = (ValueError, FileNotFoundError)
+# nmap refuses scan types such as -O without root privileges
+_ROOT_REQUIRED = "requires root privileges"
 
 DEFAULT_PORTS = [
     "21",
@@ -27,39 +63,124 @@ DEFAULT_PORTS = [
 ]
 
 
-def gather_hosts(subnet: str):
-    """Return list of hosts with ip, mac and vendor."""
-    hosts = _run_nmap_scan(subnet, timeout=SCAN_TIMEOUT)
+def gather_hosts(subnet: str | list[str]):
+    """Return list of hosts with ip, mac and vendor.
+
+    A device found under several addresses is listed once, with its other
+    addresses in ``addresses``, so a sweep scans it only once.
+    """
+    hosts = unique_hosts(iter_sweep(subnet, scan_fn=_run_nmap_scan))
     for h in hosts:
         if not h.get("vendor"):
             h["vendor"] = _lookup_vendor(h.get("mac", ""))
     return hosts
 
 
-def scan_hosts(
-    subnet: str,
+def _host_result(h: dict, scanned: dict, records: bool):
+    if records:
+        return Host.from_scan(h, scanned)
+    item = {
+        "ip": h.get("ip", ""),
+        "mac": h.get("mac", ""),
+        "vendor": h.get("vendor", ""),
+        "os": scanned.get("os", ""),
+        "ports": [as_dict(p) for p in scanned.get("ports", [])],
+    }
+    if h.get("addresses"):
+        item["addresses"] = h["addresses"]
+    return item
+
+
+def _failed_result(h: dict, error: str, records: bool):
+    # records keep the discovery data only (ports=None: not scanned)
+    if records:
+        return Host.from_dict(h)
+    item = {
+        "ip": h.get("ip", ""),
+        "mac": h.get("mac", ""),
+        "vendor": h.get("vendor", ""),
+        "os": "",
+        "ports": [],
+        "error": error,
+    }
+    if h.get("addresses"):
+        item["addresses"] = h["addresses"]
+    return item
+
+
+def _scan_host(
+    h: dict,
     ports: list[str],
-    service: bool = False,
-    os_detect: bool = False,
-    scripts: list[str] | None = None,
-    max_workers: int | None = None,
-    timing: int | None = None,
-    fast: bool = True,
-):
-    hosts = gather_hosts(subnet)
-    results = []
+    options: dict,
+    retries: int,
+    backoff: float,
+    cancel: Event | None,
+    journal: ScanJournal | None,
+) -> tuple[dict | None, str]:
+    """Run ``run_scan`` for ``h`` with retries; return ``(result, error)``.
+
+    A set ``cancel`` event is handed to ``run_scan`` so a running nmap is
+    killed instead of finishing the host.
+    """
+    attempt = 0
+    while True:
+        try:
+            return run_scan(h["ip"], ports, **options), ""
+        except ScanCancelled:
+            return None, "cancelled"
+        except Exception as e:
+            attempt += 1
+            error = str(e) or type(e).__name__
+            final = attempt > retries or isinstance(e, _PERMANENT_ERRORS) or _ROOT_REQUIRED in error
+            if journal is not None:
+                journal.record_failure(h["ip"], error, attempt, final)
+            if final:
+                return None, error
+        HOST_SCAN_RETRIES.inc()
+        delay = backoff * 2 ** (attempt - 1)
+        if cancel is None:
+            time.sleep(delay)
+        elif cancel.wait(delay):
+            return None, "cancelled"
+
+
+def _iter_scan(
+    hosts: list[dict],
+    ports: list[str],
+    *,
+    service: bool,
+    os_detect: bool,
+    scripts: list[str] | None,
+    max_workers: int | None,
+    timing: int | None,
+    fast: bool,
+    records: bool,
+    cancel: Event | None,
+    phase: str = "port_scan",
+    retries: int = SCAN_RETRIES,
+    journal: ScanJournal | None = None,
+) -> Iterator[dict | Host]:
+    """Port scan ``hosts`` in a bounded pool, yielding results as they finish.
+
+    Hosts whose scan still fails after ``retries`` extra attempts are
+    yielded with an ``error`` instead of aborting the sweep. Finished hosts
+    and failed attempts are written to ``journal`` when one is given.
+    """
     # Limit worker count to avoid exhausting system resources
     if max_workers is None:
         max_workers = min(32, max(1, len(hosts))) if fast else 1
     else:
         max_workers = max(1, max_workers)
+    window = 2 * max_workers
+    pending = iter(hosts)
     future_to_host = {}
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for h in hosts:
-            future = executor.submit(
-                run_scan,
-                h["ip"],
-                ports,
+
+        def submit_next() -> None:
+            h = next(pending, None)
+            if h is None:
+                return
+            options = dict(
                 service=service,
                 os_detect=os_detect,
                 scripts=scripts,
@@ -67,23 +188,282 @@ def scan_hosts(
                 timing=timing,
                 fast=fast,
             )
+            if cancel is not None:
+                options["cancel"] = cancel
+            if records:
+                # keep PortResult records from the parser instead of dicts
+                options["records"] = True
+            future = executor.submit(
+                _scan_host, h, ports, options, retries, RETRY_BACKOFF, cancel, journal
+            )
             future_to_host[future] = h
 
-        for fut in as_completed(future_to_host):
-            h = future_to_host[fut]
-            scanned = fut.result()
-            results.append(
-                {
-                    "ip": h.get("ip", ""),
-                    "mac": h.get("mac", ""),
-                    "vendor": h.get("vendor", ""),
-                    "os": scanned.get("os", ""),
-                    "ports": scanned.get("ports", []),
-                }
-            )
+        remaining = len(hosts)
+        SCAN_QUEUE_DEPTH.inc(remaining)
+        start = time.perf_counter()
+        try:
+            for _ in range(window):
+                submit_next()
+            while future_to_host:
+                if cancel is not None and cancel.is_set():
+                    return
+                try:
+                    if cancel is None:
+                        fut = next(as_completed(future_to_host))
+                    else:
+                        fut = next(as_completed(future_to_host, timeout=_CANCEL_POLL))
+                except FuturesTimeout:
+                    continue
+                h = future_to_host.pop(fut)
+                remaining -= 1
+                SCAN_QUEUE_DEPTH.dec()
+                scanned, error = fut.result()
+                if scanned is None and cancel is not None and cancel.is_set():
+                    return
+                submit_next()
+                if scanned is None:
+                    yield _failed_result(h, error, records)
+                    continue
+                if journal is not None:
+                    journal.record_host(h["ip"], _host_result(h, scanned, False))
+                yield _host_result(h, scanned, records)
+        finally:
+            SCAN_QUEUE_DEPTH.dec(remaining)
+            SWEEP_PHASE_SECONDS.observe(time.perf_counter() - start, phase=phase)
+            for fut in future_to_host:
+                fut.cancel()
+
+
+def iter_scan_hosts(
+    subnet: str | list[str],
+    ports: list[str],
+    service: bool = False,
+    os_detect: bool = False,
+    scripts: list[str] | None = None,
+    max_workers: int | None = None,
+    timing: int | None = None,
+    fast: bool = True,
+    records: bool = False,
+    cancel: Event | None = None,
+    journal: ScanJournal | None = None,
+    retries: int = SCAN_RETRIES,
+) -> Iterator[dict | Host]:
+    """Yield each scanned host as soon as its port scan completes.
+
+    Only ``2 * max_workers`` hosts are handed to the pool ahead of the
+    consumer, so a slow consumer holds back further scans instead of letting
+    finished results pile up. Setting ``cancel`` or closing the generator
+    stops the sweep and cancels scans that have not started yet.
+
+    With a ``journal``, hosts it already lists are yielded first and not
+    scanned again. The journal is marked done when the sweep completes and
+    no host that is still discovered failed, so resuming it rescans the
+    hosts that ended in an error.
+    """
+    done = dict(journal.state.hosts) if journal is not None else {}
+    for item in done.values():
+        yield Host.from_dict(item) if records else dict(item)
+    with SWEEP_PHASE_SECONDS.time(phase="discovery"):
+        hosts = gather_hosts(subnet)
+    if journal is not None:
+        # a host that failed and is no longer found cannot be retried
+        found = {h["ip"] for h in hosts}
+        journal.forget_failures([ip for ip in journal.state.failures if ip not in found])
+    if done:
+        hosts = [h for h in hosts if h["ip"] not in done]
+    yield from _iter_scan(
+        hosts,
+        ports,
+        service=service,
+        os_detect=os_detect,
+        scripts=scripts,
+        max_workers=max_workers,
+        timing=timing,
+        fast=fast,
+        records=records,
+        cancel=cancel,
+        retries=retries,
+        journal=journal,
+    )
+    if journal is None or cancel is not None and cancel.is_set():
+        return
+    if not journal.state.failures:
+        journal.finish()
+
+
+def sweep_params(
+    subnet: str | list[str],
+    ports: list[str],
+    service: bool = False,
+    os_detect: bool = False,
+    scripts: list[str] | None = None,
+    timing: int | None = None,
+    fast: bool = True,
+) -> dict[str, Any]:
+    """Return the ``scan_hosts`` arguments a journal records for a sweep."""
+    return {
+        "subnet": subnet if isinstance(subnet, str) else list(subnet),
+        "ports": list(ports),
+        "service": service,
+        "os_detect": os_detect,
+        "scripts": None if scripts is None else list(scripts),
+        "timing": timing,
+        "fast": fast,
+    }
+
+
+@timed(SWEEP_SECONDS, SWEEP_ERRORS)
+def scan_hosts(
+    subnet: str | list[str],
+    ports: list[str],
+    service: bool = False,
+    os_detect: bool = False,
+    scripts: list[str] | None = None,
+    max_workers: int | None = None,
+    timing: int | None = None,
+    fast: bool = True,
+    records: bool = False,
+    cancel: Event | None = None,
+    journal: ScanJournal | None = None,
+    retries: int = SCAN_RETRIES,
+):
+    """Discover hosts in ``subnet`` and port scan each of them.
+
+    Returns ``lan-scan`` style dictionaries, or compact
+    :class:`scan_records.Host` records when ``records`` is true. Hosts
+    whose scan kept failing carry an ``error``. See
+    :func:`iter_scan_hosts` for ``journal``.
+    """
+    results = list(
+        iter_scan_hosts(
+            subnet,
+            ports,
+            service=service,
+            os_detect=os_detect,
+            scripts=scripts,
+            max_workers=max_workers,
+            timing=timing,
+            fast=fast,
+            records=records,
+            cancel=cancel,
+            journal=journal,
+            retries=retries,
+        )
+    )
+    SWEEP_HOSTS.set(len(results))
     return results
 
 
+@dataclass(slots=True)
+class EscalationRules:
+    """Decide which hosts of a quick sweep deserve a deep scan.
+
+    ``known`` maps the IPs of a previous scan to their MAC addresses; the
+    ``new_hosts`` and ``mac_changes`` rules only apply when it is given.
+    """
+
+    danger_ports: set[str] = field(default_factory=lambda: set(DANGER_PORTS))
+    new_hosts: bool = True
+    mac_changes: bool = True
+    known: dict[str, str] | None = None
+
+    @classmethod
+    def from_results(cls, previous: Iterable[dict | Host], **kwargs) -> "EscalationRules":
+        """Build rules that compare against earlier ``lan-scan`` output."""
+        known = {}
+        for item in map(as_dict, previous):
+            ip = item.get("ip") or item.get("device")
+            if ip:
+                known[ip] = (item.get("mac") or "").lower()
+        return cls(known=known, **kwargs)
+
+    def reasons(self, host: dict) -> list[str]:
+        """Return why ``host`` (a phase 1 result) should be escalated."""
+        found = []
+        open_ports = {str(p.get("port")) for p in host.get("ports", []) if p.get("state") == "open"}
+        found += [f"danger_port:{p}" for p in sorted(open_ports & self.danger_ports)]
+        if self.known is not None:
+            ip = host.get("ip", "")
+            mac = (host.get("mac") or "").lower()
+            if ip not in self.known:
+                if self.new_hosts:
+                    found.append("new_host")
+            elif self.mac_changes and mac and self.known[ip] and mac != self.known[ip]:
+                found.append("mac_changed")
+        return found
+
+
+@timed(SWEEP_SECONDS, SWEEP_ERRORS)
+def scan_pipeline(
+    subnet: str | list[str],
+    ports: list[str],
+    rules: EscalationRules | None = None,
+    service: bool = True,
+    os_detect: bool = True,
+    scripts: list[str] | None = None,
+    max_workers: int | None = None,
+    timing: int | None = None,
+    fast: bool = True,
+    cancel: Event | None = None,
+) -> dict[str, Any]:
+    """Sweep all hosts quickly, then deep scan only the ones ``rules`` select.
+
+    Phase 1 scans ``ports`` on every host without version detection, OS
+    detection or scripts. Hosts matching ``rules`` are scanned again with
+    ``service``/``os_detect``/``scripts`` and successful results replace the
+    quick ones; when the deep scan fails the quick result is kept with the
+    failure in ``deep_scan_error``. Returns ``{"devices": [...],
+    "scan_phases": {...}}`` where the phases map to the seconds they took;
+    escalated devices carry an ``escalated`` list of reasons.
+    """
+    rules = rules or EscalationRules()
+    options = dict(max_workers=max_workers, timing=timing, fast=fast, records=False, cancel=cancel)
+    phases: dict[str, float] = {}
+
+    start = time.perf_counter()
+    with SWEEP_PHASE_SECONDS.time(phase="discovery"):
+        hosts = gather_hosts(subnet)
+    phases["discovery"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    swept = list(
+        _iter_scan(hosts, ports, service=False, os_detect=False, scripts=[], phase="sweep", **options)
+    )
+    phases["sweep"] = time.perf_counter() - start
+
+    escalate = {}
+    for item in swept:
+        reasons = rules.reasons(item)
+        if reasons:
+            escalate[item["ip"]] = reasons
+    start = time.perf_counter()
+    deep = {}
+    deep_errors = {}
+    if escalate and not (cancel is not None and cancel.is_set()):
+        targets = [h for h in hosts if h["ip"] in escalate]
+        for item in _iter_scan(
+            targets, ports, service=service, os_detect=os_detect, scripts=scripts, phase="deep_scan", **options
+        ):
+            if item.get("error"):
+                deep_errors[item["ip"]] = item["error"]
+            else:
+                deep[item["ip"]] = item
+    phases["deep_scan"] = time.perf_counter() - start
+
+    devices = []
+    for item in swept:
+        ip = item["ip"]
+        if ip in deep:
+            item = deep[ip]
+        elif ip in deep_errors:
+            item["deep_scan_error"] = deep_errors[ip]
+        if ip in deep or ip in deep_errors:
+            item["escalated"] = escalate[ip]
+        devices.append(item)
+    SWEEP_HOSTS.set(len(devices))
+    return {"devices": devices, "scan_phases": {k: round(v, 3) for k, v in phases.items()}}
+
+
 def main():
     parser = argparse.ArgumentParser(description="LAN host discovery and port scan")
     parser.add_argument("--subnet", help="Subnet like 192.168.1.0/24")
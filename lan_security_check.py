@@ -2,13 +2,19 @@
 """Run LAN security diagnostics and output JSON results."""
 from __future__ import annotations
 
+import ipaddress
 import json
 import subprocess
 import re
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Any
 import sys
 
-from network_utils import _get_subnet
+from network_utils import _get_subnet, native_probes_enabled
+import dhcp_probe
+import nbstat
+import smb_probe
+import ssdp_probe
 
 from external_ip_report import (
     get_external_connections,
@@ -24,6 +30,13 @@ def _default_subnet() -> str:
     return _get_subnet() or "192.168.1.0/24"
 
 
+def _targets(subnet: str | Iterable[str]) -> List[str]:
+    """Return nmap target arguments for one subnet or a list of subnets."""
+    if isinstance(subnet, str):
+        return [subnet]
+    return list(subnet)
+
+
 def parse_arp_table(output: str) -> Dict[str, List[str]]:
     table: Dict[str, List[str]] = {}
     for line in output.splitlines():
@@ -54,14 +67,68 @@ def check_arp_spoofing() -> Dict[str, Any]:
         return {"status": "unknown", "details": str(e)}
 
 
+def _networks(subnet: str | Iterable[str]) -> List[ipaddress.IPv4Network | ipaddress.IPv6Network] | None:
+    """Return the networks of ``subnet``, or None if a target is not a CIDR network."""
+    try:
+        return [ipaddress.ip_network(t, strict=False) for t in _targets(subnet)]
+    except ValueError:
+        return None
+
+
+def _in_networks(address: str, networks: Iterable[ipaddress.IPv4Network | ipaddress.IPv6Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return False
+    return any(ip in net for net in networks)
+
+
 def parse_upnp_output(output: str) -> bool:
     return "UPnP" in output or "upnp" in output
 
 
-def check_upnp(subnet: str) -> Dict[str, Any]:
+def _upnp_result(devices: List[ssdp_probe.UpnpDevice]) -> Dict[str, Any]:
+    found = [
+        {
+            "ip": d.address,
+            "name": d.friendly_name or d.server,
+            "device_type": d.device_type,
+            "services": d.services,
+            "port_mapping": d.port_mapping,
+        }
+        for d in devices
+    ]
+    if not found:
+        return {"status": "ok", "devices": []}
+    igd = sorted({d["ip"] for d in found if d["port_mapping"]})
+    details = f"UPnP service detected on {len(found)} device(s)"
+    if igd:
+        details += f"; IGD port mapping exposed by {', '.join(igd)}"
+    return {"status": "warning", "details": details, "utm": ["firewall"], "devices": found}
+
+
+def check_upnp(subnet: str | Iterable[str], window: float = ssdp_probe.SEARCH_WINDOW) -> Dict[str, Any]:
+    """Look for UPnP devices in ``subnet``.
+
+    An SSDP M-SEARCH answers within ``window`` seconds for the whole link;
+    devices outside ``subnet`` are dropped (all are kept when ``subnet`` is
+    not made of CIDR networks). ``upnpc`` and a UDP nmap scan of ``subnet``
+    are only used when the multicast probe cannot be sent or native probes
+    are disabled.
+    """
+    if native_probes_enabled():
+        try:
+            devices = ssdp_probe.discover(window)
+        except OSError:
+            devices = None
+        if devices is not None:
+            networks = _networks(subnet)
+            if networks is not None:
+                devices = [d for d in devices if _in_networks(d.address, networks)]
+            return _upnp_result(devices)
     cmds = [
         ["upnpc", "-l"],
-        ["nmap", "-p", "1900", "-sU", "--script", "upnp-info", "-oN", "-", subnet],
+        ["nmap", "-p", "1900", "-sU", "--script", "upnp-info", "-oN", "-", *_targets(subnet)],
     ]
     for cmd in cmds:
         try:
@@ -91,8 +158,50 @@ def parse_netbios_output(output: str) -> List[str]:
     return hosts
 
 
-def check_netbios(subnet: str) -> Dict[str, Any]:
-    cmd = ["nmap", "-p", "137,138,139,445", "--open", "-oG", "-", subnet]
+# Larger ranges are left to nmap (NBSTAT transaction IDs are 16 bit)
+NETBIOS_NATIVE_MAX_TARGETS = 4096
+
+
+def _netbios_targets(subnet: str | Iterable[str]) -> List[str]:
+    hosts: List[str] = []
+    try:
+        for target in _targets(subnet):
+            net = ipaddress.ip_network(target, strict=False)
+            if net.num_addresses > NETBIOS_NATIVE_MAX_TARGETS:
+                return []
+            hosts.extend([str(net.network_address)] if net.num_addresses == 1 else (str(h) for h in net.hosts()))
+    except ValueError:
+        return []
+    return hosts if len(hosts) <= NETBIOS_NATIVE_MAX_TARGETS else []
+
+
+def check_netbios(subnet: str | Iterable[str]) -> Dict[str, Any]:
+    """Report hosts answering NetBIOS name service node status queries.
+
+    Ranges up to ``NETBIOS_NATIVE_MAX_TARGETS`` hosts are queried in one
+    :mod:`nbstat` batch; larger ones, and every range when native probes
+    are disabled, fall back to an nmap port scan of the NetBIOS/SMB ports.
+    """
+    targets = _netbios_targets(subnet) if native_probes_enabled() else []
+    if targets:
+        try:
+            answers = nbstat.query_hosts(targets)
+        except OSError:
+            answers = None
+        if answers is not None:
+            hosts = [
+                {"ip": r.ip, "name": r.name, "workgroup": r.workgroup, "mac": r.mac}
+                for r in answers.values()
+            ]
+            if hosts:
+                return {
+                    "status": "warning",
+                    "details": f"NetBIOS name service answering on {', '.join(h['ip'] for h in hosts)}",
+                    "utm": ["ips"],
+                    "hosts": hosts,
+                }
+            return {"status": "ok", "hosts": []}
+    cmd = ["nmap", "-p", "137,138,139,445", "--open", "-oG", "-", *_targets(subnet)]
     try:
         proc = subprocess.run(cmd, capture_output=True, text=True)
         if proc.returncode != 0:
@@ -113,20 +222,43 @@ def parse_dhcp_output(output: str) -> int:
     return len(re.findall(r"Server Identifier", output))
 
 
-def check_dhcp_multiple() -> Dict[str, Any]:
+def _dhcp_result(count: int, extra: Dict[str, Any]) -> Dict[str, Any]:
+    if count > 1:
+        return {
+            "status": "warning",
+            "details": f"Multiple DHCP servers detected: {count}",
+            "utm": ["ips"],
+            **extra,
+        }
+    return {"status": "ok", **extra}
+
+
+def check_dhcp_multiple(window: float = dhcp_probe.DISCOVER_WINDOW) -> Dict[str, Any]:
+    """Look for more than one DHCP server answering a DISCOVER.
+
+    The built-in prober stops as soon as a second server answers; with a
+    single server it waits the whole ``window``. When the DHCP client port
+    cannot be bound (no root) or native probes are disabled, nmap's
+    ``broadcast-dhcp-discover`` script is used instead.
+    """
+    offers = None
+    if native_probes_enabled():
+        try:
+            offers = dhcp_probe.discover_servers(expected=2, window=window)
+        except OSError:
+            pass
+    if offers is not None:
+        servers = [
+            {"server_id": o.server_id, "subnet": o.subnet, "routers": o.routers}
+            for o in offers
+        ]
+        return _dhcp_result(len(servers), {"servers": servers})
     cmd = ["nmap", "--script", "broadcast-dhcp-discover"]
     try:
         proc = subprocess.run(cmd, capture_output=True, text=True)
         if proc.returncode != 0:
             raise RuntimeError(proc.stderr.strip())
-        count = parse_dhcp_output(proc.stdout)
-        if count > 1:
-            return {
-                "status": "warning",
-                "details": f"Multiple DHCP servers detected: {count}",
-                "utm": ["ips"],
-            }
-        return {"status": "ok"}
+        return _dhcp_result(parse_dhcp_output(proc.stdout), {})
     except Exception as e:
         return {"status": "unknown", "details": str(e)}
 
@@ -135,8 +267,46 @@ def parse_smb_protocol_output(output: str) -> bool:
     return "SMBv1" in output or "SMB1" in output
 
 
-def check_smb_protocol(subnet: str) -> Dict[str, Any]:
-    cmd = ["nmap", "-p", "445", "--script", "smb-protocols", "-oN", "-", subnet]
+# Larger target sets are left to nmap
+SMB_NATIVE_MAX_TARGETS = 4096
+
+
+def check_smb_protocol(subnet: str | Iterable[str]) -> Dict[str, Any]:
+    """Report hosts that still accept an SMBv1 NEGOTIATE.
+
+    All hosts of ``subnet`` are probed concurrently with :mod:`smb_probe`;
+    nmap's ``smb-protocols`` script is used for ranges of more than
+    ``SMB_NATIVE_MAX_TARGETS`` addresses (checked before they are
+    expanded), when the native probe fails or when native probes are
+    disabled.
+    """
+    targets: List[str] = []
+    if native_probes_enabled():
+        try:
+            targets = smb_probe.expand_targets(_targets(subnet), limit=SMB_NATIVE_MAX_TARGETS)
+        except ValueError:
+            pass
+    if targets:
+        try:
+            results = smb_probe.probe_hosts(targets)
+        except OSError:
+            results = None
+        if results is not None:
+            hosts = [
+                {"ip": r.ip, "smb1": r.smb1, "smb1_dialect": r.smb1_dialect, "smb2_dialect": r.smb2_dialect}
+                for r in results
+                if r.open
+            ]
+            smb1 = [h["ip"] for h in hosts if h["smb1"]]
+            if smb1:
+                return {
+                    "status": "warning",
+                    "details": f"SMBv1 enabled on {', '.join(smb1)}",
+                    "utm": ["ips"],
+                    "hosts": hosts,
+                }
+            return {"status": "ok", "hosts": hosts}
+    cmd = ["nmap", "-p", "445", "--script", "smb-protocols", "-oN", "-", *_targets(subnet)]
     try:
         proc = subprocess.run(cmd, capture_output=True, text=True)
         if proc.returncode != 0:
@@ -188,17 +358,25 @@ def check_external_comm(geoip_db: str = "GeoLite2-Country.mmdb") -> Dict[str, An
     return result
 
 
-def run_checks(subnet: str | None = None) -> Dict[str, Any]:
-    """Run all LAN security checks and return results."""
+def run_checks(subnet: str | Iterable[str] | None = None) -> Dict[str, Any]:
+    """Run all LAN security checks and return results.
+
+    ``subnet`` may be a list of networks; subnet-scoped checks then pass all
+    of them to a single nmap run. The checks run concurrently, so the
+    collection windows of the DHCP, SSDP and NetBIOS probes overlap.
+    """
     subnet = subnet or _default_subnet()
-    results = {
-        "arp_spoofing": check_arp_spoofing(),
-        "upnp": check_upnp(subnet),
-        "netbios": check_netbios(subnet),
-        "dhcp": check_dhcp_multiple(),
-        "external_comm": check_external_comm(),
-        "smb_protocol": check_smb_protocol(subnet),
+    checks = {
+        "arp_spoofing": (check_arp_spoofing,),
+        "upnp": (check_upnp, subnet),
+        "netbios": (check_netbios, subnet),
+        "dhcp": (check_dhcp_multiple,),
+        "external_comm": (check_external_comm,),
+        "smb_protocol": (check_smb_protocol, subnet),
     }
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = {name: executor.submit(*call) for name, call in checks.items()}
+        results = {name: fut.result() for name, fut in futures.items()}
     utm = set()
     for res in results.values():
         if res.get("status") == "warning":
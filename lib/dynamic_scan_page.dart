@@ -40,6 +40,11 @@ class _DynamicScanPageState extends State<DynamicScanPage> {
     try {
       await _service.stopScan();
       _timer?.cancel();
+      // the server finishes running nmap processes before it is idle
+      while (mounted && await _service.pollStatus() != 'idle') {
+        await Future.delayed(const Duration(milliseconds: 500));
+      }
+      if (!mounted) return;
       setState(() => _running = false);
       _showMessage('スキャン停止');
     } catch (e) {
@@ -28,6 +28,19 @@ class DynamicScanService {
     }
   }
 
+  /// Fetch the scan loop state: `running`, `stopping` or `idle`.
+  ///
+  /// `stopScan` returns before the loop has ended; poll this until it
+  /// reports `idle` before starting a new scan.
+  Future<String> pollStatus() async {
+    final res = await http.get(Uri.parse('$baseUrl/dynamic-scan/status'));
+    if (res.statusCode != 200) {
+      throw Exception('Failed to fetch status: ${res.body}');
+    }
+    final data = jsonDecode(res.body) as Map<String, dynamic>;
+    return data['state'] as String? ?? 'idle';
+  }
+
   /// Fetch current scan results.
   Future<List<DynamicScanResult>> fetchResults() async {
     final res = await http.get(Uri.parse('$baseUrl/dynamic-scan/results'));
@@ -0,0 +1,256 @@
+"""In-process counters, gauges and histograms in Prometheus text format.
+
+Recording a value is a lock-protected dictionary update, so instrumentation
+stays cheap when nobody scrapes. :func:`render` produces the exposition text
+served by the ``/metrics`` endpoint of ``src/api.py``. The scanner metrics
+are defined at the bottom of this module so every importer shares them.
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+from abc import ABC, abstractmethod
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric(ABC):
+    """Base of the metric types; subclasses set ``kind`` and render samples."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Return the exposition lines of every labelled value."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"duplicate metric {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> _Metric | None:
+        return self._metrics.get(name)
+
+    def reset(self) -> None:
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labelnames))  # type: ignore[return-value]
+
+
+def histogram(
+    name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+
+def render() -> str:
+    """Return all registered metrics in Prometheus text format."""
+    return REGISTRY.render()
+
+
+def timed(hist: Histogram, errors: Counter | None = None, **labels: Any) -> Callable:
+    """Decorator observing the duration of each call in ``hist``.
+
+    Exceptions are counted in ``errors`` (when given) and re-raised.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(**labels)
+                raise
+            finally:
+                hist.observe(time.perf_counter() - start, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+# Scanner metrics
+NMAP_SECONDS = histogram("nwcd_nmap_seconds", "Duration of nmap processes", ["kind"])
+NMAP_FAILURES = counter(
+    "nwcd_nmap_failures_total", "nmap runs that failed, stalled or timed out", ["kind", "reason"]
+)
+DISCOVERY_BLOCK_SECONDS = histogram(
+    "nwcd_discovery_block_seconds", "Duration of _run_nmap_scan per sweep block, including name lookups"
+)
+HOST_SCAN_SECONDS = histogram("nwcd_host_scan_seconds", "Duration of run_scan per host")
+HOST_SCAN_ERRORS = counter("nwcd_host_scan_errors_total", "run_scan calls that raised")
+HOST_SCAN_RETRIES = counter("nwcd_host_scan_retries_total", "Host scans retried after a failure")
+VENDOR_LOOKUP_SECONDS = histogram(
+    "nwcd_vendor_lookup_seconds",
+    "Duration of MAC vendor lookups",
+    ["source"],
+    buckets=(0.0001, 0.001, 0.01, 0.1, 0.5, 1.0, 3.0, 5.0),
+)
+SWEEP_SECONDS = histogram("nwcd_sweep_seconds", "Duration of scan_hosts sweeps")
+SWEEP_PHASE_SECONDS = histogram(
+    "nwcd_sweep_phase_seconds", "Duration of sweep phases", ["phase"]
+)
+SWEEP_ERRORS = counter("nwcd_sweep_errors_total", "scan_hosts sweeps that raised")
+SWEEP_HOSTS = gauge("nwcd_sweep_hosts", "Hosts found by the last completed sweep")
+SCAN_QUEUE_DEPTH = gauge("nwcd_scan_queue_depth", "Hosts waiting for or undergoing a port scan")
+ARP_ALERTS = counter("nwcd_arp_alerts_total", "Suspicious neighbour table changes seen by arp_watch", ["kind"])
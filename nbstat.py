@@ -0,0 +1,180 @@
+"""Batch NetBIOS node status (NBSTAT) queries over UDP/137.
+
+Node status requests for every target are sent from one socket and replies
+are matched back by transaction ID (and source address) during a single
+bounded wait, so a whole range costs about ``timeout`` seconds instead of
+one ``nbtscan`` run per host.
+"""
+from __future__ import annotations
+
+import errno
+import ipaddress
+import os
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NBNS_PORT = 137
+# Seconds to wait for replies after the last request is sent
+NBSTAT_TIMEOUT = 1.0
+
+NBSTAT_TYPE = 0x0021
+IN_CLASS = 0x0001
+GROUP_FLAG = 0x8000
+# Wildcard name "*" padded with NULs, first-level encoded
+_WILDCARD = b"\x20" + b"CK" + b"AA" * 15 + b"\x00"
+_HEADER = struct.Struct("!HHHHHH")
+
+
+@dataclass(slots=True)
+class NbstatResult:
+    ip: str
+    name: str = ""
+    workgroup: str = ""
+    mac: str = ""
+    names: List[str] = field(default_factory=list)
+
+
+def build_request(txid: int) -> bytes:
+    return _HEADER.pack(txid, 0, 1, 0, 0, 0) + _WILDCARD + struct.pack("!HH", NBSTAT_TYPE, IN_CLASS)
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while offset < len(data):
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += 1 + length
+    raise ValueError("truncated name")
+
+
+def parse_response(data: bytes, ip: str = "") -> Tuple[int, Optional[NbstatResult]]:
+    """Return ``(txid, result)`` for an NBSTAT response.
+
+    ``result`` is None when ``data`` is not a positive node status answer.
+    """
+    if len(data) < _HEADER.size:
+        return -1, None
+    txid, flags, _, ancount, _, _ = _HEADER.unpack_from(data)
+    if not flags & 0x8000 or flags & 0x000F or ancount < 1:
+        return txid, None
+    try:
+        offset = _skip_name(data, _HEADER.size)
+        rtype, _, _, rdlength = struct.unpack_from("!HHIH", data, offset)
+    except (ValueError, struct.error):
+        return txid, None
+    offset += 10
+    if rtype != NBSTAT_TYPE or offset + rdlength > len(data) or rdlength < 1:
+        return txid, None
+    count = data[offset]
+    offset += 1
+    result = NbstatResult(ip)
+    for _ in range(count):
+        if offset + 18 > len(data):
+            break
+        raw = data[offset:offset + 15]
+        suffix = data[offset + 15]
+        nb_flags = struct.unpack_from("!H", data, offset + 16)[0]
+        offset += 18
+        name = raw.decode("ascii", errors="replace").rstrip(" \0")
+        result.names.append(f"{name}<{suffix:02x}>")
+        if suffix == 0x00:
+            if nb_flags & GROUP_FLAG:
+                result.workgroup = result.workgroup or name
+            else:
+                result.name = result.name or name
+    if offset + 6 <= len(data):
+        mac = data[offset:offset + 6]
+        if any(mac):
+            result.mac = ":".join(f"{b:02x}" for b in mac)
+    return txid, result
+
+
+def query_hosts(
+    targets: Iterable[str],
+    *,
+    timeout: float = NBSTAT_TIMEOUT,
+    port: int = NBNS_PORT,
+) -> Dict[str, NbstatResult]:
+    """Send NBSTAT requests to all IPv4 ``targets`` and collect replies.
+
+    Returns results for the hosts that answered within ``timeout`` seconds
+    of the last request; the wait ends early once every host has answered.
+    """
+    ips = [ip for ip in dict.fromkeys(targets) if ":" not in ip]
+    if not ips:
+        return {}
+    base = int.from_bytes(os.urandom(2), "big")
+    pending: Dict[int, str] = {}
+    results: Dict[str, NbstatResult] = {}
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        sock.bind(("", 0))
+
+        def accept(data: bytes, addr: Tuple[str, int]) -> None:
+            txid, result = parse_response(data, addr[0])
+            if result is not None and pending.get(txid) == addr[0]:
+                results[addr[0]] = result
+                del pending[txid]
+
+        def drain() -> None:
+            while True:
+                try:
+                    accept(*sock.recvfrom(2048))
+                except (BlockingIOError, InterruptedError):
+                    return
+                except ConnectionError:
+                    # ICMP port unreachable reported on Windows
+                    continue
+
+        for i, ip in enumerate(ips):
+            txid = (base + i) & 0xFFFF
+            pending[txid] = ip
+            packet = build_request(txid)
+            while True:
+                try:
+                    sock.sendto(packet, (ip, port))
+                    break
+                except OSError as e:
+                    if e.errno in (errno.ENOBUFS, errno.EAGAIN, errno.EWOULDBLOCK):
+                        # send queue full: take replies off the socket and retry
+                        drain()
+                        time.sleep(0.001)
+                        continue
+                    # unreachable network and the like: this host cannot answer
+                    pending.pop(txid, None)
+                    break
+            drain()
+
+        sock.setblocking(True)
+        end = time.monotonic() + timeout
+        while pending:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                accept(*sock.recvfrom(2048))
+            except socket.timeout:
+                break
+            except ConnectionError:
+                continue
+    finally:
+        sock.close()
+    return {ip: results[ip] for ip in ips if ip in results}
+
+
+def query_range(targets: str | Iterable[str], **kwargs) -> Dict[str, NbstatResult]:
+    """Query every host address of the networks in ``targets``."""
+    if isinstance(targets, str):
+        targets = [targets]
+    hosts: List[str] = []
+    for target in targets:
+        net = ipaddress.ip_network(target, strict=False)
+        hosts.extend([str(net.network_address)] if net.num_addresses == 1 else (str(h) for h in net.hosts()))
+    return query_hosts(hosts, **kwargs)
@@ -0,0 +1,262 @@
+"""IPv6 host discovery through the all-nodes group and the neighbour cache.
+
+A /64 cannot be enumerated the way ``nmap -sn`` sweeps an IPv4 subnet.
+Instead an ICMPv6 echo request is sent to ``ff02::1`` on every interface,
+once from each usable source address so hosts answer from their
+link-local as well as their global addresses. Replies (and the neighbour
+solicitations the kernel sends to deliver them) fill the kernel neighbour
+cache, which is then read in one rtnetlink dump. Hosts that answered and
+cache entries the kernel currently confirms are reported; a ``STALE`` entry
+can outlive its host by hours and only supplies the MAC of a responder. A
+sweep takes about ``window`` seconds regardless of the prefix size.
+"""
+from __future__ import annotations
+
+import ipaddress
+import os
+import re
+import select
+import socket
+import struct
+import subprocess
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from arp_watch import parse_neigh_states
+from netlink import (
+    NDMSG,
+    NLM_F_DUMP,
+    NLM_F_REQUEST,
+    NLMSG_DONE,
+    NLMSG_ERROR,
+    NLMSGHDR,
+    NUD_DELAY,
+    NUD_NOARP,
+    NUD_PERMANENT,
+    NUD_PROBE,
+    NUD_REACHABLE,
+    NUD_STALE,
+    NUD_VALID,
+    RTM_GETNEIGH,
+)
+
+ALL_NODES = "ff02::1"
+# Seconds to collect echo replies after the requests are sent
+ECHO_WINDOW = 1.5
+
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+# Entries that were recently confirmed or are being confirmed right now
+NUD_CONFIRMED = NUD_REACHABLE | NUD_DELAY | NUD_PROBE
+_NUD_NAMES = {
+    "REACHABLE": NUD_REACHABLE,
+    "STALE": NUD_STALE,
+    "DELAY": NUD_DELAY,
+    "PROBE": NUD_PROBE,
+    "NOARP": NUD_NOARP,
+    "PERMANENT": NUD_PERMANENT,
+}
+
+_NEIGH_RE = re.compile(r"^(\S+) dev \S+ lladdr ([0-9a-fA-F:]{17})\b(.*)$")
+
+
+def build_echo(ident: int, seq: int) -> bytes:
+    # the kernel fills in the ICMPv6 checksum for raw ICMPv6 sockets
+    return struct.pack("!BBHHH", ICMP6_ECHO_REQUEST, 0, 0, ident, seq) + b"nwcd"
+
+
+def _strip_scope(address: str) -> str:
+    return address.split("%", 1)[0]
+
+
+def ping_all_nodes(
+    sources: Iterable[Tuple[str, int]],
+    window: float = ECHO_WINDOW,
+) -> Dict[str, int]:
+    """Send an echo to ``ff02::1`` from each ``(address, ifindex)`` source.
+
+    Returns ``{address: ifindex}`` for every host that answered within
+    ``window`` seconds. Raises :class:`OSError` when no ICMPv6 socket can
+    be opened (raw sockets need root).
+    """
+    ident = int.from_bytes(os.urandom(2), "big")
+    socks: List[Tuple[socket.socket, int]] = []
+    found: Dict[str, int] = {}
+    error: Optional[OSError] = None
+    try:
+        for seq, (address, ifindex) in enumerate(sources, 1):
+            try:
+                sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6)
+            except OSError as e:
+                error = e
+                break
+            socks.append((sock, ifindex))
+            try:
+                sock.setblocking(False)
+                sock.bind((address, 0, 0, ifindex))
+                sock.sendto(build_echo(ident, seq), (ALL_NODES, 0, 0, ifindex))
+            except OSError as e:
+                # address not usable (e.g. tentative); other sources still count
+                error = e
+        if not socks:
+            raise error or OSError("no IPv6 source address")
+        end = time.monotonic() + window
+        by_fd = {s.fileno(): (s, ifindex) for s, ifindex in socks}
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select(list(by_fd), [], [], remaining)
+            for fd in ready:
+                sock, ifindex = by_fd[fd]
+                try:
+                    data, addr = sock.recvfrom(2048)
+                except OSError:
+                    continue
+                if len(data) >= 8 and data[0] == ICMP6_ECHO_REPLY and struct.unpack_from("!H", data, 4)[0] == ident:
+                    found.setdefault(_strip_scope(addr[0]), addr[3] or ifindex)
+    finally:
+        for sock, _ in socks:
+            sock.close()
+    return found
+
+
+def _dump_netlink_neighbours(family: int) -> List[Tuple[str, str, int]]:
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+    try:
+        sock.settimeout(2.0)
+        body = NDMSG.pack(family, 0, 0, 0, 0)
+        sock.send(NLMSGHDR.pack(NLMSGHDR.size + len(body), RTM_GETNEIGH, NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + body)
+        entries: List[Tuple[str, str, int]] = []
+        while True:
+            data = sock.recv(65536)
+            entries.extend(e for e in parse_neigh_states(data) if e[2] & NUD_VALID)
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+                if msg_type == NLMSG_DONE:
+                    return entries
+                if msg_type == NLMSG_ERROR:
+                    raise OSError("neighbour dump failed")
+                if length < NLMSGHDR.size:
+                    return entries
+                offset += (length + 3) & ~3
+    finally:
+        sock.close()
+
+
+def read_neighbours(family: int = socket.AF_INET6) -> List[Tuple[str, str, int]]:
+    """Return valid ``(ip, mac, nud_state)`` entries of the kernel neighbour cache.
+
+    Uses an rtnetlink dump and falls back to ``ip neigh show``.
+    """
+    if hasattr(socket, "AF_NETLINK"):
+        try:
+            return _dump_netlink_neighbours(family)
+        except OSError:
+            pass
+    flag = "-6" if family == socket.AF_INET6 else "-4"
+    try:
+        proc = subprocess.run(["ip", flag, "neigh", "show"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return []
+    return parse_ip_neigh(proc.stdout) if proc.returncode == 0 else []
+
+
+def parse_ip_neigh(output: str) -> List[Tuple[str, str, int]]:
+    """Parse ``ip neigh show`` output into valid ``(ip, mac, nud_state)`` entries."""
+    entries = []
+    for line in output.splitlines():
+        m = _NEIGH_RE.match(line.strip())
+        if not m:
+            continue
+        state = 0
+        for word in m.group(3).split():
+            state |= _NUD_NAMES.get(word, 0)
+        if state & NUD_VALID:
+            entries.append((m.group(1), m.group(2).lower(), state))
+    return entries
+
+
+def _sources(interfaces: Iterable[Dict[str, Any]], net: Optional[ipaddress.IPv6Network]) -> List[Tuple[str, int]]:
+    sources = []
+    for iface in interfaces:
+        try:
+            ifindex = socket.if_nametoindex(iface["name"])
+        except OSError:
+            continue
+        for address in iface.get("addresses", []):
+            try:
+                ip = ipaddress.ip_address(address)
+            except ValueError:
+                continue
+            if ip.version != 6:
+                continue
+            # hosts answer from an address of the same scope as the source
+            if net is None or ip in net or (ip.is_link_local and net.is_link_local):
+                sources.append((address, ifindex))
+    return sources
+
+
+def discover(
+    subnet: str | None = None,
+    *,
+    interfaces: Iterable[Dict[str, Any]],
+    window: float = ECHO_WINDOW,
+    ipv4_hosts: Iterable[Dict[str, Any]] = (),
+) -> List[Dict[str, str]]:
+    """Return IPv6 hosts on the links of ``interfaces``.
+
+    ``interfaces`` are :func:`network_utils.get_interfaces` entries. Hosts
+    that answered the echo are returned, plus neighbour cache entries in a
+    confirmed state (``REACHABLE``, ``DELAY`` or ``PROBE``); ``STALE`` and
+    static entries are not proof that a host is still there. Only
+    addresses inside ``subnet`` are returned (link-local ones when
+    ``subnet`` is link-local or not given). Records use the discovery shape
+    ``{"ip", "mac", "vendor", "hostname"}``; vendor and hostname are copied
+    from the ``ipv4_hosts`` record with the same MAC.
+    """
+    interfaces = list(interfaces)
+    net = ipaddress.IPv6Network(subnet, strict=False) if subnet else None
+    local = {_strip_scope(a) for iface in interfaces for a in iface.get("addresses", [])}
+    sources = _sources(interfaces, net)
+    replied: Dict[str, int] = {}
+    if sources:
+        try:
+            replied = ping_all_nodes(sources, window)
+        except OSError:
+            # without raw sockets the neighbour cache alone still helps
+            replied = {}
+    neighbours = read_neighbours(socket.AF_INET6)
+    macs = {ip: mac for ip, mac, _ in neighbours}
+    confirmed = [ip for ip, _, state in neighbours if state & NUD_CONFIRMED]
+    twins = {}
+    for h in ipv4_hosts:
+        mac = (h.get("mac") or "").lower()
+        if mac:
+            twins.setdefault(mac, h)
+
+    def wanted(address: str) -> bool:
+        ip = ipaddress.IPv6Address(address)
+        if ip.is_multicast or address in local:
+            return False
+        if net is None:
+            return True
+        return ip in net or (ip.is_link_local and net.is_link_local)
+
+    results = []
+    for address in dict.fromkeys([*replied, *confirmed]):
+        if not wanted(address):
+            continue
+        mac = macs.get(address, "")
+        twin = twins.get(mac, {}) if mac else {}
+        results.append(
+            {
+                "ip": address,
+                "mac": mac,
+                "vendor": twin.get("vendor", ""),
+                "hostname": twin.get("hostname", ""),
+            }
+        )
+    return results
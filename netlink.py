@@ -0,0 +1,31 @@
+"""rtnetlink structures and constants for the neighbour table.
+
+Shared by :mod:`arp_watch` (neighbour events) and :mod:`ndp_discovery`
+(neighbour dumps).
+"""
+from __future__ import annotations
+
+import struct
+
+RTMGRP_NEIGH = 0x4
+RTM_NEWNEIGH = 28
+RTM_GETNEIGH = 30
+NDA_DST = 1
+NDA_LLADDR = 2
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+NUD_REACHABLE = 0x02
+NUD_STALE = 0x04
+NUD_DELAY = 0x08
+NUD_PROBE = 0x10
+NUD_NOARP = 0x40
+NUD_PERMANENT = 0x80
+# Entries with a usable MAC
+NUD_VALID = NUD_REACHABLE | NUD_STALE | NUD_DELAY | NUD_PROBE | NUD_NOARP | NUD_PERMANENT
+
+NLMSGHDR = struct.Struct("=IHHII")
+NDMSG = struct.Struct("=BxxxiHBB")
+RTATTR = struct.Struct("=HH")
@@ -2,16 +2,30 @@
 """Utility functions for network discovery and scanning."""
 
 import ipaddress
+import math
 import os
 import re
 import socket
 import subprocess
 import sys
+import threading
+import time
 import xml.etree.ElementTree as ET
 from pathlib import Path
 from urllib.error import URLError
 from urllib.request import urlopen
 import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator
+
+import nbstat
+import ndp_discovery
+from metrics import DISCOVERY_BLOCK_SECONDS, NMAP_FAILURES, NMAP_SECONDS, VENDOR_LOOKUP_SECONDS, timed
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - optional
+    psutil = None
 
 # Cache for MAC prefix to vendor lookups
 _VENDOR_CACHE: dict[str, str] = {}
@@ -19,9 +33,163 @@ _VENDOR_CACHE: dict[str, str] = {}
 # Default timeout for nmap operations
 SCAN_TIMEOUT = 60
 
+# Number of addresses swept by a single ``nmap -sn`` run. Larger ranges are
+# split into blocks of this size and swept block by block.
+SWEEP_BLOCK_SIZE = 256
+# Maximum number of concurrent ``nmap -sn`` runs for a chunked sweep
+SWEEP_WORKERS = 4
+# Lower bound for the timeout of a single sweep block
+MIN_BLOCK_TIMEOUT = 15
+# Ranges that would need more blocks than this cannot be enumerated (e.g. an
+# IPv6 /64) and are handed to nmap unsplit.
+MAX_SWEEP_BLOCKS = 65536
+
+# Seconds an interface inventory is trusted before it is checked for changes
+INTERFACE_CACHE_TTL = 30.0
+
+# Process-wide interface inventory cache
+_IFACE_CACHE: dict[str, Any] = {"checked": None, "signature": None, "interfaces": []}
+_IFACE_LOCK = threading.Lock()
+
+
+def _prefixlen(netmask: str) -> int:
+    """Return prefix length for an IPv4/IPv6 netmask string."""
+    return bin(int(ipaddress.ip_address(netmask))).count("1")
+
+
+def _interface_signature():
+    """Return a hashable snapshot of interface addresses and link states.
+
+    Interfaces keep the order psutil reports (the kernel's order), which
+    ``_get_subnet`` falls back to when the default route is unknown.
+    """
+    addrs = psutil.net_if_addrs()
+    stats = psutil.net_if_stats()
+    return tuple(
+        (
+            name,
+            bool(stats[name].isup) if name in stats else False,
+            tuple(sorted((int(a.family), a.address or "", a.netmask or "") for a in entries)),
+        )
+        for name, entries in addrs.items()
+    )
+
+
+def _build_interfaces(signature) -> list[dict[str, Any]]:
+    interfaces = []
+    link_families = {int(getattr(psutil, "AF_LINK", -1)), int(getattr(socket, "AF_PACKET", -1))}
+    for name, isup, entries in signature:
+        if not isup:
+            continue
+        iface: dict[str, Any] = {"name": name, "mac": "", "addresses": [], "ipv4": [], "ipv6": []}
+        for family, address, netmask in entries:
+            if family in link_families:
+                iface["mac"] = address.replace("-", ":").lower()
+                continue
+            if family not in (int(socket.AF_INET), int(socket.AF_INET6)) or not netmask:
+                continue
+            address = address.split("%", 1)[0]
+            try:
+                ip = ipaddress.ip_address(address)
+                network = ipaddress.ip_network(f"{address}/{_prefixlen(netmask)}", strict=False)
+            except ValueError:
+                continue
+            if ip.is_loopback:
+                continue
+            iface["addresses"].append(address)
+            if ip.is_link_local:
+                continue
+            key = "ipv4" if ip.version == 4 else "ipv6"
+            if str(network) not in iface[key]:
+                iface[key].append(str(network))
+        if iface["addresses"]:
+            interfaces.append(iface)
+    return interfaces
+
+
+def _copy_interface(iface: dict[str, Any]) -> dict[str, Any]:
+    return {k: list(v) if isinstance(v, list) else v for k, v in iface.items()}
+
+
+def invalidate_interfaces() -> None:
+    """Drop the cached interface inventory."""
+    with _IFACE_LOCK:
+        _IFACE_CACHE.update(checked=None, signature=None, interfaces=[])
+
+
+def get_interfaces(refresh: bool = False) -> list[dict[str, Any]]:
+    """Return every up, non-loopback interface with its IPv4/IPv6 networks.
+
+    Each entry has ``name``, ``mac``, ``addresses`` and the ``ipv4``/``ipv6``
+    networks in CIDR notation (link-local networks are left out). The result
+    is cached for the life of the process; after ``INTERFACE_CACHE_TTL``
+    seconds the interface table is re-read and the inventory rebuilt only if
+    addresses or link states changed.
+    """
+    if psutil is None:
+        return []
+    now = time.monotonic()
+    with _IFACE_LOCK:
+        checked = _IFACE_CACHE["checked"]
+        if not refresh and checked is not None and now - checked < INTERFACE_CACHE_TTL:
+            return [_copy_interface(i) for i in _IFACE_CACHE["interfaces"]]
+        try:
+            signature = _interface_signature()
+        except Exception:
+            return []
+        if refresh or signature != _IFACE_CACHE["signature"]:
+            _IFACE_CACHE["interfaces"] = _build_interfaces(signature)
+            _IFACE_CACHE["signature"] = signature
+        _IFACE_CACHE["checked"] = now
+        return [_copy_interface(i) for i in _IFACE_CACHE["interfaces"]]
+
+
+def native_probes_enabled() -> bool:
+    """Return False when ``NWCD_NATIVE_PROBES=0`` asks for nmap-only checks.
+
+    The built-in DHCP/SSDP/NetBIOS/SMB/NDP probes talk to the real network,
+    so the load harness turns them off to measure the synthetic nmap alone.
+    """
+    return os.environ.get("NWCD_NATIVE_PROBES", "1").lower() not in ("0", "false", "no")
+
+
+def get_local_subnets(include_ipv6: bool = False) -> list[str]:
+    """Return all local networks of the up interfaces in CIDR notation."""
+    subnets: list[str] = []
+    for iface in get_interfaces():
+        for net in iface["ipv4"] + (iface["ipv6"] if include_ipv6 else []):
+            if net not in subnets:
+                subnets.append(net)
+    return subnets
+
+
+def _default_route_address() -> str:
+    """Return the local IPv4 address used for the default route, or ``""``."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        # connecting a UDP socket only selects a route; nothing is sent
+        sock.connect(("198.51.100.1", 9))
+        return sock.getsockname()[0]
+    except OSError:
+        return ""
+    finally:
+        sock.close()
+
 
 def _get_subnet():
-    """Return the local subnet in CIDR notation or ``None`` if undetected."""
+    """Return the local subnet in CIDR notation or ``None`` if undetected.
+
+    The network of the interface holding the default route is preferred over
+    other interfaces (e.g. ``docker0`` or ``br-*`` bridges).
+    """
+    interfaces = [i for i in get_interfaces() if i["ipv4"]]
+    if interfaces:
+        source = _default_route_address()
+        for iface in interfaces:
+            for net in iface["ipv4"]:
+                if source and ipaddress.ip_address(source) in ipaddress.ip_network(net):
+                    return net
+        return interfaces[0]["ipv4"][0]
     if os.name == "nt":
         try:
             proc = subprocess.run(["ipconfig"], capture_output=True, text=True)
@@ -83,23 +251,9 @@ def _get_subnet():
     return None
 
 
-def _run_nmap_scan(subnet: str, *, timeout: int = SCAN_TIMEOUT):
-    """Run ``nmap`` host discovery and return parsed results including hostnames."""
-    cmd = ["nmap"]
-    try:
-        if ipaddress.ip_network(subnet, strict=False).version == 6:
-            cmd.append("-6")
-    except Exception:
-        if ":" in subnet:
-            cmd.append("-6")
-    cmd += ["-R", "-sn", subnet, "-oX", "-"]
-    try:
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-    except subprocess.TimeoutExpired:
-        raise RuntimeError("nmap host discovery timed out")
-    if proc.returncode != 0:
-        raise RuntimeError(proc.stderr.strip())
-    root = ET.fromstring(proc.stdout)
+def _parse_discovery_xml(output: str) -> list[dict[str, str]]:
+    """Parse ``nmap -sn -oX`` output into discovery dictionaries."""
+    root = ET.fromstring(output)
     results = []
     for host in root.findall("host"):
         ip = None
@@ -117,11 +271,50 @@ def _run_nmap_scan(subnet: str, *, timeout: int = SCAN_TIMEOUT):
             hostname = hn.get("name", "")
         if ip:
             results.append({"ip": ip, "mac": mac, "vendor": vendor, "hostname": hostname})
+    return results
+
+
+@timed(DISCOVERY_BLOCK_SECONDS)
+def _run_nmap_scan(subnet: str, *, timeout: int = SCAN_TIMEOUT):
+    """Run ``nmap`` host discovery and return parsed results including hostnames."""
+    cmd = ["nmap"]
+    try:
+        if ipaddress.ip_network(subnet, strict=False).version == 6:
+            cmd.append("-6")
+    except Exception:
+        if ":" in subnet:
+            cmd.append("-6")
+    cmd += ["-R", "-sn", subnet, "-oX", "-"]
+    with NMAP_SECONDS.time(kind="discovery"):
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            NMAP_FAILURES.inc(kind="discovery", reason="timeout")
+            raise RuntimeError("nmap host discovery timed out")
+    if proc.returncode != 0:
+        NMAP_FAILURES.inc(kind="discovery", reason="error")
+        raise RuntimeError(proc.stderr.strip())
+    results = _parse_discovery_xml(proc.stdout)
 
+    unnamed = [h["ip"] for h in results if not h["hostname"] and ":" not in h["ip"]]
+    netbios: dict[str, nbstat.NbstatResult] | None = None
+    # the batch waits up to nbstat.NBSTAT_TIMEOUT for hosts that never answer
+    if unnamed and native_probes_enabled():
+        try:
+            netbios = nbstat.query_hosts(unnamed)
+        except OSError:
+            pass
     for h in results:
-        if h.get("hostname"):
+        if h["hostname"]:
+            continue
+        nb = netbios.get(h["ip"]) if netbios is not None else None
+        if nb is not None and nb.name:
+            h["hostname"] = nb.name
+            if not h["mac"] and nb.mac:
+                h["mac"] = nb.mac
             continue
-        if ":" not in h["ip"] and shutil.which("nbtscan"):
+        if netbios is None and ":" not in h["ip"] and shutil.which("nbtscan"):
+            # native NBSTAT disabled or unavailable: one nbtscan per host
             try:
                 proc = subprocess.run(
                     ["nbtscan", "-q", h["ip"]],
@@ -137,8 +330,8 @@ def _run_nmap_scan(subnet: str, *, timeout: int = SCAN_TIMEOUT):
                             h["hostname"] = parts[1]
             except Exception:
                 pass
-        if h.get("hostname"):
-            continue
+            if h["hostname"]:
+                continue
         if shutil.which("avahi-resolve"):
             try:
                 proc = subprocess.run(
@@ -160,17 +353,131 @@ def _run_nmap_scan(subnet: str, *, timeout: int = SCAN_TIMEOUT):
                 pass
 
     for h in results:
-        if h.get("mac") and not h.get("vendor"):
+        if h["mac"] and not h["vendor"]:
             h["vendor"] = _lookup_vendor(h["mac"])
     return results
 
 
+def plan_ranges(subnet: str, block_size: int = SWEEP_BLOCK_SIZE) -> list[str]:
+    """Split ``subnet`` into CIDR blocks of at most ``block_size`` addresses.
+
+    Targets that are not CIDR networks (hostnames, nmap range syntax) are
+    returned unchanged as a single block.
+    """
+    try:
+        net = ipaddress.ip_network(subnet, strict=False)
+    except ValueError:
+        return [subnet]
+    if net.num_addresses <= block_size:
+        return [str(net)]
+    new_prefix = net.max_prefixlen - (max(1, block_size).bit_length() - 1)
+    if 2 ** (new_prefix - net.prefixlen) > MAX_SWEEP_BLOCKS:
+        return [str(net)]
+    return [str(block) for block in net.subnets(new_prefix=new_prefix)]
+
+
+def block_timeout(block: str) -> int:
+    """Return nmap timeout for a sweep block, scaled to its size."""
+    try:
+        size = ipaddress.ip_network(block, strict=False).num_addresses
+    except ValueError:
+        return SCAN_TIMEOUT
+    size = min(size, SWEEP_BLOCK_SIZE * 4)
+    return max(MIN_BLOCK_TIMEOUT, math.ceil(SCAN_TIMEOUT * size / SWEEP_BLOCK_SIZE))
+
+
+def uses_ndp(target: str, block_size: int = SWEEP_BLOCK_SIZE) -> bool:
+    """Return True for IPv6 ranges too large to sweep address by address."""
+    try:
+        net = ipaddress.ip_network(target, strict=False)
+    except ValueError:
+        return False
+    return net.version == 6 and net.num_addresses > block_size
+
+
+def iter_sweep(
+    subnet: str | Iterable[str],
+    *,
+    scan_fn: Callable[..., list[dict[str, str]]] | None = None,
+    block_size: int = SWEEP_BLOCK_SIZE,
+    max_workers: int = SWEEP_WORKERS,
+) -> Iterator[dict[str, str]]:
+    """Sweep ``subnet`` block by block and yield hosts as blocks finish.
+
+    ``subnet`` may also be a list of targets (e.g. from
+    :func:`get_local_subnets`); their blocks share the same worker pool.
+    At most ``max_workers`` blocks are scanned at once. A failing or timed
+    out block is reported on ``stderr`` and skipped so that the hosts of the
+    other blocks are not lost; the error is only raised when every block
+    failed.
+
+    With the default nmap scanner, IPv6 prefixes larger than one block
+    (e.g. a /64) are found through :mod:`ndp_discovery` after the other
+    targets, matching their MACs to the hosts already found.
+    """
+    scan_fn = scan_fn or _run_nmap_scan
+    targets = [subnet] if isinstance(subnet, str) else list(subnet)
+    ndp_targets = [t for t in targets if scan_fn is _run_nmap_scan and uses_ndp(t, block_size)]
+    blocks = [b for target in targets if target not in ndp_targets for b in plan_ranges(target, block_size)]
+    found: list[dict[str, str]] = []
+    for host in _iter_blocks(blocks, scan_fn, max_workers):
+        found.append(host)
+        yield host
+    for target in ndp_targets:
+        yield from ndp_discovery.discover(target, interfaces=get_interfaces(), ipv4_hosts=found)
+
+
+def _iter_blocks(
+    blocks: list[str],
+    scan_fn: Callable[..., list[dict[str, str]]],
+    max_workers: int,
+) -> Iterator[dict[str, str]]:
+    if not blocks:
+        return
+    if len(blocks) == 1:
+        yield from scan_fn(blocks[0], timeout=block_timeout(blocks[0]))
+        return
+
+    pending = iter(blocks)
+    errors: list[Exception] = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        running = {}
+        for block in pending:
+            running[executor.submit(scan_fn, block, timeout=block_timeout(block))] = block
+            if len(running) >= max_workers:
+                break
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                block = running.pop(fut)
+                try:
+                    hosts = fut.result()
+                except Exception as e:
+                    errors.append(e)
+                    print(f"sweep of {block} failed: {e}", file=sys.stderr)
+                    hosts = []
+                nxt = next(pending, None)
+                if nxt is not None:
+                    running[executor.submit(scan_fn, nxt, timeout=block_timeout(nxt))] = nxt
+                yield from hosts
+    if errors and len(errors) == len(blocks):
+        raise errors[-1]
+
+
 def _lookup_vendor(mac: str) -> str:
     """Return vendor name for the given MAC address."""
+    start = time.perf_counter()
+    vendor, source = _lookup_vendor_source(mac)
+    VENDOR_LOOKUP_SECONDS.observe(time.perf_counter() - start, source=source)
+    return vendor
+
+
+def _lookup_vendor_source(mac: str) -> tuple[str, str]:
+    """Return the vendor for ``mac`` and where it came from (cache, oui, api)."""
     prefix = mac.upper().replace(":", "")[:6]
 
     if prefix in _VENDOR_CACHE:
-        return _VENDOR_CACHE[prefix]
+        return _VENDOR_CACHE[prefix], "cache"
 
     db_path = Path("oui.txt")
     if db_path.exists():
@@ -183,7 +490,7 @@ def _lookup_vendor(mac: str) -> str:
                     if line.upper().startswith(prefix):
                         vendor = line[6:].strip()
                         _VENDOR_CACHE[prefix] = vendor
-                        return vendor
+                        return vendor, "oui"
         except Exception:
             pass
 
@@ -191,8 +498,8 @@ def _lookup_vendor(mac: str) -> str:
         with urlopen(f"https://api.macvendors.com/{mac}", timeout=3) as resp:
             vendor = resp.read().decode("utf-8")
             _VENDOR_CACHE[prefix] = vendor
-            return vendor
+            return vendor, "api"
     except (URLError, socket.timeout):
         _VENDOR_CACHE[prefix] = ""
-        return ""
+        return "", "api"
 
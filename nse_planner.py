@@ -0,0 +1,90 @@
+"""Pick NSE scripts per port from detected services.
+
+``run_scan`` used to hand the whole ``vuln`` category to nmap for every
+host. :func:`plan_scripts` instead maps each open port's service (from a
+``-sV`` pass or cached fingerprints) to the script families that can apply
+to it, e.g. ``smb-vuln-*`` only where SMB answers and ``ssl-*`` only on TLS
+ports, and groups ports sharing the same selection so each group costs one
+nmap run. Every expression stays within the ``vuln`` category, and open
+ports that match no rule still get the full category.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List
+
+from scan_records import PortResult
+
+# Category every plan is restricted to
+BASE_CATEGORY = "vuln"
+
+# (services, ports, script patterns); a port matches a rule by the service
+# name nmap reported or by its well-known number (TLS-wrapped HTTP on 443 is
+# reported as plain "http").
+SERVICE_RULES: List[tuple[frozenset[str], frozenset[int], tuple[str, ...]]] = [
+    (
+        frozenset({"microsoft-ds", "netbios-ssn", "smb"}),
+        frozenset({139, 445}),
+        ("smb-vuln-*", "smb2-vuln-*", "samba-vuln-*"),
+    ),
+    (
+        frozenset({"https", "ssl", "imaps", "pop3s", "smtps", "ldaps", "ftps"}),
+        frozenset({443, 465, 636, 990, 993, 995, 8443}),
+        ("ssl-*", "sslv2-*", "tls-*"),
+    ),
+    (
+        frozenset({"http", "https", "http-alt", "http-proxy", "https-alt"}),
+        frozenset({80, 443, 8000, 8008, 8080, 8443, 8888}),
+        ("http-*",),
+    ),
+    (frozenset({"ftp", "ftps"}), frozenset({21, 990}), ("ftp-*",)),
+    (frozenset({"smtp", "smtps", "submission"}), frozenset({25, 465, 587}), ("smtp-*",)),
+    (frozenset({"ms-wbt-server"}), frozenset({3389}), ("rdp-*",)),
+    (frozenset({"mysql"}), frozenset({3306}), ("mysql-*",)),
+    (frozenset({"vnc"}), frozenset({5900}), ("vnc-*", "realvnc-*")),
+]
+
+
+@dataclass(slots=True)
+class ScriptGroup:
+    """Ports of one host that share the same ``--script`` expression."""
+
+    scripts: str
+    ports: List[int] = field(default_factory=list)
+
+
+def _service_names(record: PortResult) -> set[str]:
+    names = {record.service.lower()} if record.service else set()
+    info = record.service_info.lower()
+    if "ssl" in info or "tls" in info:
+        names.add("ssl")
+    return names
+
+
+def scripts_for_port(record: PortResult | Dict[str, Any]) -> str:
+    """Return the NSE script expression for one open port."""
+    if not isinstance(record, PortResult):
+        record = PortResult.from_dict(record)
+    names = _service_names(record)
+    patterns: List[str] = []
+    for services, ports, scripts in SERVICE_RULES:
+        if names & services or record.port in ports:
+            patterns += [s for s in scripts if s not in patterns]
+    if not patterns:
+        return BASE_CATEGORY
+    return f"{BASE_CATEGORY} and ({' or '.join(patterns)})"
+
+
+def plan_scripts(ports: Iterable[PortResult | Dict[str, Any]]) -> List[ScriptGroup]:
+    """Group the open ``ports`` of a host by the scripts they need."""
+    groups: Dict[str, ScriptGroup] = {}
+    for record in ports:
+        if not isinstance(record, PortResult):
+            record = PortResult.from_dict(record)
+        if record.state != "open":
+            continue
+        expr = scripts_for_port(record)
+        group = groups.setdefault(expr, ScriptGroup(expr))
+        if record.port not in group.ports:
+            group.ports.append(record.port)
+    return list(groups.values())
@@ -1,16 +1,52 @@
 import argparse
 import json
-from typing import List
+import os
+import sys
+from typing import Any, Dict, Iterable, List
 
-from discover_hosts import discover_hosts
+from discover_hosts import discover_hosts, iter_discover_hosts
 from port_scan import run_scan
-from lan_port_scan import scan_hosts, DEFAULT_PORTS, _get_subnet
+from lan_port_scan import (
+    DEFAULT_PORTS,
+    EscalationRules,
+    _get_subnet,
+    iter_scan_hosts,
+    scan_hosts,
+    scan_pipeline,
+    sweep_params,
+)
+from scan_journal import ScanJournal, read_journal
+from network_utils import get_local_subnets
 from lan_security_check import run_checks
 from security_report import generate_report
+from profiling import MODES as PROFILE_MODES, default_output, profile_call
+from scan_coordinator import (
+    DEFAULT_SHARD_PREFIX,
+    LEASE_TIMEOUT,
+    run_coordinator,
+    run_worker,
+)
+
+
+def _local_subnets(args: argparse.Namespace) -> List[str] | None:
+    """Return all local networks when ``--all-networks`` was given."""
+    if getattr(args, "all_networks", False):
+        return get_local_subnets() or None
+    return None
+
+
+def _print_ndjson(records: Iterable[Dict[str, Any]]) -> None:
+    """Print one JSON object per line, flushing after every record."""
+    for rec in records:
+        print(json.dumps(rec, ensure_ascii=False), flush=True)
 
 
 def cmd_discover(args: argparse.Namespace) -> None:
-    hosts = discover_hosts(args.subnet)
+    subnet = _local_subnets(args) or args.subnet
+    if args.ndjson:
+        _print_ndjson(iter_discover_hosts(subnet))
+        return
+    hosts = discover_hosts(subnet)
     print(json.dumps({"hosts": hosts}, ensure_ascii=False))
 
 
@@ -34,15 +70,79 @@ def cmd_port_scan(args: argparse.Namespace) -> None:
 
 
 def cmd_lan_scan(args: argparse.Namespace) -> None:
-    subnet = args.subnet or _get_subnet() or "192.168.1.0/24"
+    subnet = _local_subnets(args) or args.subnet or _get_subnet() or "192.168.1.0/24"
+    if args.ports:
+        ports = [p.strip() for p in args.ports.split(",") if p.strip()]
+    else:
+        ports = DEFAULT_PORTS
+    scripts = args.script.split(",") if args.script else None
+    if args.pipeline:
+        rules = {}
+        if args.escalate_ports:
+            rules["danger_ports"] = {p.strip() for p in args.escalate_ports.split(",") if p.strip()}
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f:
+                previous = json.load(f)
+            if isinstance(previous, dict):
+                previous = previous.get("devices", [])
+            rules = EscalationRules.from_results(previous, **rules)
+        else:
+            rules = EscalationRules(**rules)
+        # -sV and -O by default; --service/--os pick only the ones given
+        deep = dict(service=args.service, os_detect=args.os) if args.service or args.os else {}
+        results = scan_pipeline(subnet, ports, rules, scripts=scripts, max_workers=args.workers, **deep)
+        print(json.dumps(results, ensure_ascii=False))
+        return
+    params = sweep_params(subnet, ports, service=args.service, os_detect=args.os, scripts=scripts)
+    journal = None
+    if args.resume and os.path.exists(args.resume):
+        state = read_journal(args.resume)
+        if state.done:
+            # nothing left to scan: report what the journal holds
+            print(json.dumps(list(state.hosts.values()), ensure_ascii=False))
+            return
+        params = state.params
+        journal = ScanJournal.open(args.resume, params)
+    elif args.resume or args.journal:
+        # a missing --resume journal starts a new sweep in that file
+        journal = ScanJournal.open(args.resume or args.journal, params, resume=False)
+    try:
+        if args.ndjson:
+            _print_ndjson(iter_scan_hosts(**params, max_workers=args.workers, journal=journal))
+            return
+        results = scan_hosts(**params, max_workers=args.workers, journal=journal)
+    finally:
+        if journal is not None:
+            journal.close()
+    print(json.dumps(results, ensure_ascii=False))
+
+
+def cmd_lan_check(args: argparse.Namespace) -> None:
+    results = run_checks(_local_subnets(args) or args.subnet)
+    print(json.dumps(results, ensure_ascii=False))
+
+
+def _parse_listen(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+def cmd_scan_coordinator(args: argparse.Namespace) -> None:
+    if args.subnet:
+        targets = [t.strip() for t in args.subnet.split(",") if t.strip()]
+    else:
+        targets = [_get_subnet() or "192.168.1.0/24"]
     if args.ports:
         ports = [p.strip() for p in args.ports.split(",") if p.strip()]
     else:
         ports = DEFAULT_PORTS
     scripts = args.script.split(",") if args.script else None
-    results = scan_hosts(
-        subnet,
+    results = run_coordinator(
+        targets,
         ports,
+        listen=_parse_listen(args.listen),
+        shard_prefix=args.shard_prefix,
+        lease_timeout=args.lease_timeout,
         service=args.service,
         os_detect=args.os,
         scripts=scripts,
@@ -51,9 +151,8 @@ def cmd_lan_scan(args: argparse.Namespace) -> None:
     print(json.dumps(results, ensure_ascii=False))
 
 
-def cmd_lan_check(args: argparse.Namespace) -> None:
-    results = run_checks(args.subnet)
-    print(json.dumps(results, ensure_ascii=False))
+def cmd_scan_worker(args: argparse.Namespace) -> None:
+    run_worker(args.coordinator, args.id)
 
 
 def cmd_security_report(args: argparse.Namespace) -> None:
@@ -71,10 +170,28 @@ def cmd_security_report(args: argparse.Namespace) -> None:
 
 def main(argv: List[str] | None = None) -> None:
     parser = argparse.ArgumentParser(description="NWCD command line interface")
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        help="Profile the command and write a pstats, collapsed stack or allocation report",
+    )
+    parser.add_argument(
+        "--profile-out", help="Profile output file (default: nwcd-<command>-<time>.<ext>)"
+    )
     sub = parser.add_subparsers(dest="command", required=True)
 
     p_discover = sub.add_parser("discover-hosts", help="Discover LAN hosts")
     p_discover.add_argument("subnet", nargs="?", help="Target subnet")
+    p_discover.add_argument(
+        "--all-networks",
+        action="store_true",
+        help="Sweep every local network of all up interfaces",
+    )
+    p_discover.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Print one JSON object per host as soon as it is ready",
+    )
     p_discover.set_defaults(func=cmd_discover)
 
     p_scan = sub.add_parser("port-scan", help="Scan ports on a host")
@@ -84,7 +201,7 @@ def main(argv: List[str] | None = None) -> None:
         "--service", action="store_true", help="Enable service version detection"
     )
     p_scan.add_argument("--os", action="store_true", help="Enable OS detection")
-    p_scan.add_argument("--script", help="Comma separated nmap scripts")
+    p_scan.add_argument("--script", help="Comma separated nmap scripts ('auto' picks them per service)")
     p_scan.add_argument(
         "--timing", type=int, choices=range(0, 6), help="nmap timing template"
     )
@@ -97,10 +214,80 @@ def main(argv: List[str] | None = None) -> None:
     p_lan.add_argument("--os", action="store_true")
     p_lan.add_argument("--script")
     p_lan.add_argument("--workers", type=int)
+    p_lan.add_argument(
+        "--all-networks",
+        action="store_true",
+        help="Sweep every local network of all up interfaces",
+    )
+    p_lan.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Print one JSON object per host as soon as it is ready",
+    )
+    p_lan.add_argument(
+        "--journal",
+        help="Checkpoint finished hosts to this file so the sweep can be resumed",
+    )
+    p_lan.add_argument(
+        "--resume",
+        metavar="JOURNAL",
+        help="Continue the sweep recorded in JOURNAL, skipping finished hosts "
+        "(a missing JOURNAL starts a new sweep there)",
+    )
+    p_lan.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Quick sweep of all hosts, then -sV/-O/scripts only where rules match "
+        "(--service/--os limit the deep scan to those)",
+    )
+    p_lan.add_argument(
+        "--escalate-ports",
+        help="Comma separated ports that trigger a deep scan (default: danger ports)",
+    )
+    p_lan.add_argument(
+        "--baseline",
+        help="Previous lan-scan JSON; new hosts and changed MACs trigger a deep scan",
+    )
     p_lan.set_defaults(func=cmd_lan_scan)
 
+    p_coord = sub.add_parser(
+        "scan-coordinator", help="Distribute a LAN scan across scan-worker processes"
+    )
+    p_coord.add_argument("--subnet", help="Comma separated target subnets")
+    p_coord.add_argument("--ports")
+    p_coord.add_argument("--service", action="store_true")
+    p_coord.add_argument("--os", action="store_true")
+    p_coord.add_argument("--script")
+    p_coord.add_argument("--workers", type=int, help="Concurrent scans per worker")
+    p_coord.add_argument(
+        "--listen", default="0.0.0.0:8765", help="Address to serve shards on"
+    )
+    p_coord.add_argument(
+        "--shard-prefix",
+        type=int,
+        default=DEFAULT_SHARD_PREFIX,
+        help="IPv4 prefix length of each shard",
+    )
+    p_coord.add_argument(
+        "--lease-timeout",
+        type=float,
+        default=LEASE_TIMEOUT,
+        help="Seconds before a silent worker's shard is re-queued",
+    )
+    p_coord.set_defaults(func=cmd_scan_coordinator)
+
+    p_worker = sub.add_parser("scan-worker", help="Scan shards for a coordinator")
+    p_worker.add_argument("coordinator", help="Coordinator URL, e.g. http://host:8765")
+    p_worker.add_argument("--id", help="Worker identifier")
+    p_worker.set_defaults(func=cmd_scan_worker)
+
     p_check = sub.add_parser("lan-check", help="Run LAN security checks")
     p_check.add_argument("subnet", nargs="?", help="Target subnet")
+    p_check.add_argument(
+        "--all-networks",
+        action="store_true",
+        help="Sweep every local network of all up interfaces",
+    )
     p_check.set_defaults(func=cmd_lan_check)
 
     p_report = sub.add_parser("security-report", help="Generate security report")
@@ -113,7 +300,23 @@ def main(argv: List[str] | None = None) -> None:
     p_report.set_defaults(func=cmd_security_report)
 
     args = parser.parse_args(argv)
-    args.func(args)
+    if getattr(args, "all_networks", False) and getattr(args, "subnet", None):
+        parser.error("--all-networks cannot be combined with a subnet")
+    if getattr(args, "pipeline", False):
+        unsupported = [
+            opt for opt, value in (("--ndjson", args.ndjson), ("--journal", args.journal), ("--resume", args.resume))
+            if value
+        ]
+        if unsupported:
+            parser.error(f"--pipeline cannot be combined with {', '.join(unsupported)}")
+    if not args.profile:
+        args.func(args)
+        return
+    output = args.profile_out or default_output(args.profile, args.command)
+    try:
+        profile_call(args.profile, lambda: args.func(args), output)
+    finally:
+        print(f"{args.profile} profile written to {output}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -1,85 +1,199 @@
 #!/usr/bin/env python3
 import json
+import os
+import signal
 import sys
 import subprocess
+import threading
 import xml.etree.ElementTree as ET
 import ipaddress
 import selectors
 import time
 
+from metrics import HOST_SCAN_ERRORS, HOST_SCAN_SECONDS, NMAP_FAILURES, NMAP_SECONDS, timed
 from network_utils import SCAN_TIMEOUT
+from nse_planner import plan_scripts
+from scan_records import PortResult
 
 
-def _exec_nmap(cmd: list[str], progress_timeout: float | None) -> str:
+# ``scripts`` value that lets nse_planner pick scripts per service
+AUTO_SCRIPTS = "auto"
+# Seconds between cancel checks while nmap runs, and how long a cancelled
+# nmap process group gets after SIGTERM before it is killed
+CANCEL_POLL = 0.2
+KILL_GRACE = 2.0
+
+# nmap processes started by _exec_nmap that are still running
+_children: set[subprocess.Popen] = set()
+_children_lock = threading.Lock()
+
+
+class ScanCancelled(RuntimeError):
+    """Raised when a scan is stopped through its cancel event."""
+
+
+def active_processes() -> int:
+    """Return how many nmap processes are currently running."""
+    with _children_lock:
+        return len(_children)
+
+
+def _group_kwargs() -> dict:
+    # nmap gets its own process group so helpers it spawns die with it
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _kill_group(proc: subprocess.Popen, grace: float = KILL_GRACE) -> None:
+    """Terminate ``proc`` and its process group within about ``grace`` seconds."""
+    if proc.poll() is not None:
+        return
+    if os.name == "nt":
+        proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(grace)
+            return
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        return
+    proc.wait()
+
+
+def terminate_all(grace: float = KILL_GRACE) -> int:
+    """Kill every running nmap process group; return how many there were."""
+    with _children_lock:
+        procs = list(_children)
+    for proc in procs:
+        _kill_group(proc, grace)
+    return len(procs)
+
+
+@timed(NMAP_SECONDS, kind="port_scan")
+def _exec_nmap(
+    cmd: list[str], progress_timeout: float | None, cancel: threading.Event | None = None
+) -> str:
     """Run nmap command and return stdout. If progress_timeout is provided,
-    terminate the process if no output is received within the timeout."""
-    if progress_timeout is None:
+    terminate the process if no output is received within the timeout.
+    Setting ``cancel`` kills the nmap process group and raises
+    :class:`ScanCancelled`."""
+    if progress_timeout is None and cancel is None:
         try:
             proc = subprocess.run(
                 cmd, capture_output=True, text=True, timeout=SCAN_TIMEOUT
             )
         except subprocess.TimeoutExpired:
+            NMAP_FAILURES.inc(kind="port_scan", reason="timeout")
             raise RuntimeError("nmap scan timed out")
         if proc.returncode != 0:
+            NMAP_FAILURES.inc(kind="port_scan", reason="error")
             raise RuntimeError(proc.stderr.strip())
         return proc.stdout
 
+    deadline = time.time() + SCAN_TIMEOUT if progress_timeout is None else None
     with subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
         bufsize=1,
+        **_group_kwargs(),
     ) as proc:
-        selector = selectors.DefaultSelector()
-        selector.register(proc.stdout, selectors.EVENT_READ)
-        selector.register(proc.stderr, selectors.EVENT_READ)
-        last_update = time.time()
-        stdout_parts: list[str] = []
-        stderr_parts: list[str] = []
-        while True:
-            events = selector.select(timeout=1)
-            if events:
-                for key, _ in events:
-                    line = key.fileobj.readline()
-                    if not line:
-                        continue
-                    last_update = time.time()
-                    if key.fileobj is proc.stdout:
-                        stdout_parts.append(line)
-                    else:
-                        stderr_parts.append(line)
-            else:
-                if progress_timeout and time.time() - last_update > progress_timeout:
-                    proc.kill()
-                    raise RuntimeError("nmap scan stalled")
-
-            if proc.poll() is not None:
-                stdout_parts.append(proc.stdout.read() or "")
-                stderr_parts.append(proc.stderr.read() or "")
-                break
-
-        selector.unregister(proc.stdout)
-        selector.unregister(proc.stderr)
-        ret = proc.wait()
+        with _children_lock:
+            _children.add(proc)
+        try:
+            selector = selectors.DefaultSelector()
+            selector.register(proc.stdout, selectors.EVENT_READ)
+            selector.register(proc.stderr, selectors.EVENT_READ)
+            last_update = time.time()
+            stdout_parts: list[str] = []
+            stderr_parts: list[str] = []
+            while True:
+                events = selector.select(timeout=1 if cancel is None else CANCEL_POLL)
+                if cancel is not None and cancel.is_set():
+                    _kill_group(proc)
+                    NMAP_FAILURES.inc(kind="port_scan", reason="cancelled")
+                    raise ScanCancelled("nmap scan cancelled")
+                if events:
+                    for key, _ in events:
+                        line = key.fileobj.readline()
+                        if not line:
+                            continue
+                        last_update = time.time()
+                        if key.fileobj is proc.stdout:
+                            stdout_parts.append(line)
+                        else:
+                            stderr_parts.append(line)
+                else:
+                    if progress_timeout and time.time() - last_update > progress_timeout:
+                        _kill_group(proc)
+                        NMAP_FAILURES.inc(kind="port_scan", reason="stalled")
+                        raise RuntimeError("nmap scan stalled")
+                if deadline is not None and time.time() > deadline:
+                    _kill_group(proc)
+                    NMAP_FAILURES.inc(kind="port_scan", reason="timeout")
+                    raise RuntimeError("nmap scan timed out")
+
+                if proc.poll() is not None:
+                    stdout_parts.append(proc.stdout.read() or "")
+                    stderr_parts.append(proc.stderr.read() or "")
+                    break
+
+            selector.unregister(proc.stdout)
+            selector.unregister(proc.stderr)
+            ret = proc.wait()
+        finally:
+            with _children_lock:
+                _children.discard(proc)
         stderr_output = "".join(stderr_parts)
         if ret != 0:
+            NMAP_FAILURES.inc(kind="port_scan", reason="error")
             raise RuntimeError(stderr_output.strip())
         return "".join(stdout_parts)
 
 
+def _parse_scan_xml(output: str, os_detect: bool = False) -> tuple[str, list[PortResult]]:
+    """Parse ``nmap -oX`` port scan output into the OS name and port records."""
+    root = ET.fromstring(output)
+    results = []
+    os_name = ""
+    for port in root.findall(".//port"):
+        state_elem = port.find("state")
+        service_elem = port.find("service")
+        state = state_elem.get("state") if state_elem is not None else ""
+        service = service_elem.get("name") if service_elem is not None else ""
+        service_info = ""
+        if service_elem is not None:
+            product = service_elem.get("product") or ""
+            version = service_elem.get("version") or ""
+            extrainfo = service_elem.get("extrainfo") or ""
+            if product or version or extrainfo:
+                service_info = " ".join(
+                    [s for s in [product, version, extrainfo] if s]
+                ).strip()
+        results.append(PortResult(port.get("portid") or 0, state, service, service_info))
+    if os_detect:
+        m = root.find(".//osmatch")
+        if m is not None:
+            os_name = m.get("name", "")
+    return os_name, results
 
 
-def run_scan(
+def _scan(
     host: str,
-    ports: list[str] | None = None,
-    service: bool = False,
-    os_detect: bool = False,
-    scripts: list[str] | None = None,
-    progress_timeout: float | None = 60.0,
-    timing: int | None = None,
-    fast: bool = False,
-) -> list[dict[str, str]]:
+    ports: list[str] | None,
+    service: bool,
+    os_detect: bool,
+    scripts: list[str] | None,
+    progress_timeout: float | None,
+    timing: int | None,
+    fast: bool,
+    cancel: threading.Event | None = None,
+) -> dict:
     cmd = ["nmap"]
     try:
         if ipaddress.ip_address(host).version == 6:
@@ -107,33 +221,71 @@ def run_scan(
         cmd += ["-p-", "-oX", "-", host]
     else:
         cmd += ["-p", ",".join(ports), "-oX", "-", host]
-    output = _exec_nmap(cmd, progress_timeout)
-    root = ET.fromstring(output)
-    results = []
-    os_name = ""
-    for port in root.findall(".//port"):
-        portid = port.get("portid")
-        state_elem = port.find("state")
-        service_elem = port.find("service")
-        state = state_elem.get("state") if state_elem is not None else ""
-        service = service_elem.get("name") if service_elem is not None else ""
-        item = {"port": portid, "state": state, "service": service}
-        if service_elem is not None:
-            product = service_elem.get("product") or ""
-            version = service_elem.get("version") or ""
-            extrainfo = service_elem.get("extrainfo") or ""
-            if product or version or extrainfo:
-                item["service_info"] = " ".join(
-                    [s for s in [product, version, extrainfo] if s]
-                ).strip()
-        results.append(item)
-    if os_detect:
-        m = root.find(".//osmatch")
-        if m is not None:
-            os_name = m.get("name", "")
+    output = _exec_nmap(cmd, progress_timeout, cancel)
+    os_name, results = _parse_scan_xml(output, os_detect)
     return {"os": os_name, "ports": results}
 
 
+def _planned_scan(
+    host: str,
+    ports: list[str] | None,
+    os_detect: bool,
+    fingerprints: list[dict] | None,
+    progress_timeout: float | None,
+    timing: int | None,
+    fast: bool,
+    cancel: threading.Event | None = None,
+) -> dict:
+    """Fingerprint services, then run only the matching NSE scripts.
+
+    ``fingerprints`` (port records with service names, e.g. from an earlier
+    ``-sV`` scan) skips the first pass when OS detection is not needed.
+    """
+    options = dict(progress_timeout=progress_timeout, timing=timing, fast=fast, cancel=cancel)
+    if fingerprints is None or os_detect:
+        first = _scan(host, ports, True, os_detect, [], **options)
+    else:
+        first = {"os": "", "ports": [PortResult.from_dict(p) for p in fingerprints]}
+    merged = {p.port: p for p in first["ports"]}
+    for group in plan_scripts(first["ports"]):
+        res = _scan(host, [str(p) for p in group.ports], True, False, [group.scripts], **options)
+        for item in res["ports"]:
+            merged[item.port] = item
+    return {"os": first["os"], "ports": list(merged.values())}
+
+
+@timed(HOST_SCAN_SECONDS, HOST_SCAN_ERRORS)
+def run_scan(
+    host: str,
+    ports: list[str] | None = None,
+    service: bool = False,
+    os_detect: bool = False,
+    scripts: list[str] | None = None,
+    progress_timeout: float | None = 60.0,
+    timing: int | None = None,
+    fast: bool = False,
+    fingerprints: list[dict] | None = None,
+    cancel: threading.Event | None = None,
+    records: bool = False,
+) -> dict:
+    """Port scan ``host`` with nmap.
+
+    ``scripts`` defaults to the ``vuln`` category. ``["auto"]`` runs a
+    ``-sV`` pass first (or uses ``fingerprints``) and then only the scripts
+    :mod:`nse_planner` selects for each open port. Setting ``cancel``
+    kills the running nmap and raises :class:`ScanCancelled`. Ports are
+    port dictionaries, or :class:`PortResult` records when ``records`` is
+    true.
+    """
+    if scripts == [AUTO_SCRIPTS]:
+        res = _planned_scan(host, ports, os_detect, fingerprints, progress_timeout, timing, fast, cancel)
+    else:
+        res = _scan(host, ports, service, os_detect, scripts, progress_timeout, timing, fast, cancel)
+    if not records:
+        res["ports"] = [p.to_dict() for p in res["ports"]]
+    return res
+
+
 def main():
     import argparse
 
@@ -146,7 +298,7 @@ def main():
     parser.add_argument("--os", action="store_true", help="Enable OS detection (-O)")
     parser.add_argument(
         "--script",
-        help="Comma separated nmap scripts (default: vuln)",
+        help="Comma separated nmap scripts (default: vuln, 'auto' picks them per service)",
     )
     parser.add_argument(
         "--timing",
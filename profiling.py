@@ -0,0 +1,218 @@
+"""Profiling helpers for the CLI ``--profile`` switch and the API debug endpoint.
+
+Three modes are supported:
+
+``cprofile``
+    Deterministic profile of the calling thread and of the threads it starts
+    (the scan workers), merged into one pstats file.
+``wall``
+    Sampling profiler over all threads (the scan workers included), written
+    as collapsed stacks (``frame;frame;frame count``) for flamegraph tools.
+``alloc``
+    tracemalloc snapshot of the run, written as the top allocation sites.
+"""
+from __future__ import annotations
+
+import cProfile
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+MODES = ("cprofile", "wall", "alloc")
+SUFFIXES = {"cprofile": ".pstats", "wall": ".folded", "alloc": ".alloc.txt"}
+
+# Seconds between stack samples of the wall-clock profiler
+SAMPLE_INTERVAL = 0.005
+# Stack depth recorded per allocation by the alloc profiler
+ALLOC_FRAMES = 16
+# Allocation sites listed in an alloc report
+ALLOC_TOP = 50
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class WallSampler:
+    """Periodically sample the Python stacks of running threads.
+
+    ``thread_ids`` restricts sampling to the given threads and ``exclude``
+    skips threads; by default every thread except the sampler is sampled.
+    """
+
+    def __init__(
+        self,
+        interval: float = SAMPLE_INTERVAL,
+        thread_ids: Iterable[int] | None = None,
+        exclude: Iterable[int] = (),
+    ) -> None:
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.exclude = set(exclude)
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own or ident in self.exclude:
+                continue
+            if self.thread_ids is not None and ident not in self.thread_ids:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "WallSampler":
+        self._thread = threading.Thread(target=self._run, name="wall-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """Return samples in collapsed stack format."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ThreadProfiler:
+    """cProfile the calling thread and every thread started while active.
+
+    ``threading.setprofile`` gives each new thread its own profiler, since
+    a cProfile instance only sees the thread that enabled it. Threads that
+    were already running when profiling started are not covered.
+    """
+
+    def __init__(self) -> None:
+        self.profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _add(self) -> cProfile.Profile:
+        prof = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(prof)
+        return prof
+
+    def _thread_hook(self, frame: Any, event: str, arg: Any) -> None:
+        # runs once in each new thread and hands it over to its own profiler
+        sys.setprofile(None)
+        try:
+            self._add().enable()
+        except ValueError:
+            # another profiler is already active in this interpreter
+            pass
+
+    def runcall(self, func: Callable[[], Any]) -> Any:
+        threading.setprofile(self._thread_hook)
+        try:
+            return self._add().runcall(func)
+        finally:
+            threading.setprofile(None)
+
+    def dump_stats(self, output: str | Path) -> None:
+        """Write the merged stats of all profiled threads to ``output``."""
+        stats = pstats.Stats()
+        for prof in self.profiles:
+            prof.create_stats()
+            if prof.stats:
+                stats.add(prof)
+        stats.dump_stats(str(output))
+
+
+def alloc_report(snapshot: tracemalloc.Snapshot, limit: int = ALLOC_TOP) -> str:
+    """Return the top ``limit`` allocation sites of ``snapshot`` as text."""
+    snapshot = snapshot.filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ]
+    )
+    stats = snapshot.statistics("traceback")
+    total = sum(s.size for s in stats)
+    lines = [f"Total allocated: {total / 1024:.1f} KiB in {len(stats)} sites", ""]
+    for idx, stat in enumerate(stats[:limit], 1):
+        lines.append(f"#{idx}: {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+        lines.extend(f"    {line}" for line in stat.traceback.format(most_recent_first=True)[:8])
+    return "\n".join(lines) + "\n"
+
+
+def default_output(mode: str, name: str) -> Path:
+    """Return ``nwcd-<name>-<timestamp>`` with the suffix for ``mode``."""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return Path(f"nwcd-{name}-{stamp}{SUFFIXES[mode]}")
+
+
+def profile_call(mode: str, func: Callable[[], Any], output: str | Path) -> Any:
+    """Run ``func`` under the profiler for ``mode`` and write the artifact.
+
+    The artifact is written even when ``func`` raises.
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown profile mode: {mode}")
+    output = Path(output)
+    if mode == "cprofile":
+        prof = ThreadProfiler()
+        try:
+            return prof.runcall(func)
+        finally:
+            prof.dump_stats(str(output))
+    if mode == "wall":
+        sampler = WallSampler().start()
+        try:
+            return func()
+        finally:
+            sampler.stop()
+            output.write_text(sampler.collapsed(), encoding="utf-8")
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start(ALLOC_FRAMES)
+    try:
+        return func()
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        if not started:
+            tracemalloc.stop()
+        output.write_text(alloc_report(snapshot), encoding="utf-8")
+
+
+def profile_for(mode: str, seconds: float) -> str:
+    """Profile the running process for ``seconds`` and return the report text.
+
+    Used by the API debug endpoint; only ``wall`` and ``alloc`` can observe
+    other threads. The calling thread, which only sleeps, is not sampled.
+    """
+    if mode == "wall":
+        sampler = WallSampler(exclude=[threading.get_ident()]).start()
+        time.sleep(seconds)
+        sampler.stop()
+        return sampler.collapsed()
+    if mode == "alloc":
+        started = tracemalloc.is_tracing()
+        if not started:
+            tracemalloc.start(ALLOC_FRAMES)
+        time.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+        if not started:
+            tracemalloc.stop()
+        return alloc_report(snapshot)
+    raise ValueError(f"unsupported profile mode for a running process: {mode}")
@@ -1,6 +1,5 @@
 from typing import Iterable, List
 
-import json
 from pathlib import Path
 
 import generate_topology
@@ -35,25 +34,43 @@ def calc_utm_items(
 def generate_topology_diagram(input_path: str, output: str = "topology.svg") -> str:
     """Create a network topology diagram from scan results.
 
+    Renders are cached by content hash, so an unchanged host list does not
+    run Graphviz again.
+
     Parameters
     ----------
     input_path: str
         Path to JSON produced by ``nwcd_cli.py discover-hosts`` or ``nwcd_cli.py lan-scan``.
     output: str
-        Output file path. Extension determines format (.png/.svg/.dot).
+        Output file path. Extension determines format (.png/.svg/.dot/.json).
 
     Returns
     -------
     str
         The path to the generated diagram.
     """
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    graph = generate_topology.build_graph(data)
-    generate_topology.save_graph(graph, output)
+    generate_topology.render_topology(input_path, output)
     return str(Path(output))
 
 
+def export_topology_json(input_path: str, output: str = "topology.json") -> str:
+    """Write node positions and edges of the topology as JSON.
+
+    The file contains ``nodes`` (``id``, ``label``, ``x``, ``y``, ``width``,
+    ``height``, ``shape``), ``edges`` (``source``, ``target``) and the
+    ``bbox`` of the layout, so clients can draw and highlight hosts without
+    running Graphviz or parsing SVG.
+
+    Returns
+    -------
+    str
+        The path to the JSON file.
+    """
+    if Path(output).suffix.lower() != ".json":
+        raise ValueError("output must be a .json file")
+    return generate_topology_diagram(input_path, output)
+
+
 # Allow camelCase name for compatibility with Dart code expectations.
 generateTopologyDiagram = generate_topology_diagram
+exportTopologyJson = export_topology_json
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""Distribute LAN scans across worker processes.
+
+The coordinator splits target ranges into shards and serves them over a small
+JSON/HTTP protocol.  Workers lease a shard, keep the lease alive with
+heartbeats while scanning it with :func:`lan_port_scan.scan_hosts` and post
+the per-host results back.  Shards whose lease expires (for example because
+the worker died) are put back on the queue and handed to another worker.
+"""
+from __future__ import annotations
+
+import ipaddress
+import json
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List
+from urllib.request import Request, urlopen
+
+# Default prefix length of IPv4 shards (64 addresses each)
+DEFAULT_SHARD_PREFIX = 26
+# Default prefix length of IPv6 shards
+DEFAULT_SHARD_PREFIX_V6 = 120
+# Seconds a lease stays valid without a heartbeat
+LEASE_TIMEOUT = 30.0
+# Seconds between worker heartbeats
+HEARTBEAT_INTERVAL = 10.0
+# Number of times a shard is handed out before it is given up
+MAX_ATTEMPTS = 3
+
+
+def split_targets(
+    targets: Iterable[str],
+    prefix: int | None = DEFAULT_SHARD_PREFIX,
+    prefix_v6: int | None = DEFAULT_SHARD_PREFIX_V6,
+) -> List[str]:
+    """Split target networks into shards of at most ``prefix`` length."""
+    shards: List[str] = []
+    for target in targets:
+        target = target.strip()
+        if not target:
+            continue
+        try:
+            net = ipaddress.ip_network(target, strict=False)
+        except ValueError:
+            # Hostnames and nmap range syntax are passed through unchanged
+            shards.append(target)
+            continue
+        new_prefix = prefix if net.version == 4 else prefix_v6
+        if new_prefix is None or net.prefixlen >= new_prefix:
+            shards.append(str(net))
+        else:
+            shards.extend(str(s) for s in net.subnets(new_prefix=new_prefix))
+    return shards
+
+
+def _ip_sort_key(host: Dict[str, Any]):
+    ip = host.get("ip", "")
+    try:
+        addr = ipaddress.ip_address(ip)
+        return (addr.version, int(addr), "")
+    except ValueError:
+        return (99, 0, ip)
+
+
+class ShardQueue:
+    """Thread-safe shard queue with leases, heartbeats and re-queueing."""
+
+    def __init__(
+        self,
+        shards: Iterable[str],
+        lease_timeout: float = LEASE_TIMEOUT,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> None:
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._pending: deque[str] = deque(shards)
+        self._total = len(self._pending)
+        self._attempts: Dict[str, int] = {}
+        # lease id -> (shard, worker id, expiry)
+        self._leases: Dict[str, tuple[str, str, float]] = {}
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        if not self._total:
+            self._finished.set()
+
+    def _reap_locked(self, now: float) -> None:
+        for lease_id, (shard, _, expires) in list(self._leases.items()):
+            if expires <= now:
+                del self._leases[lease_id]
+                self._requeue_locked(shard, "lease expired")
+
+    def _requeue_locked(self, shard: str, error: str) -> None:
+        if self._attempts.get(shard, 0) >= self.max_attempts:
+            self._errors[shard] = error
+            self._check_finished_locked()
+        else:
+            self._pending.append(shard)
+
+    def _check_finished_locked(self) -> None:
+        if len(self._results) + len(self._errors) >= self._total:
+            self._finished.set()
+
+    def reap_expired(self) -> None:
+        """Re-queue shards whose lease has expired."""
+        with self._lock:
+            self._reap_locked(time.monotonic())
+
+    def lease(self, worker: str) -> tuple[str, str] | None:
+        """Return ``(lease_id, shard)`` for the next pending shard or ``None``."""
+        now = time.monotonic()
+        with self._lock:
+            self._reap_locked(now)
+            if not self._pending:
+                return None
+            shard = self._pending.popleft()
+            self._attempts[shard] = self._attempts.get(shard, 0) + 1
+            lease_id = uuid.uuid4().hex
+            self._leases[lease_id] = (shard, worker, now + self.lease_timeout)
+            return lease_id, shard
+
+    def heartbeat(self, lease_id: str) -> bool:
+        """Extend the lease. Returns ``False`` if the lease is no longer valid."""
+        now = time.monotonic()
+        with self._lock:
+            self._reap_locked(now)
+            entry = self._leases.get(lease_id)
+            if entry is None:
+                return False
+            shard, worker, _ = entry
+            self._leases[lease_id] = (shard, worker, now + self.lease_timeout)
+            return True
+
+    def complete(self, lease_id: str, hosts: List[Dict[str, Any]]) -> bool:
+        """Store results for a leased shard."""
+        with self._lock:
+            entry = self._leases.pop(lease_id, None)
+            if entry is None:
+                return False
+            self._results[entry[0]] = list(hosts)
+            self._check_finished_locked()
+            return True
+
+    def fail(self, lease_id: str, error: str = "") -> bool:
+        """Release a lease after a worker-side error so the shard is retried."""
+        with self._lock:
+            entry = self._leases.pop(lease_id, None)
+            if entry is None:
+                return False
+            self._requeue_locked(entry[0], error or "worker error")
+            return True
+
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._finished.wait(timeout)
+
+    @property
+    def errors(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._errors)
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Return merged per-host results in ``scan_hosts`` format."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for hosts in self._results.values():
+                for host in hosts:
+                    merged[host.get("ip", "")] = host
+        return sorted(merged.values(), key=_ip_sort_key)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "CoordinatorServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server API
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": "invalid json"})
+            return
+        queue = self.server.queue
+        if self.path == "/lease":
+            if queue.done():
+                self._send(200, {"done": True})
+                return
+            leased = queue.lease(str(req.get("worker", "")))
+            if leased is None:
+                self._send(200, {"done": False, "wait": True})
+                return
+            lease_id, shard = leased
+            self._send(
+                200,
+                {
+                    "lease": lease_id,
+                    "shard": shard,
+                    "params": self.server.params,
+                    "heartbeat": self.server.heartbeat_interval,
+                },
+            )
+        elif self.path == "/heartbeat":
+            self._send(200, {"ok": queue.heartbeat(str(req.get("lease", "")))})
+        elif self.path == "/complete":
+            ok = queue.complete(str(req.get("lease", "")), req.get("hosts") or [])
+            self._send(200, {"ok": ok})
+        elif self.path == "/fail":
+            ok = queue.fail(str(req.get("lease", "")), str(req.get("error", "")))
+            self._send(200, {"ok": ok})
+        else:
+            self._send(404, {"error": "not found"})
+
+
+class CoordinatorServer(ThreadingHTTPServer):
+    """HTTP server handing out shards from a :class:`ShardQueue`."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        queue: ShardQueue,
+        params: Dict[str, Any],
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+    ) -> None:
+        super().__init__(address, _Handler)
+        self.queue = queue
+        self.params = params
+        self.heartbeat_interval = heartbeat_interval
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        if host in ("0.0.0.0", ""):
+            host = "127.0.0.1"
+        return f"http://{host}:{port}"
+
+
+def run_coordinator(
+    targets: Iterable[str],
+    ports: List[str],
+    *,
+    listen: tuple[str, int] = ("0.0.0.0", 8765),
+    shard_prefix: int | None = DEFAULT_SHARD_PREFIX,
+    lease_timeout: float = LEASE_TIMEOUT,
+    heartbeat_interval: float = HEARTBEAT_INTERVAL,
+    timeout: float | None = None,
+    on_ready: Callable[[str], None] | None = None,
+    **scan_params: Any,
+) -> List[Dict[str, Any]]:
+    """Serve shards of ``targets`` until every shard is finished.
+
+    ``scan_params`` (``service``, ``os_detect``, ``scripts``, ``timing`` ...)
+    are forwarded to the workers' ``scan_hosts`` calls.  Returns the merged
+    host list in the same format as ``scan_hosts``.
+    """
+    queue = ShardQueue(split_targets(targets, shard_prefix), lease_timeout)
+    params = {"ports": list(ports), **scan_params}
+    server = CoordinatorServer(listen, queue, params, heartbeat_interval)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    if on_ready is not None:
+        on_ready(server.url)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while not queue.wait(min(1.0, lease_timeout / 2)):
+            queue.reap_expired()
+            if deadline is not None and time.monotonic() > deadline:
+                raise RuntimeError("distributed scan timed out")
+        # Give idle workers a chance to learn that the sweep is done
+        time.sleep(min(0.5, heartbeat_interval))
+    finally:
+        server.shutdown()
+        server.server_close()
+    for shard, error in queue.errors.items():
+        print(f"shard {shard} failed: {error}", file=sys.stderr)
+    return queue.results()
+
+
+def _post(url: str, body: Dict[str, Any], timeout: float = 10.0) -> Dict[str, Any]:
+    req = Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _heartbeat_loop(url: str, lease_id: str, interval: float, stop: threading.Event, lost: threading.Event) -> None:
+    while not stop.wait(interval):
+        try:
+            if not _post(f"{url}/heartbeat", {"lease": lease_id}).get("ok"):
+                lost.set()
+                return
+        except OSError:
+            # Coordinator temporarily unreachable; keep trying until the
+            # lease expires on its side.
+            continue
+
+
+def run_worker(
+    url: str,
+    worker_id: str | None = None,
+    *,
+    scan_fn: Callable[..., List[Dict[str, Any]]] | None = None,
+    poll_interval: float = 1.0,
+    max_idle: float | None = None,
+) -> int:
+    """Lease and scan shards from the coordinator at ``url`` until done.
+
+    Returns the number of shards this worker completed.
+    """
+    if scan_fn is None:
+        from lan_port_scan import scan_hosts as scan_fn
+    url = url.rstrip("/")
+    worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    completed = 0
+    idle_since = time.monotonic()
+    while True:
+        try:
+            resp = _post(f"{url}/lease", {"worker": worker_id})
+        except OSError:
+            # Coordinator gone: the sweep is over (or unreachable)
+            return completed
+        if resp.get("done"):
+            return completed
+        lease_id = resp.get("lease")
+        if not lease_id:
+            if max_idle is not None and time.monotonic() - idle_since > max_idle:
+                return completed
+            time.sleep(poll_interval)
+            continue
+
+        params = dict(resp.get("params") or {})
+        ports = params.pop("ports", None) or []
+        stop = threading.Event()
+        lost = threading.Event()
+        hb = threading.Thread(
+            target=_heartbeat_loop,
+            args=(url, lease_id, float(resp.get("heartbeat") or HEARTBEAT_INTERVAL), stop, lost),
+            daemon=True,
+        )
+        hb.start()
+        try:
+            hosts = scan_fn(resp["shard"], ports, **params)
+        except Exception as e:
+            stop.set()
+            hb.join()
+            try:
+                _post(f"{url}/fail", {"lease": lease_id, "error": str(e)})
+            except OSError:
+                pass
+            continue
+        stop.set()
+        hb.join()
+        if lost.is_set():
+            continue
+        try:
+            if _post(f"{url}/complete", {"lease": lease_id, "hosts": hosts}).get("ok"):
+                completed += 1
+        except OSError:
+            return completed
+        idle_since = time.monotonic()
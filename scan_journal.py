@@ -0,0 +1,159 @@
+"""Append-only checkpoint journal for LAN sweeps.
+
+Every line is one JSON record: the sweep parameters first, then one record
+per finished host and per failed scan attempt, and a ``done`` marker once
+the sweep completes. Writes are flushed immediately but ``fsync`` is
+batched (every ``sync_every`` records or ``sync_interval`` seconds), so a
+crash loses at most the last batch. A torn last line is ignored when the
+journal is read back.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List
+
+# Records written between fsync calls
+SYNC_EVERY = 16
+# Longest time a written record may stay unsynced
+SYNC_INTERVAL = 1.0
+
+
+@dataclass(slots=True)
+class JournalState:
+    """What a journal file says about a sweep."""
+
+    params: Dict[str, Any] = field(default_factory=dict)
+    hosts: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    failures: Dict[str, List[str]] = field(default_factory=dict)
+    done: bool = False
+
+
+def read_journal(path: str) -> JournalState:
+    """Parse the journal at ``path``; unreadable trailing lines are skipped."""
+    state = JournalState()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            kind = rec.get("type")
+            if kind == "params":
+                state.params = rec.get("params", {})
+            elif kind == "host":
+                state.hosts[rec["ip"]] = rec["result"]
+                state.failures.pop(rec["ip"], None)
+            elif kind == "failure":
+                state.failures.setdefault(rec["ip"], []).append(rec.get("error", ""))
+            elif kind == "done":
+                state.done = True
+    return state
+
+
+class ScanJournal:
+    """Checkpoint writer for one sweep.
+
+    Use :meth:`open` to start a journal or continue an unfinished one;
+    ``state`` then holds the hosts an earlier run already completed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        state: JournalState,
+        *,
+        sync_every: int = SYNC_EVERY,
+        sync_interval: float = SYNC_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.state = state
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def open(cls, path: str, params: Dict[str, Any], resume: bool = True, **kwargs) -> "ScanJournal":
+        """Open ``path`` for a sweep with ``params``.
+
+        An existing, unfinished journal for the same parameters is continued
+        when ``resume`` is true; otherwise the file is started over.
+        """
+        state = None
+        if resume and os.path.exists(path):
+            old = read_journal(path)
+            if old.params == params and not old.done:
+                state = old
+        if state is None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"type": "params", "params": params}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            state = JournalState(params=params)
+        else:
+            _terminate_last_line(path)
+        return cls(path, state, **kwargs)
+
+    def _write(self, rec: Dict[str, Any], sync: bool = False) -> None:
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            now = time.monotonic()
+            if sync or self._unsynced >= self.sync_every or now - self._last_sync >= self.sync_interval:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+                self._last_sync = now
+
+    def record_host(self, ip: str, result: Dict[str, Any]) -> None:
+        self.state.hosts[ip] = result
+        self.state.failures.pop(ip, None)
+        self._write({"type": "host", "ip": ip, "result": result})
+
+    def record_failure(self, ip: str, error: str, attempt: int, final: bool) -> None:
+        with self._lock:
+            self.state.failures.setdefault(ip, []).append(error)
+        self._write({"type": "failure", "ip": ip, "error": error, "attempt": attempt, "final": final})
+
+    def forget_failures(self, ips: Iterable[str]) -> None:
+        """Drop the failures of ``ips``, e.g. hosts that are gone from the network."""
+        with self._lock:
+            for ip in ips:
+                self.state.failures.pop(ip, None)
+
+    def finish(self) -> None:
+        """Mark the sweep complete so the journal is not resumed again."""
+        self.state.done = True
+        self._write({"type": "done"}, sync=True)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def __enter__(self) -> "ScanJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _terminate_last_line(path: str) -> None:
+    # a crash can leave a partial record; start appending on a fresh line
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
@@ -0,0 +1,155 @@
+"""Compact record types for host discovery and port scan results.
+
+Scan layers used to pass plain dictionaries around, repeating the ``"port"``,
+``"state"`` and ``"service"`` keys for every port and storing port numbers as
+strings. :class:`Host` and :class:`PortResult` use ``__slots__``, integer
+ports and interned state/service strings instead. ``to_dict()`` returns the
+JSON-compatible dictionaries the CLI, the API and the reports already use.
+"""
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+
+def _intern(value: Any) -> str:
+    return sys.intern(str(value)) if value else ""
+
+
+@dataclass(slots=True)
+class PortResult:
+    """Single scanned port."""
+
+    port: int
+    state: str = ""
+    service: str = ""
+    service_info: str = ""
+
+    def __post_init__(self) -> None:
+        self.port = int(self.port)
+        self.state = _intern(self.state)
+        self.service = _intern(self.service)
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict[str, Any], int, str]) -> "PortResult":
+        if not isinstance(data, dict):
+            return cls(int(data), "open")
+        return cls(
+            int(data.get("port") or 0),
+            data.get("state", ""),
+            data.get("service", ""),
+            data.get("service_info", ""),
+        )
+
+    def to_dict(self) -> Dict[str, str]:
+        item = {"port": str(self.port), "state": self.state, "service": self.service}
+        if self.service_info:
+            item["service_info"] = self.service_info
+        return item
+
+
+@dataclass(slots=True)
+class Host:
+    """Discovered host, optionally with port scan results.
+
+    ``ports`` is ``None`` for hosts that were only discovered and a list of
+    :class:`PortResult` once the host has been port scanned. ``addresses``
+    lists every address of a device that answered on several (e.g. IPv4
+    and IPv6); ``ip`` is the one that was scanned.
+    """
+
+    ip: str
+    mac: str = ""
+    vendor: str = ""
+    hostname: str = ""
+    os: str = ""
+    ports: Optional[List[PortResult]] = None
+    addresses: Optional[List[str]] = None
+
+    def __post_init__(self) -> None:
+        self.vendor = _intern(self.vendor)
+        self.os = _intern(self.os)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Host":
+        ports = data.get("ports")
+        return cls(
+            data.get("ip") or data.get("device") or "",
+            data.get("mac", "") or "",
+            data.get("vendor", "") or "",
+            data.get("hostname", "") or "",
+            data.get("os", "") or "",
+            None if ports is None else [PortResult.from_dict(p) for p in ports],
+            data.get("addresses") or None,
+        )
+
+    @classmethod
+    def from_scan(cls, host: Dict[str, Any], scanned: Dict[str, Any]) -> "Host":
+        """Combine a discovery record with a ``run_scan`` result."""
+        return cls(
+            host.get("ip", ""),
+            host.get("mac", ""),
+            host.get("vendor", ""),
+            host.get("hostname", ""),
+            scanned.get("os", ""),
+            [
+                p if isinstance(p, PortResult) else PortResult.from_dict(p)
+                for p in scanned.get("ports", [])
+            ],
+            host.get("addresses") or None,
+        )
+
+    def open_ports(self) -> List[int]:
+        return [p.port for p in self.ports or () if p.state == "open"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.ports is None:
+            item: Dict[str, Any] = {
+                "ip": self.ip,
+                "mac": self.mac,
+                "vendor": self.vendor,
+                "hostname": self.hostname,
+            }
+            if self.addresses:
+                item["addresses"] = list(self.addresses)
+            return item
+        item = {
+            "ip": self.ip,
+            "mac": self.mac,
+            "vendor": self.vendor,
+            "os": self.os,
+            "ports": [p.to_dict() for p in self.ports],
+        }
+        if self.hostname:
+            item["hostname"] = self.hostname
+        if self.addresses:
+            item["addresses"] = list(self.addresses)
+        return item
+
+
+def as_dict(record: Any) -> Any:
+    """Return ``record.to_dict()`` for records and the value itself otherwise."""
+    to_dict = getattr(record, "to_dict", None)
+    return to_dict() if to_dict is not None else record
+
+
+def open_port_list(device: Union[Host, Dict[str, Any]]) -> List[str]:
+    """Return open ports of a device record as strings.
+
+    Accepts :class:`Host` records, report input with an ``open_ports`` list
+    and ``lan-scan`` output with a ``ports`` list.
+    """
+    if isinstance(device, Host):
+        return [str(p) for p in device.open_ports()]
+    if "open_ports" in device:
+        return [str(p) for p in device.get("open_ports") or []]
+    ports: Iterable[Any] = device.get("ports") or []
+    result = []
+    for p in ports:
+        if isinstance(p, dict):
+            if p.get("state", "open") == "open":
+                result.append(str(p.get("port")))
+        else:
+            result.append(str(p))
+    return result
@@ -0,0 +1,175 @@
+"""Concurrent SMB dialect negotiation over TCP 445.
+
+Each host gets two short connections: a NEGOTIATE offering only the legacy
+SMB1 dialects (a server answering it has SMBv1 enabled) and one offering the
+SMB2 dialects through the multi-protocol SMB1 request, which tells the
+highest SMB2 family the server speaks. All hosts are probed from one event
+loop with a global connection limit and a per-host timeout, so closed or
+silent addresses cost at most ``timeout`` seconds in parallel.
+"""
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import struct
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+
+SMB_PORT = 445
+# Seconds allowed per host for both negotiations
+HOST_TIMEOUT = 2.0
+# Connections open at once across all hosts
+MAX_CONNECTIONS = 256
+# Responses larger than this are not read
+MAX_RESPONSE = 65536
+
+SMB1_DIALECTS = (
+    "PC NETWORK PROGRAM 1.0",
+    "LANMAN1.0",
+    "Windows for Workgroups 3.1a",
+    "LM1.2X002",
+    "LANMAN2.1",
+    "NT LM 0.12",
+)
+SMB2_DIALECTS = ("SMB 2.002", "SMB 2.???")
+SMB2_REVISIONS = {
+    0x0202: "SMB 2.0.2",
+    0x0210: "SMB 2.1",
+    0x02FF: "SMB 2.???",
+    0x0300: "SMB 3.0",
+    0x0302: "SMB 3.0.2",
+    0x0311: "SMB 3.1.1",
+}
+
+
+@dataclass(slots=True)
+class SmbResult:
+    ip: str
+    open: bool = False
+    smb1_dialect: Optional[str] = None
+    smb2_dialect: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def smb1(self) -> bool:
+        return self.smb1_dialect is not None
+
+
+def build_negotiate(dialects: Sequence[str]) -> bytes:
+    """Return an SMB1 NEGOTIATE request wrapped in a NetBIOS session header."""
+    header = (
+        b"\xffSMB"
+        + bytes([0x72])  # SMB_COM_NEGOTIATE
+        + b"\0" * 4  # status
+        + bytes([0x18])  # flags: case-insensitive, canonical paths
+        + struct.pack("<H", 0xC801)  # flags2: unicode, NT status, long names
+        + b"\0" * 12  # PID high, security features, reserved
+        + struct.pack("<HHHH", 0xFFFF, 0xFEFF, 0, 0)  # TID, PID, UID, MID
+    )
+    data = b"".join(b"\x02" + d.encode("ascii") + b"\0" for d in dialects)
+    smb = header + b"\0" + struct.pack("<H", len(data)) + data
+    return struct.pack(">I", len(smb)) + smb
+
+
+def parse_negotiate_response(data: bytes, dialects: Sequence[str]) -> Optional[str]:
+    """Return the dialect the server selected, or None when it refused all."""
+    if data[:4] == b"\xffSMB" and len(data) >= 35 and data[4] == 0x72:
+        status = struct.unpack_from("<I", data, 5)[0]
+        if status != 0 or data[32] < 1:
+            return None
+        index = struct.unpack_from("<H", data, 33)[0]
+        return dialects[index] if index < len(dialects) else None
+    if data[:4] == b"\xfeSMB" and len(data) >= 70:
+        status = struct.unpack_from("<I", data, 8)[0]
+        if status != 0:
+            return None
+        revision = struct.unpack_from("<H", data, 68)[0]
+        return SMB2_REVISIONS.get(revision, f"SMB 0x{revision:04x}")
+    return None
+
+
+async def _negotiate(ip: str, port: int, dialects: Sequence[str]) -> Optional[str]:
+    reader, writer = await asyncio.open_connection(ip, port)
+    try:
+        writer.write(build_negotiate(dialects))
+        await writer.drain()
+        try:
+            header = await reader.readexactly(4)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # servers with the dialects disabled drop the connection
+            return None
+        length = struct.unpack(">I", header)[0] & 0x1FFFF
+        if header[0] != 0 or length > MAX_RESPONSE:
+            return None
+        try:
+            body = await reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        return parse_negotiate_response(body, dialects)
+    finally:
+        writer.close()
+
+
+async def probe_host(
+    ip: str,
+    *,
+    port: int = SMB_PORT,
+    timeout: float = HOST_TIMEOUT,
+    limit: Optional[asyncio.Semaphore] = None,
+) -> SmbResult:
+    """Negotiate with ``ip`` and report which dialect families it accepts."""
+    result = SmbResult(ip)
+
+    async def run() -> None:
+        result.smb1_dialect = await _negotiate(ip, port, SMB1_DIALECTS)
+        result.open = True
+        result.smb2_dialect = await _negotiate(ip, port, SMB2_DIALECTS)
+
+    # The slot is held for both negotiations, so at most ``limit``
+    # connections are open; the timeout only starts once a slot is free.
+    async with limit or asyncio.Semaphore(1):
+        try:
+            await asyncio.wait_for(run(), timeout)
+        except asyncio.TimeoutError:
+            result.error = "timeout"
+        except OSError as e:
+            result.error = e.strerror or str(e)
+    return result
+
+
+def expand_targets(targets: str | Iterable[str], limit: Optional[int] = None) -> List[str]:
+    """Return host addresses of networks or single IPs in ``targets``.
+
+    With ``limit``, an empty list is returned when the networks hold more
+    addresses than that, before any of them is expanded.
+    """
+    if isinstance(targets, str):
+        targets = [targets]
+    nets = [ipaddress.ip_network(t, strict=False) for t in targets]
+    if limit is not None and sum(net.num_addresses for net in nets) > limit:
+        return []
+    hosts: List[str] = []
+    for net in nets:
+        if net.num_addresses == 1:
+            hosts.append(str(net.network_address))
+        else:
+            hosts.extend(str(h) for h in net.hosts())
+    return list(dict.fromkeys(hosts))
+
+
+async def probe_hosts_async(
+    targets: Iterable[str],
+    *,
+    port: int = SMB_PORT,
+    timeout: float = HOST_TIMEOUT,
+    limit: int = MAX_CONNECTIONS,
+) -> List[SmbResult]:
+    sem = asyncio.Semaphore(limit)
+    return list(
+        await asyncio.gather(*(probe_host(ip, port=port, timeout=timeout, limit=sem) for ip in targets))
+    )
+
+
+def probe_hosts(targets: Iterable[str], **kwargs) -> List[SmbResult]:
+    """Probe all ``targets`` concurrently; see :func:`probe_hosts_async`."""
+    return asyncio.run(probe_hosts_async(list(targets), **kwargs))
@@ -0,0 +1,296 @@
+"""Minimal SNMPv2c client with GETBULK table walks.
+
+Only what topology discovery needs: BER encoding of GET/GETBULK requests,
+decoding of responses and a :class:`SnmpSession` that keeps one UDP socket
+per agent. No MIB compilation is involved; callers use numeric OIDs.
+"""
+from __future__ import annotations
+
+import itertools
+import random
+import socket
+import threading
+from typing import Any, Iterator, List, Sequence, Tuple
+
+Oid = Tuple[int, ...]
+
+# Default agent port, community and request behaviour
+SNMP_PORT = 161
+COMMUNITY = "public"
+TIMEOUT = 1.0
+RETRIES = 1
+MAX_REPETITIONS = 25
+# Stop a walk after this many rows to protect against looping agents
+MAX_WALK_ROWS = 100000
+
+# BER / SNMP tags
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_ID = 0x06
+SEQUENCE = 0x30
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+COUNTER64 = 0x46
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+GET_REQUEST = 0xA0
+GET_NEXT_REQUEST = 0xA1
+GET_RESPONSE = 0xA2
+GET_BULK_REQUEST = 0xA5
+
+# Markers returned for the SNMPv2 exception values
+END_OF_MIB = object()
+NO_SUCH = object()
+
+
+class SnmpError(RuntimeError):
+    """Raised for timeouts, malformed responses and SNMP error statuses."""
+
+
+def parse_oid(text: str | Sequence[int]) -> Oid:
+    if isinstance(text, str):
+        return tuple(int(p) for p in text.strip(".").split("."))
+    return tuple(text)
+
+
+def _encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes([length])
+    raw = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes([0x80 | len(raw)]) + raw
+
+
+def encode_tlv(tag: int, value: bytes) -> bytes:
+    return bytes([tag]) + _encode_length(len(value)) + value
+
+
+def encode_integer(value: int, tag: int = INTEGER) -> bytes:
+    size = max(1, (value.bit_length() + 8) // 8)
+    return encode_tlv(tag, value.to_bytes(size, "big", signed=True))
+
+
+def encode_unsigned(value: int, tag: int) -> bytes:
+    raw = value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big")
+    if raw[0] & 0x80:
+        raw = b"\x00" + raw
+    return encode_tlv(tag, raw)
+
+
+def encode_oid(oid: Sequence[int]) -> bytes:
+    oid = tuple(oid)
+    if len(oid) < 2:
+        oid = oid + (0,) * (2 - len(oid))
+    out = bytearray([oid[0] * 40 + oid[1]])
+    for arc in oid[2:]:
+        chunk = [arc & 0x7F]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7F))
+            arc >>= 7
+        out.extend(reversed(chunk))
+    return encode_tlv(OBJECT_ID, bytes(out))
+
+
+def encode_value(value: Any) -> bytes:
+    """Encode a Python value (used by test agents and for SET-less requests)."""
+    if value is None:
+        return encode_tlv(NULL, b"")
+    if value is END_OF_MIB:
+        return encode_tlv(END_OF_MIB_VIEW, b"")
+    if value is NO_SUCH:
+        return encode_tlv(NO_SUCH_INSTANCE, b"")
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return encode_integer(value)
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, (bytes, bytearray)):
+        return encode_tlv(OCTET_STRING, bytes(value))
+    if isinstance(value, tuple):
+        return encode_oid(value)
+    raise TypeError(f"cannot encode {type(value).__name__}")
+
+
+def decode_tlv(data: bytes, offset: int = 0) -> Tuple[int, bytes, int]:
+    """Return ``(tag, value, next_offset)`` of the TLV at ``offset``."""
+    try:
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            n = length & 0x7F
+            length = int.from_bytes(data[offset:offset + n], "big")
+            offset += n
+    except IndexError:
+        raise SnmpError("truncated BER data") from None
+    end = offset + length
+    if end > len(data):
+        raise SnmpError("truncated BER data")
+    return tag, data[offset:end], end
+
+
+def decode_oid(raw: bytes) -> Oid:
+    if not raw:
+        return ()
+    first = raw[0]
+    arcs = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    value = 0
+    for byte in raw[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            arcs.append(value)
+            value = 0
+    return tuple(arcs)
+
+
+def decode_value(tag: int, raw: bytes) -> Any:
+    if tag == INTEGER:
+        return int.from_bytes(raw, "big", signed=True)
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return int.from_bytes(raw, "big")
+    if tag == OCTET_STRING:
+        return raw
+    if tag == OBJECT_ID:
+        return decode_oid(raw)
+    if tag == IP_ADDRESS:
+        return socket.inet_ntoa(raw)
+    if tag == END_OF_MIB_VIEW:
+        return END_OF_MIB
+    if tag in (NO_SUCH_OBJECT, NO_SUCH_INSTANCE):
+        return NO_SUCH
+    if tag == NULL:
+        return None
+    return raw
+
+
+def decode_sequence(raw: bytes) -> Iterator[Tuple[int, bytes]]:
+    offset = 0
+    while offset < len(raw):
+        tag, value, offset = decode_tlv(raw, offset)
+        yield tag, value
+
+
+def encode_message(
+    community: str,
+    pdu_type: int,
+    request_id: int,
+    varbinds: Sequence[Tuple[Oid, Any]],
+    field1: int = 0,
+    field2: int = 0,
+) -> bytes:
+    """Encode an SNMPv2c message.
+
+    ``field1``/``field2`` are error-status/error-index, or non-repeaters and
+    max-repetitions for GETBULK.
+    """
+    vbs = b"".join(encode_tlv(SEQUENCE, encode_oid(oid) + encode_value(val)) for oid, val in varbinds)
+    pdu = encode_integer(request_id) + encode_integer(field1) + encode_integer(field2) + encode_tlv(SEQUENCE, vbs)
+    body = encode_integer(1) + encode_tlv(OCTET_STRING, community.encode()) + encode_tlv(pdu_type, pdu)
+    return encode_tlv(SEQUENCE, body)
+
+
+def decode_message(data: bytes) -> Tuple[str, int, int, int, int, List[Tuple[Oid, Any]]]:
+    """Return ``(community, pdu_type, request_id, field1, field2, varbinds)``."""
+    tag, body, _ = decode_tlv(data)
+    if tag != SEQUENCE:
+        raise SnmpError("not an SNMP message")
+    items = list(decode_sequence(body))
+    if len(items) != 3:
+        raise SnmpError("malformed SNMP message")
+    community = items[1][1].decode(errors="replace")
+    pdu_type, pdu = items[2]
+    fields = list(decode_sequence(pdu))
+    if len(fields) != 4:
+        raise SnmpError("malformed PDU")
+    request_id, field1, field2 = (decode_value(INTEGER, v) for _, v in fields[:3])
+    varbinds = []
+    for _, vb in decode_sequence(fields[3][1]):
+        (oid_tag, oid_raw), (val_tag, val_raw) = list(decode_sequence(vb))[:2]
+        varbinds.append((decode_oid(oid_raw), decode_value(val_tag, val_raw)))
+    return community, pdu_type, request_id, field1, field2, varbinds
+
+
+class SnmpSession:
+    """SNMPv2c session bound to one agent.
+
+    The UDP socket is kept open for the life of the session so that all
+    walks against the agent reuse it. Requests are serialised with a lock,
+    so a session may be shared between threads.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        community: str = COMMUNITY,
+        *,
+        port: int = SNMP_PORT,
+        timeout: float = TIMEOUT,
+        retries: int = RETRIES,
+    ) -> None:
+        self.host = host
+        self.community = community
+        self.timeout = timeout
+        self.retries = retries
+        info = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+        self._sock = socket.socket(info[0], socket.SOCK_DGRAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(info[4])
+        self._ids = itertools.count(random.randint(1, 1 << 30))
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def __enter__(self) -> "SnmpSession":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _request(self, pdu_type: int, varbinds: Sequence[Tuple[Oid, Any]], f1: int = 0, f2: int = 0):
+        with self._lock:
+            request_id = next(self._ids) & 0x7FFFFFFF
+            packet = encode_message(self.community, pdu_type, request_id, varbinds, f1, f2)
+            for _ in range(self.retries + 1):
+                try:
+                    self._sock.send(packet)
+                    while True:
+                        data = self._sock.recv(65535)
+                        try:
+                            _, rtype, rid, status, index, vbs = decode_message(data)
+                        except SnmpError:
+                            continue
+                        if rtype == GET_RESPONSE and rid == request_id:
+                            break
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    raise SnmpError(f"{self.host}: {e}") from None
+                if status:
+                    raise SnmpError(f"{self.host}: error-status {status} at index {index}")
+                return vbs
+        raise SnmpError(f"{self.host}: no response")
+
+    def get(self, *oids: str | Oid) -> List[Tuple[Oid, Any]]:
+        return self._request(GET_REQUEST, [(parse_oid(o), None) for o in oids])
+
+    def bulk_walk(self, oid: str | Oid, max_repetitions: int = MAX_REPETITIONS) -> Iterator[Tuple[Oid, Any]]:
+        """Yield ``(oid, value)`` for every object below ``oid`` using GETBULK."""
+        root = parse_oid(oid)
+        current = root
+        rows = 0
+        while rows < MAX_WALK_ROWS:
+            vbs = self._request(GET_BULK_REQUEST, [(current, None)], 0, max_repetitions)
+            if not vbs:
+                return
+            for vb_oid, value in vbs:
+                if value is END_OF_MIB or vb_oid[: len(root)] != root or vb_oid <= current:
+                    return
+                rows += 1
+                current = vb_oid
+                yield vb_oid, value
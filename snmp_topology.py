@@ -0,0 +1,219 @@
+"""Layer 2 topology from SNMP agents (LLDP-MIB, BRIDGE-MIB, ipNetToMedia).
+
+Every agent is polled once with a single :class:`snmp_client.SnmpSession`
+and its tables are cached for ``ttl`` seconds, so all hosts behind a switch
+share one set of walks. Agents are polled concurrently; LLDP neighbours that
+advertise an IPv4 management address are polled in the next round.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from snmp_client import COMMUNITY, RETRIES, SNMP_PORT, TIMEOUT, SnmpError, SnmpSession, parse_oid
+
+SYS_NAME = "1.3.6.1.2.1.1.5.0"
+IF_NAME = "1.3.6.1.2.1.31.1.1.1.1"
+IP_NET_TO_MEDIA_PHYS = "1.3.6.1.2.1.4.22.1.2"
+DOT1D_BASE_PORT_IFINDEX = "1.3.6.1.2.1.17.1.4.1.2"
+DOT1D_TP_FDB_PORT = "1.3.6.1.2.1.17.4.3.1.2"
+LLDP_REM_SYS_NAME = "1.0.8802.1.1.2.1.4.1.1.9"
+LLDP_REM_MAN_ADDR_IF_SUBTYPE = "1.0.8802.1.1.2.1.4.2.1.3"
+
+# Seconds polled agent data is reused
+AGENT_CACHE_TTL = 300
+# Agents polled at once
+SNMP_WORKERS = 16
+# Upper bound of agents polled per discovery, LLDP neighbours included
+MAX_AGENTS = 256
+
+
+@dataclass(slots=True)
+class AgentData:
+    """Tables read from one agent."""
+
+    address: str
+    name: str
+    arp: Dict[str, str] = field(default_factory=dict)
+    fdb: Dict[str, int] = field(default_factory=dict)
+    port_names: Dict[int, str] = field(default_factory=dict)
+    neighbours: Dict[int, str] = field(default_factory=dict)
+    neighbour_addrs: Dict[int, str] = field(default_factory=dict)
+
+
+def _format_mac(octets: Iterable[int]) -> str:
+    return ":".join(f"{b:02x}" for b in octets)
+
+
+def _text(value: object) -> str:
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    return str(value)
+
+
+def _index(oid: Tuple[int, ...], column: str) -> Tuple[int, ...]:
+    return oid[len(parse_oid(column)):]
+
+
+def poll_agent(session: SnmpSession, address: str) -> AgentData:
+    """Read the topology tables of one agent through ``session``.
+
+    Tables the agent does not implement are left empty; an agent that does
+    not answer the sysName request raises :class:`SnmpError`.
+    """
+    (_, name), = session.get(SYS_NAME)
+    data = AgentData(address=address, name=_text(name) if isinstance(name, bytes) else address)
+
+    for oid, mac in session.bulk_walk(IP_NET_TO_MEDIA_PHYS):
+        idx = _index(oid, IP_NET_TO_MEDIA_PHYS)
+        if len(idx) == 5 and isinstance(mac, bytes) and len(mac) == 6:
+            data.arp[".".join(map(str, idx[1:]))] = _format_mac(mac)
+
+    for oid, port in session.bulk_walk(DOT1D_TP_FDB_PORT):
+        idx = _index(oid, DOT1D_TP_FDB_PORT)
+        if len(idx) == 6 and isinstance(port, int) and port > 0:
+            data.fdb[_format_mac(idx)] = port
+
+    if data.fdb:
+        if_names = {
+            _index(oid, IF_NAME)[0]: _text(value)
+            for oid, value in session.bulk_walk(IF_NAME)
+        }
+        for oid, if_index in session.bulk_walk(DOT1D_BASE_PORT_IFINDEX):
+            port = _index(oid, DOT1D_BASE_PORT_IFINDEX)[0]
+            data.port_names[port] = if_names.get(if_index, str(port))
+
+    # lldpRemTable index: timeMark.localPortNum.remIndex
+    for oid, value in session.bulk_walk(LLDP_REM_SYS_NAME):
+        idx = _index(oid, LLDP_REM_SYS_NAME)
+        if len(idx) == 3 and value:
+            data.neighbours[idx[1]] = _text(value)
+    # lldpRemManAddrTable index: timeMark.localPortNum.remIndex.subtype.len.addr
+    for oid, _ in session.bulk_walk(LLDP_REM_MAN_ADDR_IF_SUBTYPE):
+        idx = _index(oid, LLDP_REM_MAN_ADDR_IF_SUBTYPE)
+        if len(idx) == 9 and idx[3] == 1 and idx[4] == 4:
+            data.neighbour_addrs.setdefault(idx[1], ".".join(map(str, idx[5:])))
+    return data
+
+
+class SnmpTopology:
+    """Polls SNMP agents and resolves host IPs to layer 2 paths."""
+
+    def __init__(
+        self,
+        community: str = COMMUNITY,
+        *,
+        port: int = SNMP_PORT,
+        timeout: float = TIMEOUT,
+        retries: int = RETRIES,
+        ttl: float = AGENT_CACHE_TTL,
+        max_workers: int = SNMP_WORKERS,
+        max_agents: int = MAX_AGENTS,
+    ) -> None:
+        self.community = community
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.max_agents = max_agents
+        self.agents: Dict[str, AgentData] = {}
+        self._cache: Dict[str, Tuple[Optional[AgentData], float]] = {}
+        self._lock = threading.Lock()
+
+    def agent(self, address: str) -> Optional[AgentData]:
+        """Return cached data of ``address``, polling it when stale.
+
+        Unreachable agents are cached as ``None`` so they are not retried
+        before the TTL expires.
+        """
+        with self._lock:
+            entry = self._cache.get(address)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                return entry[0]
+        try:
+            with SnmpSession(
+                address, self.community, port=self.port, timeout=self.timeout, retries=self.retries
+            ) as session:
+                data: Optional[AgentData] = poll_agent(session, address)
+        except (SnmpError, OSError, ValueError):
+            data = None
+        with self._lock:
+            self._cache[address] = (data, time.monotonic())
+        return data
+
+    def poll(self, seeds: Iterable[str], follow_lldp: bool = True) -> Dict[str, AgentData]:
+        """Poll ``seeds`` concurrently, then their LLDP neighbours.
+
+        Returns the responding agents by address; they are also kept in
+        :attr:`agents` for :meth:`l2_path`.
+        """
+        pending = list(dict.fromkeys(seeds))
+        seen = set(pending)
+        found: Dict[str, AgentData] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending:
+                batch, pending = pending[: self.max_agents - len(found)], []
+                for address, data in zip(batch, executor.map(self.agent, batch)):
+                    if data is None:
+                        continue
+                    found[address] = data
+                    if not follow_lldp:
+                        continue
+                    for neighbour in data.neighbour_addrs.values():
+                        if neighbour not in seen:
+                            seen.add(neighbour)
+                            pending.append(neighbour)
+                if len(found) >= self.max_agents:
+                    break
+        self.agents = found
+        return found
+
+    def mac_of(self, ip: str) -> Optional[str]:
+        for data in self.agents.values():
+            mac = data.arp.get(ip)
+            if mac:
+                return mac
+        return None
+
+    def l2_path(self, ip: str) -> List[str]:
+        """Return switch labels from the core towards ``ip``.
+
+        Switches whose forwarding table holds the host MAC are chained by
+        following, on each, the LLDP neighbour of the port the MAC was
+        learned on. The last switch is the access switch and is labelled
+        ``name:port``. Returns an empty list when the host is not found.
+        """
+        mac = self.mac_of(ip)
+        if mac is None:
+            return []
+        seen_on = {addr: data.fdb[mac] for addr, data in self.agents.items() if mac in data.fdb}
+        if not seen_on:
+            return []
+        by_name = {data.name: addr for addr, data in self.agents.items()}
+        toward: Dict[str, str] = {}
+        for addr, port in seen_on.items():
+            nxt = by_name.get(self.agents[addr].neighbours.get(port, ""))
+            if nxt in seen_on and nxt != addr:
+                toward[addr] = nxt
+
+        def chain(start: str) -> List[str]:
+            out = [start]
+            while out[-1] in toward and toward[out[-1]] not in out:
+                out.append(toward[out[-1]])
+            return out
+
+        roots = [addr for addr in seen_on if addr not in toward.values()] or list(seen_on)
+        best = max((chain(r) for r in roots), key=len)
+        labels = [self.agents[addr].name for addr in best]
+        edge = self.agents[best[-1]]
+        port = seen_on[best[-1]]
+        labels[-1] = f"{edge.name}:{edge.port_names.get(port, port)}"
+        return labels
+
+    def name_of(self, address: str) -> Optional[str]:
+        data = self.agents.get(address)
+        return data.name if data else None
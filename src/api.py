@@ -1,31 +1,80 @@
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
+import hmac
+import os
+import time
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from threading import Event, Thread
 from typing import List, Dict, Any
 
-from lan_port_scan import scan_hosts, DEFAULT_PORTS
+import metrics
+import port_scan
+import profiling
+from arp_watch import ArpWatcher
+from device_index import DeviceIndex
+from lan_port_scan import scan_hosts, sweep_params, DEFAULT_PORTS
 from discover_hosts import _get_subnet
+from network_utils import get_local_subnets
+from scan_journal import ScanJournal
+from scan_records import Host, as_dict
 
 app = FastAPI()
 
 _scan_thread: Thread | None = None
 _stop_event = Event()
-_scan_results: List[Dict[str, Any]] = []
+# Latest sweep, kept as compact records while the service runs
+_scan_results: List[Host | Dict[str, Any]] = []
+# Device ids stay stable across sweeps; _scan_devices has one row per device
+_device_index = DeviceIndex()
+_scan_devices: List[Dict[str, Any]] = []
+# Progress of the scan loop for /dynamic-scan/status
+_scan_status: Dict[str, Any] = {"sweeps": 0, "sweep_started": None, "last_sweep_seconds": None}
+
+_arp_watcher: ArpWatcher | None = None
+_arp_thread: Thread | None = None
+_arp_stop = Event()
+
+# Longest profile the debug endpoint will take
+MAX_PROFILE_SECONDS = 60
 
 
 class ScanRequest(BaseModel):
     subnet: str | None = None
     ports: List[str] | None = None
+    all_networks: bool = False
+
 
+def _sweep(subnet: str | List[str], ports: List[str], stop: Event, resume: bool) -> List[Host | Dict[str, Any]]:
+    # With NWCD_SCAN_JOURNAL set, the first sweep after a restart resumes the
+    # one that was cut short; later sweeps start the journal over
+    path = os.environ.get("NWCD_SCAN_JOURNAL")
+    if not path:
+        return scan_hosts(subnet, ports, records=True, cancel=stop)
+    with ScanJournal.open(path, sweep_params(subnet, ports), resume=resume) as journal:
+        return scan_hosts(subnet, ports, records=True, cancel=stop, journal=journal)
 
-def _scan_loop(subnet: str, ports: List[str]) -> None:
-    global _scan_results
-    while not _stop_event.is_set():
-        _scan_results = scan_hosts(subnet, ports)
+
+def _scan_loop(subnet: str | List[str], ports: List[str]) -> None:
+    global _scan_results, _scan_devices
+    stop = _stop_event
+    resume = True
+    while not stop.is_set():
+        started = time.time()
+        _scan_status["sweep_started"] = started
+        results = _sweep(subnet, ports, stop, resume)
+        resume = False
+        _scan_status["sweep_started"] = None
+        # a stopped sweep is partial; keep the last complete one
+        if not stop.is_set():
+            _scan_results = results
+            _scan_devices = _device_index.group(results)
+            _scan_status["sweeps"] += 1
+            _scan_status["last_sweep_seconds"] = round(time.time() - started, 3)
         # wait a bit before next scan, allowing stop_event to terminate early
-        _stop_event.wait(5)
+        stop.wait(5)
 
 
 @app.post("/dynamic-scan/start")
@@ -34,9 +83,17 @@ def start_scan(req: ScanRequest) -> Dict[str, str]:
     global _scan_thread
     if _scan_thread and _scan_thread.is_alive():
         raise HTTPException(status_code=400, detail="scan already running")
-    subnet = req.subnet or _get_subnet() or "192.168.1.0/24"
+    if req.all_networks and req.subnet:
+        raise HTTPException(status_code=400, detail="all_networks cannot be combined with subnet")
+    subnet = (
+        (req.all_networks and get_local_subnets())
+        or req.subnet
+        or _get_subnet()
+        or "192.168.1.0/24"
+    )
     ports = req.ports or DEFAULT_PORTS
     _stop_event.clear()
+    _scan_status.update(sweeps=0, sweep_started=None, last_sweep_seconds=None)
     _scan_thread = Thread(target=_scan_loop, args=(subnet, ports), daemon=True)
     _scan_thread.start()
     return {"status": "started"}
@@ -44,18 +101,122 @@ def start_scan(req: ScanRequest) -> Dict[str, str]:
 
 @app.post("/dynamic-scan/stop")
 def stop_scan() -> Dict[str, str]:
-    """Stop the running dynamic scan."""
-    global _scan_thread
+    """Ask the running dynamic scan to stop without waiting for it.
+
+    Queued hosts are dropped and running nmap processes are killed; poll
+    ``/dynamic-scan/status`` until the state is ``idle``.
+    """
     if not _scan_thread or not _scan_thread.is_alive():
         raise HTTPException(status_code=400, detail="no active scan")
     _stop_event.set()
-    _scan_thread.join()
-    _scan_thread = None
-    return {"status": "stopped"}
+    return {"status": "stopping"}
+
+
+@app.get("/dynamic-scan/status")
+def scan_status() -> Dict[str, Any]:
+    """Return the scan loop state and progress."""
+    alive = _scan_thread is not None and _scan_thread.is_alive()
+    if not alive:
+        state = "idle"
+    elif _stop_event.is_set():
+        state = "stopping"
+    else:
+        state = "running"
+    return {
+        "state": state,
+        "sweeps": _scan_status["sweeps"],
+        "sweep_started": _scan_status["sweep_started"],
+        "last_sweep_seconds": _scan_status["last_sweep_seconds"],
+        "hosts": len(_scan_results),
+        "nmap_processes": port_scan.active_processes(),
+    }
 
 
 @app.get("/dynamic-scan/results")
 def get_results() -> Dict[str, Any]:
     """Return current scan results."""
     running = _scan_thread is not None and _scan_thread.is_alive()
-    return {"running": running, "results": _scan_results}
+    return {"running": running, "results": [as_dict(r) for r in _scan_results]}
+
+
+@app.get("/dynamic-scan/devices")
+def get_devices() -> Dict[str, Any]:
+    """Return the latest sweep with one row per device.
+
+    Records of the same device (matched by MAC, hostname or address) are
+    merged; ``device_id`` stays the same across sweeps.
+    """
+    running = _scan_thread is not None and _scan_thread.is_alive()
+    return {"running": running, "devices": _scan_devices}
+
+
+@app.post("/arp-watch/start")
+def start_arp_watch() -> Dict[str, str]:
+    """Start watching the neighbour table for ARP spoofing."""
+    global _arp_watcher, _arp_thread
+    if _arp_thread and _arp_thread.is_alive():
+        raise HTTPException(status_code=400, detail="arp watch already running")
+    _arp_stop.clear()
+    _arp_watcher = ArpWatcher()
+    _arp_thread = _arp_watcher.start(_arp_stop)
+    return {"status": "started"}
+
+
+@app.post("/arp-watch/stop")
+def stop_arp_watch() -> Dict[str, str]:
+    """Stop the ARP watcher; its alerts stay available."""
+    global _arp_thread
+    if not _arp_thread or not _arp_thread.is_alive():
+        raise HTTPException(status_code=400, detail="arp watch not running")
+    _arp_stop.set()
+    _arp_thread.join()
+    _arp_thread = None
+    return {"status": "stopped"}
+
+
+@app.get("/arp-watch/alerts")
+def get_arp_alerts() -> Dict[str, Any]:
+    """Return ARP watcher alerts and the current IP to MAC table."""
+    running = _arp_thread is not None and _arp_thread.is_alive()
+    if _arp_watcher is None:
+        return {"running": running, "gateways": [], "alerts": [], "table": {}}
+    return {
+        "running": running,
+        "gateways": sorted(_arp_watcher.gateways),
+        "alerts": _arp_watcher.alert_dicts(),
+        "table": _arp_watcher.table(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    """Expose scanner metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.post("/debug/profile", response_class=PlainTextResponse)
+def debug_profile(
+    seconds: float = 10,
+    mode: str = "wall",
+    x_debug_token: str | None = Header(default=None),
+) -> PlainTextResponse:
+    """Profile the running scan loop for ``seconds``.
+
+    Disabled unless ``NWCD_DEBUG_TOKEN`` is set; the request must send the
+    same value in the ``X-Debug-Token`` header. ``mode`` is ``wall``
+    (collapsed stacks) or ``alloc`` (top allocation sites).
+    """
+    token = os.environ.get("NWCD_DEBUG_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_debug_token or not hmac.compare_digest(x_debug_token, token):
+        raise HTTPException(status_code=403, detail="invalid debug token")
+    if mode not in ("wall", "alloc"):
+        raise HTTPException(status_code=400, detail="mode must be wall or alloc")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(
+            status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}]"
+        )
+    if not _scan_thread or not _scan_thread.is_alive():
+        raise HTTPException(status_code=400, detail="no active scan")
+    return PlainTextResponse(profiling.profile_for(mode, seconds))
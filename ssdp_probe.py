@@ -0,0 +1,294 @@
+"""Find UPnP devices with an SSDP M-SEARCH and read their descriptions.
+
+One M-SEARCH is multicast to ``239.255.255.250:1900`` and responses are
+collected for a bounded window. The description XML of every responder is
+then fetched concurrently over a small keep-alive connection pool (one
+connection is reused for all descriptions served by the same host), and the
+devices are returned with their services. Devices exposing the IGD
+``WANIPConnection``/``WANPPPConnection`` services allow LAN clients to open
+ports on the router and are flagged with ``port_mapping``.
+"""
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import socket
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+SSDP_ADDR = "239.255.255.250"
+SSDP_PORT = 1900
+SEARCH_TARGET = "ssdp:all"
+# Seconds to collect M-SEARCH responses
+SEARCH_WINDOW = 2.0
+# Seconds allowed per description fetch
+FETCH_TIMEOUT = 3.0
+# Description fetches in flight at once
+MAX_CONNECTIONS = 16
+# Larger descriptions are not read
+MAX_DESCRIPTION_BYTES = 256 * 1024
+
+IGD_PORT_MAPPING_SERVICES = ("WANIPConnection", "WANPPPConnection")
+
+
+@dataclass(slots=True)
+class UpnpDevice:
+    address: str
+    location: str
+    server: str = ""
+    friendly_name: str = ""
+    manufacturer: str = ""
+    model: str = ""
+    device_type: str = ""
+    services: List[str] = field(default_factory=list)
+    port_mapping: bool = False
+
+
+def build_msearch(st: str = SEARCH_TARGET, mx: int = 1) -> bytes:
+    return (
+        "M-SEARCH * HTTP/1.1\r\n"
+        f"HOST: {SSDP_ADDR}:{SSDP_PORT}\r\n"
+        'MAN: "ssdp:discover"\r\n'
+        f"MX: {mx}\r\n"
+        f"ST: {st}\r\n"
+        "\r\n"
+    ).encode()
+
+
+def parse_ssdp_response(data: bytes) -> Optional[Dict[str, str]]:
+    """Return the lower-cased headers of an SSDP ``200 OK`` reply, or None."""
+    lines = data.decode("latin-1", errors="replace").split("\r\n")
+    if not lines or not lines[0].upper().startswith("HTTP/1.1 200"):
+        return None
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        key, sep, value = line.partition(":")
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    return headers if headers.get("location") else None
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(elem: ET.Element, name: str) -> str:
+    for child in elem:
+        if _local(child.tag) == name:
+            return (child.text or "").strip()
+    return ""
+
+
+def parse_description(xml: bytes, address: str, location: str, server: str = "") -> UpnpDevice:
+    """Return the root device of a UPnP description document.
+
+    Services of embedded devices are included in the root device's list.
+    """
+    root = ET.fromstring(xml)
+    device = next((e for e in root.iter() if _local(e.tag) == "device"), None)
+    result = UpnpDevice(address=address, location=location, server=server)
+    if device is None:
+        return result
+    result.friendly_name = _child_text(device, "friendlyName")
+    result.manufacturer = _child_text(device, "manufacturer")
+    result.model = _child_text(device, "modelName")
+    result.device_type = _child_text(device, "deviceType")
+    for elem in device.iter():
+        if _local(elem.tag) == "serviceType" and elem.text:
+            service = elem.text.strip()
+            if service not in result.services:
+                result.services.append(service)
+    result.port_mapping = any(
+        name in service for service in result.services for name in IGD_PORT_MAPPING_SERVICES
+    )
+    return result
+
+
+class _SsdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.responses: Dict[str, Tuple[str, Dict[str, str]]] = {}
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        headers = parse_ssdp_response(data)
+        if headers is not None:
+            self.responses.setdefault(headers["location"], (addr[0], headers))
+
+
+async def search(
+    window: float = SEARCH_WINDOW,
+    *,
+    st: str = SEARCH_TARGET,
+    target: Tuple[str, int] = (SSDP_ADDR, SSDP_PORT),
+) -> List[Tuple[str, Dict[str, str]]]:
+    """Send an M-SEARCH and return ``(responder, headers)`` per LOCATION."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _SsdpProtocol, local_addr=("0.0.0.0", 0), family=socket.AF_INET
+    )
+    try:
+        sock = transport.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        packet = build_msearch(st, mx=max(1, int(window)))
+        # SSDP is lossy: send the search twice
+        for _ in range(2):
+            transport.sendto(packet, target)
+        await asyncio.sleep(window)
+    finally:
+        transport.close()
+    return list(protocol.responses.values())
+
+
+class HttpPool:
+    """Minimal HTTP/1.1 GET client keeping idle connections per host."""
+
+    def __init__(self, limit: int = MAX_CONNECTIONS, timeout: float = FETCH_TIMEOUT) -> None:
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._sem = asyncio.Semaphore(limit)
+        self._idle: Dict[Tuple[str, int], List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+
+    async def _request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, path: str
+    ) -> Tuple[bytes, bool]:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: nwcd\r\nConnection: keep-alive\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed")
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        reusable = headers.get("connection", "").lower() != "close"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                if len(body) + size > MAX_DESCRIPTION_BYTES:
+                    raise ValueError("description too large")
+                body += await reader.readexactly(size)
+                await reader.readline()
+        elif "content-length" in headers:
+            length = int(headers["content-length"])
+            if length > MAX_DESCRIPTION_BYTES:
+                raise ValueError("description too large")
+            body = bytearray(await reader.readexactly(length))
+        else:
+            body = bytearray(await reader.read(MAX_DESCRIPTION_BYTES))
+            reusable = False
+        parts = status_line.split()
+        if len(parts) < 2 or parts[1] != b"200":
+            raise ValueError(f"HTTP {status_line.decode('latin-1').strip()}")
+        return bytes(body), reusable
+
+    async def get(self, url: str) -> bytes:
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        key = (parts.hostname, parts.port or 80)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        async with self._sem:
+            idle = self._idle.setdefault(key, [])
+            # A reused connection may have been closed by the device: retry fresh
+            for reuse in ([True] if idle else []) + [False]:
+                if reuse:
+                    reader, writer = idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(*key), self.timeout)
+                    self.connections_opened += 1
+                try:
+                    body, reusable = await asyncio.wait_for(
+                        self._request(reader, writer, parts.netloc, path), self.timeout
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reuse:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                if reusable:
+                    idle.append((reader, writer))
+                else:
+                    writer.close()
+                return body
+        raise ConnectionError(f"{url}: no connection")
+
+    def close(self) -> None:
+        for conns in self._idle.values():
+            for _, writer in conns:
+                writer.close()
+        self._idle.clear()
+
+
+def _same_host(location: str, address: str) -> bool:
+    """Only follow LOCATIONs pointing at the device that answered."""
+    host = urlsplit(location).hostname or ""
+    try:
+        return ipaddress.ip_address(host) == ipaddress.ip_address(address)
+    except ValueError:
+        return False
+
+
+async def discover_async(
+    window: float = SEARCH_WINDOW,
+    *,
+    target: Tuple[str, int] = (SSDP_ADDR, SSDP_PORT),
+    pool: Optional[HttpPool] = None,
+) -> List[UpnpDevice]:
+    """Search for devices and fetch all descriptions concurrently.
+
+    Devices whose description cannot be read are still returned, with only
+    the SSDP information filled in.
+    """
+    responses = await search(window, target=target)
+    own_pool = pool is None
+    pool = pool or HttpPool()
+
+    async def describe(address: str, headers: Dict[str, str]) -> UpnpDevice:
+        location = headers["location"]
+        server = headers.get("server", "")
+        if _same_host(location, address):
+            try:
+                xml = await pool.get(location)
+                return parse_description(xml, address, location, server)
+            except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, ET.ParseError):
+                pass
+        device = UpnpDevice(address=address, location=location, server=server)
+        st = headers.get("st", "")
+        if st.startswith("urn:"):
+            device.services.append(st)
+            device.port_mapping = any(name in st for name in IGD_PORT_MAPPING_SERVICES)
+        return device
+
+    try:
+        devices = await asyncio.gather(*(describe(addr, hdrs) for addr, hdrs in responses))
+    finally:
+        if own_pool:
+            pool.close()
+    # One entry per device: a root device may answer with several LOCATIONs
+    merged: Dict[Tuple[str, str], UpnpDevice] = {}
+    for device in devices:
+        key = (device.address, device.friendly_name or device.location)
+        existing = merged.setdefault(key, device)
+        if existing is not device:
+            existing.services.extend(s for s in device.services if s not in existing.services)
+            existing.port_mapping = existing.port_mapping or device.port_mapping
+    return list(merged.values())
+
+
+def discover(window: float = SEARCH_WINDOW, **kwargs) -> List[UpnpDevice]:
+    """Synchronous wrapper around :func:`discover_async`."""
+    return asyncio.run(discover_async(window, **kwargs))
@@ -3,3 +3,11 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _topology_cache(tmp_path, monkeypatch):
+    # Keep rendered topology diagrams out of the user's cache directory
+    monkeypatch.setenv("NWCD_TOPOLOGY_CACHE", str(tmp_path / "topology-cache"))
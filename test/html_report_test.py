@@ -3,7 +3,7 @@ import pytest
 
 pytest.importorskip("graphviz")
 
-from generate_html_report import generate_html_report
+from generate_html_report import generate_html, generate_html_report
 
 
 class HtmlReportGeneratorTest(unittest.TestCase):
@@ -19,6 +19,30 @@ class HtmlReportGeneratorTest(unittest.TestCase):
         self.assertIn("<td>9.5</td>", html)  # score for dev1
         self.assertTrue(html.endswith("</html>"))
 
+    def test_pipeline_phase_times(self):
+        data = {
+            "devices": [
+                {"ip": "10.0.0.2", "ports": [{"port": "445", "state": "open"}], "escalated": ["danger_port:445"]},
+                {"ip": "10.0.0.3", "ports": []},
+            ],
+            "scan_phases": {"discovery": 1.5, "sweep": 4.25, "deep_scan": 30.0},
+        }
+        html = generate_html(data)
+        self.assertIn("<tr><td>sweep</td><td>4.25</td></tr>", html)
+        self.assertIn("<tr><td>10.0.0.2</td><td>danger_port:445</td></tr>", html)
+        self.assertNotIn("<td>10.0.0.3</td><td>danger", html)
+
+    def test_one_row_per_device(self):
+        devices = [
+            {"ip": "10.0.0.2", "mac": "aa:aa:aa:aa:aa:02", "vendor": "Acme", "ports": []},
+            {"ip": "fd00::2", "mac": "AA:AA:AA:AA:AA:02", "ports": [{"port": "22", "state": "open"}]},
+        ]
+        html = generate_html(devices)
+        self.assertIn("<tr><td>10.0.0.2, fd00::2</td><td>aa:aa:aa:aa:aa:02</td><td>Acme</td></tr>", html)
+        self.assertEqual(html.count("<h3>10.0.0.2</h3>"), 2)
+        self.assertNotIn("<h3>fd00::2</h3>", html)
+        self.assertIn("<li>22</li>", html)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -7,6 +7,7 @@ from lan_security_check import (
     parse_netbios_output,
     parse_smb_protocol_output,
     check_external_comm,
+    check_netbios,
 )
 
 
@@ -40,6 +41,17 @@ class LanSecurityParseTest(unittest.TestCase):
         self.assertTrue(parse_smb_protocol_output(sample))
 
 
+class MultiNetworkTargetTest(unittest.TestCase):
+    @patch('lan_security_check.subprocess.run')
+    def test_check_netbios_passes_all_networks(self, mock_run):
+        mock_run.return_value.returncode = 0
+        mock_run.return_value.stdout = ""
+        res = check_netbios(["192.168.1.0/24", "10.20.0.0/16"])
+        self.assertEqual(res["status"], "ok")
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[-2:], ["192.168.1.0/24", "10.20.0.0/16"])
+
+
 class ExternalCommCountTest(unittest.TestCase):
     @patch('lan_security_check.geoip2', None)
     @patch('lan_security_check.geoip_country')
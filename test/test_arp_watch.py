@@ -0,0 +1,145 @@
+import socket
+import struct
+import threading
+
+from fastapi.testclient import TestClient
+
+import arp_watch
+import netlink
+import src.api as api
+from arp_watch import ArpWatcher
+
+PROC_ARP = (
+    "IP address       HW type     Flags       HW address            Mask     Device\n"
+    "192.168.1.1      0x1         0x2         AA:BB:CC:00:00:01     *        eth0\n"
+    "192.168.1.20     0x1         0x2         aa:bb:cc:00:00:20     *        eth0\n"
+    "192.168.1.30     0x1         0x0         00:00:00:00:00:00     *        eth0\n"
+)
+PROC_ROUTE = (
+    "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\n"
+    "eth0\t00000000\t0101A8C0\t0003\t0\t0\t100\t00000000\n"
+    "eth0\t0001A8C0\t00000000\t0001\t0\t0\t100\t00FFFFFF\n"
+)
+
+
+def _neigh_message(ip, mac, state=0x02, family=socket.AF_INET):
+    attrs = b""
+    for atype, value in ((netlink.NDA_DST, socket.inet_pton(family, ip)), (netlink.NDA_LLADDR, bytes(mac))):
+        attr = struct.pack("=HH", 4 + len(value), atype) + value
+        attrs += attr + b"\0" * (-len(attr) % 4)
+    body = struct.pack("=BxxxiHBB", family, 2, state, 0, 1) + attrs
+    return struct.pack("=IHHII", 16 + len(body), netlink.RTM_NEWNEIGH, 0, 0, 0) + body
+
+
+def test_read_proc_tables(tmp_path):
+    arp = tmp_path / "arp"
+    arp.write_text(PROC_ARP)
+    route = tmp_path / "route"
+    route.write_text(PROC_ROUTE)
+    assert arp_watch.read_proc_arp(str(arp)) == {
+        "192.168.1.1": "aa:bb:cc:00:00:01",
+        "192.168.1.20": "aa:bb:cc:00:00:20",
+    }
+    assert arp_watch.default_gateways(str(route)) == {"192.168.1.1"}
+    assert arp_watch.read_proc_arp(str(tmp_path / "missing")) == {}
+
+
+def test_parse_neigh_messages_skips_incomplete_and_ipv6():
+    data = (
+        _neigh_message("10.0.0.7", [0, 1, 2, 3, 4, 5])
+        + _neigh_message("10.0.0.8", [9] * 6, state=0x01)
+        + _neigh_message("fd00::7", [0, 1, 2, 3, 4, 5], family=socket.AF_INET6)
+    )
+    assert list(arp_watch.parse_neigh_messages(data)) == [("10.0.0.7", "00:01:02:03:04:05")]
+    assert [e[0] for e in arp_watch.parse_neigh_states(data)] == ["10.0.0.7", "10.0.0.8", "fd00::7"]
+
+
+def test_mac_change_and_gateway_impersonation():
+    w = ArpWatcher(gateways={"192.168.1.1"})
+    assert w.observe("192.168.1.1", "aa:00:00:00:00:01", 1.0) == []
+    assert w.observe("192.168.1.66", "ee:00:00:00:00:66", 2.0) == []
+    assert w.observe("192.168.1.1", "aa:00:00:00:00:01", 3.0) == []
+    alerts = w.observe("192.168.1.1", "EE:00:00:00:00:66", 4.0)
+    assert [a.kind for a in alerts] == ["gateway_impersonation"]
+    assert alerts[0].previous_mac == "aa:00:00:00:00:01"
+    assert "192.168.1.66" in alerts[0].details
+    alerts = w.observe("192.168.1.20", "aa:00:00:00:00:20", 5.0) + w.observe("192.168.1.20", "bb:00:00:00:00:20", 6.0)
+    assert [a.kind for a in alerts] == ["mac_change"]
+    assert w.history("192.168.1.1") == [
+        {"mac": "aa:00:00:00:00:01", "first_seen": 1.0, "last_seen": 3.0},
+        {"mac": "ee:00:00:00:00:66", "first_seen": 4.0, "last_seen": 4.0},
+    ]
+    assert w.alert_count == 2
+
+
+def test_mac_many_ips_reported_once():
+    w = ArpWatcher(gateways=set(), many_ips_threshold=3)
+    kinds = [a.kind for i in range(6) for a in w.observe(f"10.0.0.{i}", "de:ad:be:ef:00:01")]
+    assert kinds == ["mac_many_ips"]
+
+
+def test_expired_bindings_do_not_count_towards_many_ips():
+    w = ArpWatcher(gateways=set(), many_ips_threshold=3, binding_ttl=100)
+    # a host walking through addresses, each seen only for a while
+    kinds = [a.kind for i in range(10) for a in w.observe(f"10.0.0.{i}", "de:ad:be:ef:00:02", i * 60.0)]
+    assert kinds == []
+    # an old binding seen again counts once more
+    assert w.observe("10.0.0.1", "de:ad:be:ef:00:02", 600.0) == []
+    assert w.observe("10.0.0.2", "de:ad:be:ef:00:02", 601.0) == []
+    assert [a.kind for a in w.observe("10.0.0.3", "de:ad:be:ef:00:02", 602.0)] == ["mac_many_ips"]
+
+
+def test_state_is_bounded():
+    w = ArpWatcher(gateways=set(), history=2, max_ips=3, max_alerts=2)
+    for i in range(5):
+        w.observe("10.0.0.1", f"00:00:00:00:00:0{i}")
+    for i in range(2, 6):
+        w.observe(f"10.0.0.{i}", "00:00:00:00:01:00")
+    assert len(w.history("10.0.0.1")) == 0
+    assert set(w.table()) == {"10.0.0.3", "10.0.0.4", "10.0.0.5"}
+    assert len(w.alerts) == 2 and w.alert_count == 4
+
+
+def test_run_polls_without_netlink(tmp_path, monkeypatch):
+    arp = tmp_path / "arp"
+    arp.write_text(PROC_ARP)
+    monkeypatch.setattr(arp_watch, "_open_netlink", lambda: None)
+    w = ArpWatcher(gateways={"192.168.1.1"}, proc_path=str(arp))
+    stop = threading.Event()
+    thread = w.start(stop, poll_interval=0.01)
+    try:
+        for _ in range(200):
+            if w.table():
+                break
+            threading.Event().wait(0.01)
+        arp.write_text(PROC_ARP.replace("AA:BB:CC:00:00:01", "aa:bb:cc:00:00:20"))
+        for _ in range(200):
+            if w.alerts:
+                break
+            threading.Event().wait(0.01)
+    finally:
+        stop.set()
+        thread.join(timeout=2)
+    assert not thread.is_alive()
+    assert [a.kind for a in w.alerts] == ["gateway_impersonation"]
+
+
+def test_api_start_alerts_stop(tmp_path, monkeypatch):
+    arp = tmp_path / "arp"
+    arp.write_text(PROC_ARP)
+    monkeypatch.setattr(arp_watch, "_open_netlink", lambda: None)
+    monkeypatch.setattr(api, "ArpWatcher", lambda: ArpWatcher(gateways={"192.168.1.1"}, proc_path=str(arp)))
+    api._arp_thread = None
+    api._arp_watcher = None
+    client = TestClient(api.app)
+
+    assert client.get("/arp-watch/alerts").json() == {"running": False, "gateways": [], "alerts": [], "table": {}}
+    assert client.post("/arp-watch/start").json() == {"status": "started"}
+    assert client.post("/arp-watch/start").status_code == 400
+    api._arp_watcher.observe("192.168.1.1", "aa:bb:cc:00:00:99")
+    body = client.get("/arp-watch/alerts").json()
+    assert body["running"] is True
+    assert body["gateways"] == ["192.168.1.1"]
+    assert [a["kind"] for a in body["alerts"]] == ["gateway_impersonation"]
+    assert client.post("/arp-watch/stop").json() == {"status": "stopped"}
+    assert client.post("/arp-watch/stop").status_code == 400
@@ -0,0 +1,26 @@
+"""Smoke tests for the micro-benchmark fixtures and baseline comparison."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+import bench_micro  # noqa: E402
+
+
+def test_fixtures_parse():
+    os_name, ports = bench_micro._parse_scan_xml(bench_micro.scan_xml(10_000), True)
+    assert os_name == "Linux 5.4"
+    assert len(ports) == 200
+    assert len(bench_micro._parse_discovery_xml(bench_micro.discovery_xml(5))) == 5
+    assert len(bench_micro.parse_arp_table(bench_micro.arp_table(5))) == 5
+    assert bench_micro.parse_netbios_output(bench_micro.netbios_grepable(6)) == ["10.0.0.0", "10.0.0.3"]
+
+
+def test_measure_and_compare():
+    case = bench_micro.Case("csv", "10", lambda: bench_micro.devices(10), bench_micro.generate_csv_rows)
+    res = bench_micro.measure(case, 0.01)
+    assert res["ops_per_sec"] > 0 and res["peak_kb"] > 0
+    baseline = {"csv[10]": {"ops_per_sec": res["ops_per_sec"] * 10, "peak_kb": res["peak_kb"]}}
+    problems = bench_micro.compare({"csv[10]": res}, baseline, 0.3)
+    assert len(problems) == 1 and "ops/s" in problems[0]
+    assert bench_micro.compare({"csv[10]": res}, {"csv[10]": res}, 0.3) == []
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+import lan_port_scan
+from device_index import DeviceIndex, merge_devices, normalize_hostname, unique_hosts
+from scan_records import Host, PortResult
+
+
+def test_merges_by_mac_hostname_and_address():
+    index = DeviceIndex()
+    a = index.observe({"ip": "192.168.1.5", "mac": "AA:BB:CC:DD:EE:01"})
+    assert index.observe({"ip": "fe80::1", "mac": "aa-bb-cc-dd-ee-01"}) is a
+    # a hostname reported later for one address names the whole device
+    assert index.observe({"ip": "192.168.1.5", "mac": "aa:bb:cc:dd:ee:01", "hostname": "NAS.local"}) is a
+    assert index.observe({"ip": "fd00::5", "hostname": "nas"}) is a
+    assert index.observe({"ip": "192.168.1.5"}) is a
+    assert list(a.addresses) == ["192.168.1.5", "fe80::1", "fd00::5"]
+    assert len(index) == 1
+
+
+def test_address_reused_by_another_mac_is_a_new_device():
+    index = DeviceIndex()
+    first = index.observe({"ip": "10.0.0.9", "mac": "aa:aa:aa:aa:aa:01"})
+    second = index.observe({"ip": "10.0.0.9", "mac": "aa:aa:aa:aa:aa:02"})
+    assert second is not first
+    assert "10.0.0.9" not in first.addresses
+    assert index.lookup({"ip": "10.0.0.9"}) is second
+    # moving to a new lease keeps the device and its id
+    assert index.observe({"ip": "10.0.0.20", "mac": "aa:aa:aa:aa:aa:01"}) is first
+
+
+def test_same_hostname_with_different_macs_stays_apart():
+    index = DeviceIndex()
+    first = index.observe({"ip": "10.0.0.5", "mac": "b8:27:eb:00:00:05", "hostname": "raspberrypi"})
+    second = index.observe({"ip": "10.0.0.6", "mac": "b8:27:eb:00:00:06", "hostname": "raspberrypi.lan"})
+    assert second is not first
+    assert index.observe({"ip": "10.0.0.7", "mac": "aa:aa:aa:aa:aa:07", "hostname": "printer.lan"}) is not \
+        index.observe({"ip": "10.0.0.8", "mac": "aa:aa:aa:aa:aa:08", "hostname": "printer.office"})
+    # the shared name no longer identifies either device
+    assert index.lookup({"ip": "fd00::9", "hostname": "raspberrypi"}) is None
+    assert index.lookup({"ip": "10.0.0.6", "hostname": "raspberrypi"}) is second
+
+
+def test_unique_hosts_keeps_devices_with_the_same_default_hostname():
+    found = [
+        {"ip": "10.0.0.5", "mac": "b8:27:eb:00:00:05", "vendor": "Raspberry Pi", "hostname": "raspberrypi"},
+        {"ip": "10.0.0.6", "mac": "b8:27:eb:00:00:06", "vendor": "Raspberry Pi", "hostname": "raspberrypi"},
+    ]
+    assert [h["ip"] for h in unique_hosts(found)] == ["10.0.0.5", "10.0.0.6"]
+    with patch("lan_port_scan.iter_sweep", return_value=iter(found)), \
+            patch("lan_port_scan.run_scan", return_value={"os": "", "ports": []}) as scan:
+        lan_port_scan.scan_hosts("10.0.0.0/24", ["22"])
+    assert sorted(c.args[0] for c in scan.call_args_list) == ["10.0.0.5", "10.0.0.6"]
+
+
+def test_ids_are_stable_across_indexes():
+    records = [{"ip": "10.0.0.2", "mac": "aa:aa:aa:aa:aa:02"}, {"ip": "10.0.0.3"}]
+    first = [d.id for d in map(DeviceIndex().observe, records)]
+    second = [d.id for d in map(DeviceIndex().observe, records)]
+    assert first == second
+    assert len(set(first)) == 2
+
+
+def test_normalize_hostname():
+    assert normalize_hostname("PC1.home.lan.") == "pc1"
+    assert normalize_hostname("192.168.1.1") == ""
+    assert normalize_hostname("localhost") == ""
+
+
+def test_merge_devices_combines_rows():
+    rows = merge_devices([
+        {"ip": "fd00::2", "mac": "aa:aa:aa:aa:aa:02", "ports": [{"port": "22", "state": "filtered"}], "os": ""},
+        Host("10.0.0.2", "AA:AA:AA:AA:AA:02", "Acme", "", "Linux", [PortResult(22, "open"), PortResult(80, "open")]),
+        {"ip": "10.0.0.3", "mac": "", "ports": []},
+    ])
+    assert len(rows) == 2
+    dev = rows[0]
+    assert dev["ip"] == "10.0.0.2"
+    assert dev["addresses"] == ["10.0.0.2", "fd00::2"]
+    assert dev["vendor"] == "Acme"
+    assert dev["os"] == "Linux"
+    assert dev["ports"] == [{"port": "22", "state": "open", "service": ""}, {"port": "80", "state": "open", "service": ""}]
+    assert rows[1]["addresses"] == ["10.0.0.3"]
+
+
+def test_unique_hosts_prefers_ipv4():
+    hosts = unique_hosts([
+        {"ip": "fe80::2", "mac": "aa:aa:aa:aa:aa:02", "vendor": "", "hostname": ""},
+        {"ip": "10.0.0.2", "mac": "aa:aa:aa:aa:aa:02", "vendor": "Acme", "hostname": ""},
+        {"ip": "10.0.0.3", "mac": "", "vendor": "", "hostname": ""},
+    ])
+    assert hosts == [
+        {"ip": "10.0.0.2", "mac": "aa:aa:aa:aa:aa:02", "vendor": "Acme", "hostname": "", "addresses": ["10.0.0.2", "fe80::2"]},
+        {"ip": "10.0.0.3", "mac": "", "vendor": "", "hostname": ""},
+    ]
+
+
+def test_sweep_scans_each_device_once():
+    found = [
+        {"ip": "10.0.0.2", "mac": "aa:aa:aa:aa:aa:02", "vendor": "X", "hostname": ""},
+        {"ip": "fd00::2", "mac": "aa:aa:aa:aa:aa:02", "vendor": "X", "hostname": ""},
+    ]
+    with patch("lan_port_scan.iter_sweep", return_value=iter(found)), \
+            patch("lan_port_scan.run_scan", return_value={"os": "", "ports": []}) as scan:
+        res = lan_port_scan.scan_hosts("10.0.0.0/24", ["22"])
+    assert [c.args[0] for c in scan.call_args_list] == ["10.0.0.2"]
+    assert res[0]["addresses"] == ["10.0.0.2", "fd00::2"]
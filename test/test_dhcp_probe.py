@@ -0,0 +1,147 @@
+import socket
+import struct
+import threading
+import time
+from unittest.mock import patch
+
+import dhcp_probe
+import lan_security_check
+from dhcp_probe import DhcpOffer
+
+
+def _offer(xid, server_id, yiaddr="192.168.1.50", router="192.168.1.1"):
+    header = dhcp_probe._BOOTP.pack(
+        2, 1, 6, 0, xid, 0, 0x8000,
+        b"\0" * 4, socket.inet_aton(yiaddr), b"\0" * 4, b"\0" * 4,
+        b"\0" * 16, b"\0" * 64, b"\0" * 128,
+    )
+    options = (
+        bytes([53, 1, 2])
+        + bytes([54, 4]) + socket.inet_aton(server_id)
+        + bytes([1, 4]) + socket.inet_aton("255.255.255.0")
+        + bytes([3, 4]) + socket.inet_aton(router)
+        + bytes([51, 4]) + struct.pack("!I", 3600)
+        + bytes([255])
+    )
+    return header + dhcp_probe.MAGIC_COOKIE + options
+
+
+class StandInServer:
+    """Answers every DISCOVER with one OFFER per configured server ID."""
+
+    def __init__(self, server_ids, delays=None):
+        self.server_ids = server_ids
+        self.delays = delays or [0] * len(server_ids)
+        self.received = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        try:
+            data, addr = self.sock.recvfrom(4096)
+        except OSError:
+            return
+        self.received.append(data)
+        xid = struct.unpack_from("!I", data, 4)[0]
+        # a stray reply for another transaction must be ignored
+        self.sock.sendto(_offer(xid + 1, "10.9.9.9"), addr)
+        for server_id, delay in zip(self.server_ids, self.delays):
+            time.sleep(delay)
+            try:
+                self.sock.sendto(_offer(xid, server_id), addr)
+            except OSError:
+                # closed by the test after the client returned
+                return
+
+    def close(self):
+        self.sock.close()
+
+
+def _discover(server, **kwargs):
+    return dhcp_probe.discover_servers(bind=("127.0.0.1", 0), target=("127.0.0.1", server.port), **kwargs)
+
+
+def test_build_discover_is_valid_bootp():
+    packet = dhcp_probe.build_discover(0x1234, b"\x02\x00\x00\x00\x00\x01")
+    op, htype, hlen, _, xid, _, flags = struct.unpack_from("!BBBBIHH", packet)
+    assert (op, htype, hlen, xid, flags) == (1, 1, 6, 0x1234, 0x8000)
+    options = dhcp_probe.parse_options(packet[dhcp_probe._BOOTP.size + 4:])
+    assert options[53] == b"\x01"
+    assert set(options[55]) >= {1, 3, 54}
+
+
+def test_parse_offer_reports_subnet_and_router():
+    offer = dhcp_probe.parse_offer(_offer(7, "192.168.1.1"), 7, "192.168.1.1")
+    assert offer == DhcpOffer(
+        server_id="192.168.1.1",
+        offered_ip="192.168.1.50",
+        subnet="192.168.1.0/24",
+        routers=["192.168.1.1"],
+        lease_time=3600,
+        source="192.168.1.1",
+    )
+    assert dhcp_probe.parse_offer(_offer(7, "192.168.1.1"), 8) is None
+    assert dhcp_probe.parse_offer(b"\x02" * 50, 7) is None
+
+
+def test_discover_returns_early_once_expected_servers_answer():
+    server = StandInServer(["192.168.1.1", "192.168.1.254", "192.168.1.253"], delays=[0, 0, 2])
+    try:
+        start = time.monotonic()
+        offers = _discover(server, expected=2, window=5)
+        elapsed = time.monotonic() - start
+    finally:
+        server.close()
+    assert [o.server_id for o in offers] == ["192.168.1.1", "192.168.1.254"]
+    assert elapsed < 1.5
+    assert len(server.received) == 1
+
+
+def test_discover_stops_at_window():
+    server = StandInServer(["192.168.1.1"])
+    try:
+        start = time.monotonic()
+        offers = _discover(server, expected=2, window=0.3)
+        elapsed = time.monotonic() - start
+    finally:
+        server.close()
+    assert [o.server_id for o in offers] == ["192.168.1.1"]
+    assert 0.25 <= elapsed < 2
+
+
+def test_check_dhcp_multiple_reports_servers():
+    offers = [
+        DhcpOffer("192.168.1.1", "192.168.1.50", "192.168.1.0/24", ["192.168.1.1"]),
+        DhcpOffer("192.168.1.99", "192.168.1.60", "192.168.1.0/24", ["192.168.1.99"]),
+    ]
+    with patch("lan_security_check.dhcp_probe.discover_servers", return_value=offers) as probe, \
+            patch("lan_security_check.subprocess.run") as run:
+        res = lan_security_check.check_dhcp_multiple()
+    probe.assert_called_once()
+    assert probe.call_args.kwargs["expected"] == 2
+    run.assert_not_called()
+    assert res["status"] == "warning"
+    assert res["servers"][1] == {"server_id": "192.168.1.99", "subnet": "192.168.1.0/24", "routers": ["192.168.1.99"]}
+
+
+def test_check_dhcp_multiple_falls_back_to_nmap():
+    with patch("lan_security_check.dhcp_probe.discover_servers", side_effect=PermissionError("denied")), \
+            patch("lan_security_check.subprocess.run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = "Server Identifier: 10.0.0.1\nServer Identifier: 10.0.0.2\n"
+        res = lan_security_check.check_dhcp_multiple()
+    assert run.call_args.args[0] == ["nmap", "--script", "broadcast-dhcp-discover"]
+    assert res["status"] == "warning"
+
+
+def test_check_dhcp_multiple_native_probes_disabled(monkeypatch):
+    monkeypatch.setenv("NWCD_NATIVE_PROBES", "0")
+    with patch("lan_security_check.dhcp_probe.discover_servers") as probe, \
+            patch("lan_security_check.subprocess.run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = "Server Identifier: 10.0.0.1\n"
+        res = lan_security_check.check_dhcp_multiple()
+    probe.assert_not_called()
+    assert res == {"status": "ok"}
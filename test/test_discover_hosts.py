@@ -2,10 +2,13 @@ import unittest
 from unittest.mock import patch, MagicMock
 import time
 import socket
+from types import SimpleNamespace
+import nbstat
 import network_utils
 import discover_hosts
 
 class DiscoverHostsSubnetTest(unittest.TestCase):
+    @patch('network_utils.psutil', None)
     @patch('network_utils.os.name', 'posix')
     @patch('network_utils.sys.platform', 'darwin')
     @patch('network_utils.subprocess.run')
@@ -21,6 +24,87 @@ en0: flags=8863<UP,BROADCAST,SMART,RUNNING,SIMPLEX,MULTICAST> mtu 1500
         self.assertEqual(subnet, '192.168.2.0/24')
 
 
+def _snic(family, address, netmask=None):
+    return SimpleNamespace(family=family, address=address, netmask=netmask)
+
+
+class FakePsutil:
+    AF_LINK = -1
+
+    def __init__(self):
+        self.addr_calls = 0
+        self.addrs = {
+            'lo': [_snic(socket.AF_INET, '127.0.0.1', '255.0.0.0')],
+            'eth0': [
+                _snic(socket.AF_PACKET, '02:00:00:00:00:01'),
+                _snic(socket.AF_INET, '192.168.1.5', '255.255.255.0'),
+                _snic(socket.AF_INET6, 'fe80::1%eth0', 'ffff:ffff:ffff:ffff::'),
+                _snic(socket.AF_INET6, 'fd00::5', 'ffff:ffff:ffff:ffff::'),
+            ],
+            'vlan20': [_snic(socket.AF_INET, '10.20.0.5', '255.255.0.0')],
+            'down0': [_snic(socket.AF_INET, '172.16.0.5', '255.255.255.0')],
+        }
+        self.stats = {
+            'lo': SimpleNamespace(isup=True),
+            'eth0': SimpleNamespace(isup=True),
+            'vlan20': SimpleNamespace(isup=True),
+            'down0': SimpleNamespace(isup=False),
+        }
+
+    def net_if_addrs(self):
+        self.addr_calls += 1
+        return self.addrs
+
+    def net_if_stats(self):
+        return self.stats
+
+
+class InterfaceInventoryTest(unittest.TestCase):
+    def setUp(self):
+        network_utils.invalidate_interfaces()
+        self.fake = FakePsutil()
+        patcher = patch('network_utils.psutil', self.fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(network_utils.invalidate_interfaces)
+
+    def test_lists_up_interfaces_with_networks(self):
+        ifaces = {i['name']: i for i in network_utils.get_interfaces()}
+        self.assertEqual(set(ifaces), {'eth0', 'vlan20'})
+        self.assertEqual(ifaces['eth0']['mac'], '02:00:00:00:00:01')
+        self.assertEqual(ifaces['eth0']['ipv4'], ['192.168.1.0/24'])
+        self.assertEqual(ifaces['eth0']['ipv6'], ['fd00::/64'])
+        self.assertIn('fe80::1', ifaces['eth0']['addresses'])
+        self.assertEqual(network_utils.get_local_subnets(), ['192.168.1.0/24', '10.20.0.0/16'])
+        self.assertEqual(network_utils._get_subnet(), '192.168.1.0/24')
+
+    def test_subnet_prefers_default_route_interface(self):
+        # psutil order is kept; a bridge listed first does not win
+        self.fake.addrs = {'docker0': [_snic(socket.AF_INET, '172.17.0.1', '255.255.0.0')], **self.fake.addrs}
+        self.fake.stats['docker0'] = SimpleNamespace(isup=True)
+        with patch('network_utils._default_route_address', return_value='10.20.0.5'):
+            self.assertEqual(network_utils._get_subnet(), '10.20.0.0/16')
+        with patch('network_utils._default_route_address', return_value=''):
+            self.assertEqual(network_utils._get_subnet(), '172.17.0.0/16')
+        self.assertEqual(network_utils.get_local_subnets()[:2], ['172.17.0.0/16', '192.168.1.0/24'])
+
+    @patch('network_utils.subprocess.run')
+    def test_cached_without_subprocess(self, mock_run):
+        network_utils.get_interfaces()
+        network_utils.get_interfaces()
+        network_utils._get_subnet()
+        self.assertEqual(self.fake.addr_calls, 1)
+        mock_run.assert_not_called()
+
+    def test_change_detected_after_ttl(self):
+        network_utils.get_interfaces()
+        self.fake.addrs['vlan30'] = [_snic(socket.AF_INET, '10.30.0.5', '255.255.255.0')]
+        self.fake.stats['vlan30'] = SimpleNamespace(isup=True)
+        self.assertNotIn('10.30.0.0/24', network_utils.get_local_subnets())
+        with patch('network_utils.INTERFACE_CACHE_TTL', 0):
+            self.assertIn('10.30.0.0/24', network_utils.get_local_subnets())
+
+
 class LookupVendorTimeoutTest(unittest.TestCase):
     def test_lookup_vendor_timeout(self):
         def side_effect(*args, **kwargs):
@@ -38,9 +122,10 @@ class LookupVendorTimeoutTest(unittest.TestCase):
 
 class RunNmapScanHostnameTest(unittest.TestCase):
     @patch('network_utils._lookup_vendor', return_value='')
+    @patch('network_utils.nbstat.query_hosts')
     @patch('network_utils.shutil.which')
     @patch('subprocess.run')
-    def test_hostname_resolution(self, mock_run, mock_which, _mock_lookup):
+    def test_hostname_resolution(self, mock_run, mock_which, mock_nbstat, _mock_lookup):
         xml = (
             "<nmaprun>"
             "<host><address addr='192.168.1.2' addrtype='ipv4'/>"
@@ -53,19 +138,21 @@ class RunNmapScanHostnameTest(unittest.TestCase):
         def run_side_effect(cmd, capture_output=True, text=True, timeout=None):
             if cmd[0] == 'nmap':
                 return MagicMock(returncode=0, stdout=xml)
-            if cmd[0] == 'nbtscan':
-                if cmd[-1] == '192.168.1.3':
-                    return MagicMock(returncode=0, stdout='192.168.1.3\thost-nbt\n')
-                return MagicMock(returncode=1, stdout='')
             if cmd[0] == 'avahi-resolve':
                 return MagicMock(returncode=0, stdout='192.168.1.4 host-mdns.local\n')
             return MagicMock(returncode=1, stdout='')
 
         mock_run.side_effect = run_side_effect
         mock_which.return_value = '/usr/bin/mock'
+        mock_nbstat.return_value = {
+            '192.168.1.3': nbstat.NbstatResult('192.168.1.3', name='host-nbt', mac='00:11:22:33:44:55'),
+        }
 
         res = network_utils._run_nmap_scan('192.168.1.0/24')
 
+        # one batch NBSTAT query for all hosts without a DNS name
+        mock_nbstat.assert_called_once_with(['192.168.1.3', '192.168.1.4'])
+
         mock_run.assert_any_call(
             ['nmap', '-R', '-sn', '192.168.1.0/24', '-oX', '-'],
             capture_output=True,
@@ -74,14 +161,16 @@ class RunNmapScanHostnameTest(unittest.TestCase):
         )
         self.assertEqual(res[0]['hostname'], 'host-nmap')
         self.assertEqual(res[1]['hostname'], 'host-nbt')
+        self.assertEqual(res[1]['mac'], '00:11:22:33:44:55')
         self.assertEqual(res[2]['hostname'], 'host-mdns.local')
 
 
 class RunNmapScanVendorTest(unittest.TestCase):
     @patch('network_utils._lookup_vendor', return_value='Vendor Inc')
+    @patch('network_utils.nbstat.query_hosts', return_value={})
     @patch('network_utils.shutil.which', return_value=None)
     @patch('subprocess.run')
-    def test_vendor_lookup(self, mock_run, _mock_which, mock_lookup):
+    def test_vendor_lookup(self, mock_run, _mock_which, _mock_nbstat, mock_lookup):
         xml = (
             "<nmaprun>"
             "<host><address addr='192.168.1.2' addrtype='ipv4'/>"
@@ -95,6 +184,35 @@ class RunNmapScanVendorTest(unittest.TestCase):
         mock_lookup.assert_called_once_with('AA:BB:CC:DD:EE:FF')
         self.assertEqual(res[0]['vendor'], 'Vendor Inc')
 
+    @patch.dict('os.environ', {'NWCD_NATIVE_PROBES': '0'})
+    @patch('network_utils.nbstat.query_hosts')
+    @patch('network_utils.shutil.which', return_value=None)
+    @patch('subprocess.run')
+    def test_native_probes_disabled_skips_nbstat(self, mock_run, _mock_which, mock_nbstat):
+        xml = "<nmaprun><host><address addr='192.168.1.2' addrtype='ipv4'/></host></nmaprun>"
+        mock_run.return_value = MagicMock(returncode=0, stdout=xml)
+        res = network_utils._run_nmap_scan('192.168.1.0/24')
+        mock_nbstat.assert_not_called()
+        self.assertEqual(res, [{'ip': '192.168.1.2', 'mac': '', 'vendor': '', 'hostname': ''}])
+
+    @patch('network_utils.nbstat.query_hosts', side_effect=PermissionError)
+    @patch('network_utils.shutil.which', side_effect=lambda cmd: '/usr/bin/nbtscan' if cmd == 'nbtscan' else None)
+    @patch('subprocess.run')
+    def test_nbtscan_fallback_without_native_nbstat(self, mock_run, _mock_which, _mock_nbstat):
+        xml = "<nmaprun><host><address addr='192.168.1.2' addrtype='ipv4'/></host></nmaprun>"
+
+        def fake_run(cmd, *args, **kwargs):
+            if cmd[0] == 'nbtscan':
+                return MagicMock(returncode=0, stdout='192.168.1.2 HOST-NBT\n')
+            return MagicMock(returncode=0, stdout=xml)
+
+        mock_run.side_effect = fake_run
+        res = network_utils._run_nmap_scan('192.168.1.0/24')
+        self.assertEqual(res[0]['hostname'], 'HOST-NBT')
+        with patch.dict('os.environ', {'NWCD_NATIVE_PROBES': '0'}):
+            res = network_utils._run_nmap_scan('192.168.1.0/24')
+        self.assertEqual(res[0]['hostname'], 'HOST-NBT')
+
 
 class DiscoverHostsResultTest(unittest.TestCase):
     @patch('network_utils.Path.exists', return_value=False)
@@ -114,5 +232,59 @@ class DiscoverHostsResultTest(unittest.TestCase):
         self.assertEqual(hosts[0]['hostname'], 'host-nmap')
         self.assertEqual(hosts[0]['vendor'], 'Vendor Inc')
 
+class PlanRangesTest(unittest.TestCase):
+    def test_small_subnet_single_block(self):
+        self.assertEqual(network_utils.plan_ranges('192.168.1.0/24'), ['192.168.1.0/24'])
+        self.assertEqual(network_utils.plan_ranges('host.local'), ['host.local'])
+
+    def test_large_ipv4_split(self):
+        blocks = network_utils.plan_ranges('10.0.0.0/16')
+        self.assertEqual(len(blocks), 256)
+        self.assertEqual(blocks[0], '10.0.0.0/24')
+        self.assertEqual(blocks[-1], '10.0.255.0/24')
+
+    def test_ipv6_prefix_split(self):
+        blocks = network_utils.plan_ranges('fd00::/118', block_size=256)
+        self.assertEqual(blocks, ['fd00::/120', 'fd00::100/120', 'fd00::200/120', 'fd00::300/120'])
+
+    def test_unenumerable_prefix_left_unsplit(self):
+        self.assertEqual(network_utils.plan_ranges('fe80::/64'), ['fe80::/64'])
+
+    def test_block_timeout_scales(self):
+        self.assertEqual(network_utils.block_timeout('10.0.0.0/24'), network_utils.SCAN_TIMEOUT)
+        self.assertEqual(network_utils.block_timeout('10.0.0.0/30'), network_utils.MIN_BLOCK_TIMEOUT)
+        self.assertEqual(network_utils.block_timeout('10.0.0.0/23'), network_utils.SCAN_TIMEOUT * 2)
+
+
+class IterSweepTest(unittest.TestCase):
+    def test_blocks_swept_with_scaled_timeout(self):
+        calls = []
+
+        def fake_scan(block, timeout):
+            calls.append((block, timeout))
+            return [{'ip': block.split('/')[0], 'mac': '', 'vendor': '', 'hostname': ''}]
+
+        hosts = list(network_utils.iter_sweep('10.0.0.0/22', scan_fn=fake_scan, max_workers=2))
+        self.assertEqual(len(hosts), 4)
+        self.assertEqual(sorted(calls), [(f'10.0.{i}.0/24', network_utils.SCAN_TIMEOUT) for i in range(4)])
+
+    def test_failed_block_keeps_partial_results(self):
+        def fake_scan(block, timeout):
+            if block == '10.0.1.0/24':
+                raise RuntimeError('nmap host discovery timed out')
+            return [{'ip': block.split('/')[0]}]
+
+        with patch('sys.stderr'):
+            hosts = list(network_utils.iter_sweep('10.0.0.0/23', scan_fn=fake_scan))
+        self.assertEqual([h['ip'] for h in hosts], ['10.0.0.0'])
+
+    def test_all_blocks_failed_raises(self):
+        def fake_scan(block, timeout):
+            raise RuntimeError('boom')
+
+        with patch('sys.stderr'), self.assertRaises(RuntimeError):
+            list(network_utils.iter_sweep('10.0.0.0/23', scan_fn=fake_scan))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,14 +10,16 @@ def setup_function():
     api._scan_thread = None
     api._stop_event = Event()
     api._scan_results = []
+    api._scan_devices = []
 
 
 def test_start_and_results(monkeypatch):
-    def fake_scan(subnet, ports):
-        api._stop_event.set()
+    def fake_scan(subnet, ports, **kwargs):
         return [{"ip": "192.168.0.2", "ports": [80]}]
 
     monkeypatch.setattr(api, "scan_hosts", fake_scan)
+    # stop after the first complete sweep
+    monkeypatch.setattr(api._stop_event, "wait", lambda timeout=None: api._stop_event.set())
     monkeypatch.setattr(api, "_get_subnet", lambda: "192.168.0.0/24")
     client = TestClient(api.app)
 
@@ -34,8 +36,37 @@ def test_start_and_results(monkeypatch):
     }
 
 
+def test_devices_merge_addresses(monkeypatch):
+    sweeps = [
+        [{"ip": "192.168.0.2", "mac": "AA:BB:CC:00:00:02", "ports": [80]},
+         {"ip": "fd00::2", "mac": "aa:bb:cc:00:00:02", "ports": [443]}],
+        # new lease, same device
+        [{"ip": "192.168.0.7", "mac": "aa:bb:cc:00:00:02", "ports": [80]}],
+    ]
+
+    def fake_scan(subnet, ports, **kwargs):
+        return sweeps.pop(0)
+
+    monkeypatch.setattr(api, "scan_hosts", fake_scan)
+    monkeypatch.setattr(api, "_get_subnet", lambda: "192.168.0.0/24")
+    monkeypatch.setattr(api, "_device_index", api.DeviceIndex())
+    monkeypatch.setattr(api._stop_event, "wait", lambda timeout=None: sweeps or api._stop_event.set())
+    client = TestClient(api.app)
+
+    client.post("/dynamic-scan/start", json={})
+    api._scan_thread.join(timeout=1)
+    res = client.get("/dynamic-scan/devices").json()
+    assert len(res["devices"]) == 1
+    device = res["devices"][0]
+    assert device["ip"] == "192.168.0.7"
+    assert device["addresses"] == ["192.168.0.7"]
+    # the id assigned in the first sweep is kept
+    assert device["device_id"] == api._device_index.lookup({"mac": "aa:bb:cc:00:00:02"}).id
+    assert len(api._device_index) == 1
+
+
 def test_start_twice_errors(monkeypatch):
-    def long_scan(subnet, ports):
+    def long_scan(subnet, ports, **kwargs):
         time.sleep(0.2)
         return []
 
@@ -57,15 +88,74 @@ def test_stop_without_running():
 
 
 def test_stop(monkeypatch):
-    def long_scan(subnet, ports):
-        time.sleep(0.2)
-        return []
+    calls = []
+
+    def long_scan(subnet, ports, cancel=None, **kwargs):
+        calls.append(cancel)
+        # a sweep that only ends early because it is cancelled
+        cancel.wait(30)
+        return [{"ip": "192.168.0.9", "ports": []}]
 
     monkeypatch.setattr(api, "scan_hosts", long_scan)
     monkeypatch.setattr(api, "_get_subnet", lambda: "192.168.0.0/24")
+    previous = [{"ip": "192.168.0.2", "ports": [80]}]
+    api._scan_results = list(previous)
     client = TestClient(api.app)
 
     client.post("/dynamic-scan/start", json={})
+    while not calls:
+        time.sleep(0.01)
+    assert client.get("/dynamic-scan/status").json()["state"] == "running"
+    start = time.monotonic()
     res = client.post("/dynamic-scan/stop")
     assert res.status_code == 200
-    assert res.json()["status"] == "stopped"
+    assert res.json()["status"] == "stopping"
+    assert time.monotonic() - start < 1
+    assert calls[0] is api._stop_event
+
+    for _ in range(100):
+        status = client.get("/dynamic-scan/status").json()
+        if status["state"] == "idle":
+            break
+        time.sleep(0.02)
+    assert status["state"] == "idle"
+    assert status["nmap_processes"] == 0
+    # the partial result of the cancelled sweep does not replace the last one
+    assert client.get("/dynamic-scan/results").json()["results"] == previous
+
+
+def test_journal_resumes_only_the_first_sweep(monkeypatch, tmp_path):
+    import lan_port_scan
+
+    path = str(tmp_path / "scan.journal")
+    monkeypatch.setenv("NWCD_SCAN_JOURNAL", path)
+    # a sweep cut short by a restart had finished 192.168.0.2
+    with api.ScanJournal.open(path, api.sweep_params("192.168.0.0/24", ["22"])) as journal:
+        journal.record_host("192.168.0.2", {"ip": "192.168.0.2", "ports": []})
+    sweeps = [[], [], []]
+
+    def fake_run(ip, ports, **kwargs):
+        sweeps[0].append(ip)
+        if ip == "192.168.0.3" and len(sweeps) == 3:
+            raise ValueError("bad target")
+        return {"os": "", "ports": []}
+
+    hosts = [{"ip": "192.168.0.2", "mac": "", "vendor": ""}, {"ip": "192.168.0.3", "mac": "", "vendor": ""}]
+    monkeypatch.setattr(lan_port_scan, "gather_hosts", lambda subnet: hosts)
+    monkeypatch.setattr(lan_port_scan, "run_scan", fake_run)
+    monkeypatch.setattr(api, "_get_subnet", lambda: "192.168.0.0/24")
+    done = []
+    monkeypatch.setattr(
+        api._stop_event, "wait",
+        lambda timeout=None: done.append(sweeps.pop(0)) if len(sweeps) > 1 else api._stop_event.set(),
+    )
+
+    TestClient(api.app).post("/dynamic-scan/start", json={"ports": ["22"]})
+    api._scan_thread.join(timeout=5)
+    done.append(sweeps.pop(0))
+    # a failed host keeps the journal open, later sweeps still scan every host
+    assert [sorted(ips) for ips in done] == [
+        ["192.168.0.3"],
+        ["192.168.0.2", "192.168.0.3"],
+        ["192.168.0.2", "192.168.0.3"],
+    ]
@@ -85,6 +85,19 @@ class GenerateTopologyTest(unittest.TestCase):
         self.assertIn('Router -- "192.168.1.6"', src)
         self.assertIn('label="192.168.1.6"', src)
 
+    def test_build_graph_one_node_per_device(self):
+        data = {
+            "hosts": [
+                {"ip": "fd00::6", "mac": "aa:aa:aa:aa:aa:06"},
+                {"ip": "192.168.1.6", "mac": "aa:aa:aa:aa:aa:06", "hostname": "nas"},
+            ]
+        }
+        paths = {"paths": [{"ip": "fd00::6", "path": ["LAN", "Router", "Host"]}]}
+        src = generate_topology.build_graph(data, paths).source
+        self.assertIn('Router -- "192.168.1.6"', src)
+        self.assertIn('label="192.168.1.6\nfd00::6\nnas"', src)
+        self.assertNotIn('"fd00::6" [', src)
+
     def test_main_with_paths_json(self):
         data = {"hosts": [{"ip": "192.168.1.7"}]}
         paths = {
@@ -126,6 +139,92 @@ class GenerateTopologyTest(unittest.TestCase):
         generate_topology.save_graph(g, "out.png")
         mock_render.assert_called_once()
 
+    def test_shared_prefixes_produce_unique_edges(self):
+        data = {
+            "hosts": [
+                {"ip": f"10.0.0.{i}", "paths": [["LAN", "Router", "Core", "Host"]]}
+                for i in range(2, 12)
+            ]
+        }
+        src = generate_topology.build_graph(data).source
+        self.assertEqual(src.count("LAN -- Router"), 1)
+        self.assertEqual(src.count("Router -- Core"), 1)
+        self.assertEqual(src.count('Core -- "10.0.0.'), 10)
+
+    def test_repeated_hop_names_get_distinct_nodes(self):
+        data = {"hosts": [{"ip": "10.0.0.2", "paths": [["LAN", "Router", "Router", "Host"]]}]}
+        src = generate_topology.build_graph(data).source
+        self.assertIn('LAN -- Router', src)
+        self.assertIn('Router -- "Router (2)"', src)
+        self.assertIn('"Router (2)" -- "10.0.0.2"', src)
+        self.assertNotIn("Router -- Router", src)
+
+    def test_large_subnets_are_clustered(self):
+        data = {"hosts": [{"ip": f"10.0.1.{i}"} for i in range(1, 101)] + [{"ip": "10.0.2.1"}]}
+        g = generate_topology.build_graph(data, cluster_threshold=50)
+        src = g.source
+        self.assertIn('"10.0.1.0/24 via LAN"', src)
+        self.assertIn("100 hosts", src)
+        self.assertNotIn('"10.0.1.5"', src)
+        self.assertIn('LAN -- "10.0.2.1"', src)
+        unclustered = generate_topology.build_graph(data, cluster_threshold=None)
+        self.assertIn('LAN -- "10.0.1.5"', unclustered.source)
+
+    def test_engine_chosen_by_size(self):
+        self.assertEqual(generate_topology.build_graph({"hosts": []}).engine, "dot")
+        self.assertEqual(generate_topology.choose_engine(500), "neato")
+        self.assertEqual(generate_topology.choose_engine(5000), "sfdp")
+        data = {"hosts": [{"ip": f"10.{i // 250}.{i % 250}.1"} for i in range(2000)]}
+        g = generate_topology.build_graph(data)
+        self.assertEqual(g.engine, "sfdp")
+        self.assertIn("overlap=false", g.source)
+
+    def test_render_topology_uses_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            input_file = tmp / "scan.json"
+            input_file.write_text(json.dumps({"hosts": [{"ip": "10.0.0.2"}]}))
+            cache = tmp / "cache"
+            out = tmp / "a.dot"
+            self.assertFalse(generate_topology.render_topology(str(input_file), str(out), cache_dir=str(cache)))
+            with patch.object(generate_topology, "build_graph") as build:
+                self.assertTrue(
+                    generate_topology.render_topology(str(input_file), str(tmp / "b.dot"), cache_dir=str(cache))
+                )
+                build.assert_not_called()
+            self.assertEqual((tmp / "b.dot").read_text(), out.read_text())
+            input_file.write_text(json.dumps({"hosts": [{"ip": "10.0.0.3"}]}))
+            self.assertFalse(generate_topology.render_topology(str(input_file), str(out), cache_dir=str(cache)))
+            self.assertIn("10.0.0.3", out.read_text())
+
+    def test_layout_from_json0(self):
+        raw = {
+            "bb": "0,0,150,100",
+            "objects": [
+                {"_gvid": 0, "name": "LAN", "label": "\\N", "pos": "27,82", "width": "0.75", "height": "0.5", "shape": "ellipse"},
+                {"_gvid": 1, "name": "10.0.0.2", "label": "10.0.0.2\\nnas", "pos": "60,18", "width": "1", "height": "0.5"},
+                {"_gvid": 2, "name": "cluster_x", "nodes": [0, 1]},
+            ],
+            "edges": [{"_gvid": 0, "tail": 0, "head": 1}],
+        }
+        layout = generate_topology.layout_from_json0(raw, "dot")
+        self.assertEqual(layout["bbox"], [0, 0, 150, 100])
+        self.assertEqual(layout["edges"], [{"source": "LAN", "target": "10.0.0.2"}])
+        lan, host = layout["nodes"]
+        self.assertEqual((lan["label"], lan["x"], lan["y"], lan["width"]), ("LAN", 27, 82, 54))
+        self.assertEqual(host["label"], "10.0.0.2\nnas")
+
+    def test_save_graph_json_exports_layout(self):
+        raw = json.dumps({"bb": "0,0,10,10", "objects": [{"_gvid": 0, "name": "LAN", "pos": "5,5"}], "edges": []})
+        g = generate_topology.build_graph({"hosts": []})
+        with tempfile.TemporaryDirectory() as tmpdir, patch.object(generate_topology.Graph, "pipe", return_value=raw) as pipe:
+            path = Path(tmpdir) / "out.json"
+            generate_topology.save_graph(g, str(path))
+            pipe.assert_called_once_with(format="json0", encoding="utf-8")
+            data = json.loads(path.read_text())
+        self.assertEqual(data["engine"], "dot")
+        self.assertEqual(data["nodes"][0]["id"], "LAN")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -116,5 +116,145 @@ class LanPortScanDisableFastTest(unittest.TestCase):
             self.assertEqual(mock_run.call_count, 2)
             self.assertEqual(FakeExecutor.instance.max_workers, 1)
 
+
+class IterScanHostsTest(unittest.TestCase):
+    @patch('lan_port_scan.gather_hosts')
+    def test_backpressure_limits_submissions(self, mock_gather):
+        mock_gather.return_value = [{'ip': f'10.0.0.{i}', 'mac': '', 'vendor': ''} for i in range(10)]
+        started = []
+
+        def fake_scan(ip, *args, **kwargs):
+            started.append(ip)
+            return {'os': '', 'ports': []}
+
+        with patch('lan_port_scan.run_scan', side_effect=fake_scan):
+            gen = lan_port_scan.iter_scan_hosts('10.0.0.0/24', ['80'], max_workers=2)
+            first = next(gen)
+            self.assertIn(first['ip'], started)
+            # 2 * max_workers in flight plus one refill after the first result
+            self.assertLessEqual(len(started), 5)
+            rest = list(gen)
+        self.assertEqual(len(rest) + 1, 10)
+
+    @patch('lan_port_scan.gather_hosts')
+    def test_cancel_stops_and_drops_queued_hosts(self, mock_gather):
+        import threading
+        import time
+        mock_gather.return_value = [{'ip': f'10.0.0.{i}', 'mac': '', 'vendor': ''} for i in range(6)]
+        cancel = threading.Event()
+        started = []
+
+        def slow_scan(ip, *args, **kwargs):
+            started.append(ip)
+            time.sleep(0.2)
+            return {'os': '', 'ports': []}
+
+        with patch('lan_port_scan.run_scan', side_effect=slow_scan):
+            gen = lan_port_scan.iter_scan_hosts('10.0.0.0/24', ['80'], max_workers=1, cancel=cancel)
+            next(gen)
+            cancel.set()
+            self.assertEqual(list(gen), [])
+        self.assertLess(len(started), 6)
+
+    @patch('lan_port_scan.gather_hosts')
+    def test_cancelled_scan_is_not_retried(self, mock_gather):
+        import threading
+        from port_scan import ScanCancelled
+        mock_gather.return_value = [{'ip': '10.0.0.1', 'mac': '', 'vendor': ''}]
+        cancel = threading.Event()
+
+        def cancelled(ip, *args, **kwargs):
+            self.assertIs(kwargs['cancel'], cancel)
+            cancel.set()
+            raise ScanCancelled('nmap scan cancelled')
+
+        with patch('lan_port_scan.run_scan', side_effect=cancelled) as mock_run:
+            res = lan_port_scan.scan_hosts('10.0.0.0/24', ['80'], cancel=cancel)
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual(res, [])
+
+
+class ScanPipelineTest(unittest.TestCase):
+    HOSTS = [
+        {'ip': '10.0.0.2', 'mac': 'aa:aa:aa:aa:aa:02', 'vendor': ''},
+        {'ip': '10.0.0.3', 'mac': 'aa:aa:aa:aa:aa:03', 'vendor': ''},
+        {'ip': '10.0.0.4', 'mac': 'aa:aa:aa:aa:aa:04', 'vendor': ''},
+        {'ip': '10.0.0.5', 'mac': 'aa:aa:aa:aa:aa:05', 'vendor': ''},
+    ]
+
+    def fake_scan(self, ip, ports, service=False, os_detect=False, scripts=None, **kwargs):
+        self.calls.append((ip, service, os_detect, scripts))
+        open_ports = {'10.0.0.2': ['445'], '10.0.0.3': ['80']}.get(ip, [])
+        return {
+            'os': 'Linux' if os_detect else '',
+            'ports': [{'port': p, 'state': 'open', 'service': 'deep' if service else ''} for p in open_ports],
+        }
+
+    @patch('lan_port_scan.gather_hosts')
+    def test_only_matching_hosts_are_escalated(self, mock_gather):
+        mock_gather.return_value = [dict(h) for h in self.HOSTS]
+        self.calls = []
+        previous = [
+            {'ip': '10.0.0.2', 'mac': 'aa:aa:aa:aa:aa:02'},
+            {'ip': '10.0.0.3', 'mac': 'aa:aa:aa:aa:aa:03'},
+            {'ip': '10.0.0.4', 'mac': 'bb:bb:bb:bb:bb:bb'},
+        ]
+        rules = lan_port_scan.EscalationRules.from_results(previous)
+        with patch('lan_port_scan.run_scan', side_effect=self.fake_scan):
+            res = lan_port_scan.scan_pipeline('10.0.0.0/24', ['80', '445'], rules)
+
+        sweep = [c for c in self.calls if not c[1]]
+        deep = [c for c in self.calls if c[1]]
+        self.assertEqual(len(sweep), 4)
+        self.assertTrue(all(c[2] is False and c[3] == [] for c in sweep))
+        self.assertEqual(sorted(c[0] for c in deep), ['10.0.0.2', '10.0.0.4', '10.0.0.5'])
+        self.assertTrue(all(c[2] is True and c[3] is None for c in deep))
+
+        by_ip = {d['ip']: d for d in res['devices']}
+        self.assertEqual(sorted(by_ip), [h['ip'] for h in self.HOSTS])
+        self.assertEqual(by_ip['10.0.0.2']['escalated'], ['danger_port:445'])
+        self.assertEqual(by_ip['10.0.0.2']['os'], 'Linux')
+        self.assertEqual(by_ip['10.0.0.2']['ports'][0]['service'], 'deep')
+        self.assertEqual(by_ip['10.0.0.4']['escalated'], ['mac_changed'])
+        self.assertEqual(by_ip['10.0.0.5']['escalated'], ['new_host'])
+        self.assertNotIn('escalated', by_ip['10.0.0.3'])
+        self.assertEqual(by_ip['10.0.0.3']['os'], '')
+        self.assertEqual(set(res['scan_phases']), {'discovery', 'sweep', 'deep_scan'})
+
+    @patch('lan_port_scan.gather_hosts')
+    def test_without_baseline_only_ports_escalate(self, mock_gather):
+        mock_gather.return_value = [dict(h) for h in self.HOSTS]
+        self.calls = []
+        rules = lan_port_scan.EscalationRules(danger_ports={'80'})
+        with patch('lan_port_scan.run_scan', side_effect=self.fake_scan):
+            res = lan_port_scan.scan_pipeline('10.0.0.0/24', ['80', '445'], rules)
+        self.assertEqual([c[0] for c in self.calls if c[1]], ['10.0.0.3'])
+        self.assertEqual([d['ip'] for d in res['devices'] if 'escalated' in d], ['10.0.0.3'])
+
+
+    @patch('lan_port_scan.gather_hosts')
+    def test_failed_deep_scan_keeps_sweep_result(self, mock_gather):
+        mock_gather.return_value = [dict(h) for h in self.HOSTS[:1]]
+        self.calls = []
+        deep_calls = []
+
+        def scan(ip, ports, **kwargs):
+            if kwargs.get('os_detect'):
+                deep_calls.append(ip)
+                raise RuntimeError('TCP/IP fingerprinting (for OS scan) requires root privileges.\nQUITTING!')
+            return self.fake_scan(ip, ports, **kwargs)
+
+        rules = lan_port_scan.EscalationRules()
+        with patch('lan_port_scan.run_scan', side_effect=scan):
+            res = lan_port_scan.scan_pipeline('10.0.0.0/24', ['445'], rules)
+        # needing root is permanent: no retry
+        self.assertEqual(deep_calls, ['10.0.0.2'])
+        device = res['devices'][0]
+        self.assertEqual(device['ports'], [{'port': '445', 'state': 'open', 'service': ''}])
+        self.assertNotIn('error', device)
+        self.assertIn('requires root privileges', device['deep_scan_error'])
+        self.assertEqual(device['escalated'], ['danger_port:445'])
+
+
 if __name__ == '__main__':
     unittest.main()
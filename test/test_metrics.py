@@ -0,0 +1,69 @@
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+import metrics
+import port_scan
+
+
+def test_counter_and_histogram_render():
+    reg = metrics.Registry()
+    c = reg.register(metrics.Counter("jobs_total", "Jobs", ["kind"]))
+    h = reg.register(metrics.Histogram("job_seconds", "Job time", buckets=(0.1, 1.0)))
+    c.inc(kind="a")
+    c.inc(2, kind="a")
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(5)
+    text = reg.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="a"} 3' in text
+    assert 'job_seconds_bucket{le="0.1"} 1' in text
+    assert 'job_seconds_bucket{le="1"} 2' in text
+    assert 'job_seconds_bucket{le="+Inf"} 3' in text
+    assert "job_seconds_count 3" in text
+    with pytest.raises(ValueError):
+        c.inc()
+    with pytest.raises(ValueError):
+        reg.register(metrics.Counter("jobs_total", "again"))
+
+
+def test_timed_counts_errors():
+    h = metrics.Histogram("t_seconds", "t")
+    errors = metrics.Counter("t_errors_total", "e")
+
+    @metrics.timed(h, errors)
+    def boom():
+        raise RuntimeError("x")
+
+    with pytest.raises(RuntimeError):
+        boom()
+    assert h.count() == 1
+    assert errors.value() == 1
+
+
+def test_exec_nmap_timeout_is_counted():
+    before = metrics.NMAP_FAILURES.value(kind="port_scan", reason="timeout")
+    with patch("port_scan.subprocess.run", side_effect=subprocess.TimeoutExpired("nmap", 1)):
+        with pytest.raises(RuntimeError):
+            port_scan._exec_nmap(["nmap"], None)
+    assert metrics.NMAP_FAILURES.value(kind="port_scan", reason="timeout") == before + 1
+
+
+def test_metrics_endpoint():
+    from fastapi.testclient import TestClient
+
+    import src.api as api
+
+    metrics.HOST_SCAN_SECONDS.observe(0.2)
+    res = TestClient(api.app).get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert "nwcd_host_scan_seconds_count" in res.text
+    assert "# TYPE nwcd_scan_queue_depth gauge" in res.text
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        metrics._Metric("nwcd_test", "abstract")
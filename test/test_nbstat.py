@@ -0,0 +1,129 @@
+import socket
+import struct
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import lan_security_check
+import nbstat
+
+
+def _response(txid, names, mac):
+    body = bytes([len(names)])
+    for name, suffix, flags in names:
+        body += name.encode().ljust(15) + bytes([suffix]) + struct.pack("!H", flags)
+    body += bytes(mac) + b"\0" * 40
+    return (
+        struct.pack("!HHHHHH", txid, 0x8400, 0, 1, 0, 0)
+        + nbstat._WILDCARD
+        + struct.pack("!HHIH", nbstat.NBSTAT_TYPE, 1, 0, len(body))
+        + body
+    )
+
+
+class StubNameService:
+    def __init__(self, host, port, names, mac, forge_for_next=False):
+        self.names = names
+        self.mac = mac
+        self.forge_for_next = forge_for_next
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(512)
+            except OSError:
+                return
+            txid = struct.unpack_from("!H", data)[0]
+            if data[12:46] != nbstat._WILDCARD or data[46:50] != b"\x00\x21\x00\x01":
+                continue
+            if self.forge_for_next:
+                # a reply for another host's transaction must not be accepted
+                self.sock.sendto(_response((txid + 1) & 0xFFFF, [("EVIL", 0, 0)], [6] * 6), addr)
+            self.sock.sendto(_response(txid, self.names, self.mac), addr)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def name_services():
+    first = StubNameService(
+        "127.0.0.2", 0,
+        [("WORKSTATION1", 0x00, 0x0400), ("WORKGROUP", 0x00, 0x8400), ("WORKSTATION1", 0x20, 0x0400)],
+        [0x00, 0x11, 0x22, 0x33, 0x44, 0x55],
+        forge_for_next=True,
+    )
+    second = StubNameService("127.0.0.3", first.port, [("NAS", 0x00, 0x0400), ("HOME", 0x00, 0x8400)], [0] * 6)
+    yield first.port
+    first.close()
+    second.close()
+
+
+def test_build_request_is_nbstat_wildcard():
+    packet = nbstat.build_request(0x1234)
+    assert packet[:2] == b"\x12\x34"
+    assert packet[12:46] == nbstat._WILDCARD
+    assert packet[-4:] == b"\x00\x21\x00\x01"
+
+
+def test_parse_response_extracts_names_and_mac():
+    txid, result = nbstat.parse_response(
+        _response(7, [("PC1", 0x00, 0x0400), ("LAB", 0x00, 0x8400), ("PC1", 0x20, 0x0400)], [1, 2, 3, 4, 5, 6]),
+        "10.0.0.9",
+    )
+    assert txid == 7
+    assert result == nbstat.NbstatResult(
+        "10.0.0.9", name="PC1", workgroup="LAB", mac="01:02:03:04:05:06", names=["PC1<00>", "LAB<00>", "PC1<20>"]
+    )
+    assert nbstat.parse_response(b"\0" * 5) == (-1, None)
+
+
+def test_query_hosts_matches_replies(name_services):
+    start = time.monotonic()
+    results = nbstat.query_hosts(["127.0.0.2", "127.0.0.3"], port=name_services, timeout=2)
+    # every host answered, so the wait ends early
+    assert time.monotonic() - start < 1
+    assert results["127.0.0.2"].name == "WORKSTATION1"
+    assert results["127.0.0.2"].workgroup == "WORKGROUP"
+    assert results["127.0.0.2"].mac == "00:11:22:33:44:55"
+    assert results["127.0.0.3"].name == "NAS"
+    # all-zero unit IDs (Samba) are not reported as MACs
+    assert results["127.0.0.3"].mac == ""
+
+
+def test_query_hosts_bounded_wait(name_services):
+    start = time.monotonic()
+    results = nbstat.query_range(["127.0.0.2/32", "127.0.0.4"], port=name_services, timeout=0.3)
+    elapsed = time.monotonic() - start
+    assert list(results) == ["127.0.0.2"]
+    assert 0.25 <= elapsed < 1.5
+
+
+def test_check_netbios_reports_answering_hosts():
+    answers = {"192.168.1.5": nbstat.NbstatResult("192.168.1.5", name="PC1", workgroup="LAB")}
+    with patch("lan_security_check.nbstat.query_hosts", return_value=answers) as query, \
+            patch("lan_security_check.subprocess.run") as run:
+        res = lan_security_check.check_netbios("192.168.1.0/24")
+    run.assert_not_called()
+    assert len(query.call_args.args[0]) == 254
+    assert res["status"] == "warning"
+    assert res["hosts"] == [{"ip": "192.168.1.5", "name": "PC1", "workgroup": "LAB", "mac": ""}]
+
+    with patch("lan_security_check.nbstat.query_hosts", return_value={}):
+        assert lan_security_check.check_netbios("192.168.1.0/24") == {"status": "ok", "hosts": []}
+
+
+def test_check_netbios_native_probes_disabled(monkeypatch):
+    monkeypatch.setenv("NWCD_NATIVE_PROBES", "0")
+    with patch("lan_security_check.nbstat.query_hosts") as query, \
+            patch("lan_security_check.subprocess.run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = ""
+        assert lan_security_check.check_netbios("192.168.1.0/24") == {"status": "ok"}
+    query.assert_not_called()
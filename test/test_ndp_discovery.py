@@ -0,0 +1,101 @@
+import socket
+import time
+from unittest.mock import patch
+
+import pytest
+
+import ndp_discovery
+import network_utils
+
+IFACES = [{"name": "lo", "mac": "", "addresses": ["192.0.2.2", "fd00::2", "fe80::1"], "ipv4": [], "ipv6": ["fd00::/64"]}]
+
+NEIGH_OUTPUT = """\
+fe80::a dev eth0 lladdr 52:54:00:00:00:0a router STALE
+fe80::b dev eth0 lladdr 52:54:00:00:00:0b PROBE
+fd00::a dev eth0 lladdr 52:54:00:00:00:0a REACHABLE
+fd00::b dev eth0 lladdr 52:54:00:00:00:0b DELAY
+fd00::c dev eth0  FAILED
+fd00::d dev eth0 lladdr 52:54:00:00:00:0d FAILED
+2001:db8::1 dev eth0 lladdr 52:54:00:00:00:0d STALE
+"""
+
+
+def test_parse_ip_neigh():
+    assert ndp_discovery.parse_ip_neigh(NEIGH_OUTPUT) == [
+        ("fe80::a", "52:54:00:00:00:0a", ndp_discovery.NUD_STALE),
+        ("fe80::b", "52:54:00:00:00:0b", ndp_discovery.NUD_PROBE),
+        ("fd00::a", "52:54:00:00:00:0a", ndp_discovery.NUD_REACHABLE),
+        ("fd00::b", "52:54:00:00:00:0b", ndp_discovery.NUD_DELAY),
+        ("2001:db8::1", "52:54:00:00:00:0d", ndp_discovery.NUD_STALE),
+    ]
+
+
+def test_discover_filters_prefix_and_matches_ipv4_by_mac():
+    neighbours = ndp_discovery.parse_ip_neigh(NEIGH_OUTPUT) + [("ff02::1", "33:33:00:00:00:01", 0x80)]
+    ipv4 = [{"ip": "192.0.2.10", "mac": "52:54:00:00:00:0A", "vendor": "QEMU", "hostname": "nas"}]
+    with patch("ndp_discovery.ping_all_nodes", return_value={"fd00::2": 1, "fd00::e": 1, "fe80::a": 1}) as ping, \
+            patch("ndp_discovery.read_neighbours", return_value=neighbours):
+        res = ndp_discovery.discover("fd00::/64", interfaces=IFACES, ipv4_hosts=ipv4)
+    # only the source inside the prefix is used, so hosts answer from it
+    assert ping.call_args.args[0] == [("fd00::2", socket.if_nametoindex("lo"))]
+    assert res == [
+        {"ip": "fd00::e", "mac": "", "vendor": "", "hostname": ""},
+        {"ip": "fd00::a", "mac": "52:54:00:00:00:0a", "vendor": "QEMU", "hostname": "nas"},
+        {"ip": "fd00::b", "mac": "52:54:00:00:00:0b", "vendor": "", "hostname": ""},
+    ]
+
+    with patch("ndp_discovery.ping_all_nodes", side_effect=PermissionError), \
+            patch("ndp_discovery.read_neighbours", return_value=neighbours):
+        res = ndp_discovery.discover("fe80::/64", interfaces=IFACES)
+    # without raw sockets confirmed neighbour cache entries are still reported
+    assert [h["ip"] for h in res] == ["fe80::b"]
+
+
+def test_discover_skips_stale_entries_that_did_not_answer():
+    neighbours = [
+        ("fd00::5", "52:54:00:00:00:05", ndp_discovery.NUD_STALE),
+        ("fd00::6", "52:54:00:00:00:06", ndp_discovery.NUD_STALE),
+        ("fd00::7", "52:54:00:00:00:07", ndp_discovery.NUD_PERMANENT),
+    ]
+    with patch("ndp_discovery.ping_all_nodes", return_value={"fd00::6": 1}), \
+            patch("ndp_discovery.read_neighbours", return_value=neighbours):
+        res = ndp_discovery.discover("fd00::/64", interfaces=IFACES)
+    # fd00::5 may have left hours ago; the STALE entry still names fd00::6's MAC
+    assert res == [{"ip": "fd00::6", "mac": "52:54:00:00:00:06", "vendor": "", "hostname": ""}]
+
+
+def test_sweep_uses_ndp_for_large_ipv6_prefixes():
+    ipv4 = [{"ip": "192.0.2.10", "mac": "aa:bb:cc:dd:ee:ff", "vendor": "", "hostname": ""}]
+    v6 = [{"ip": "fd00::10", "mac": "aa:bb:cc:dd:ee:ff", "vendor": "", "hostname": ""}]
+    with patch("network_utils._run_nmap_scan", return_value=ipv4) as nmap, \
+            patch("network_utils.ndp_discovery.discover", return_value=v6) as ndp, \
+            patch("network_utils.get_interfaces", return_value=IFACES):
+        res = list(network_utils.iter_sweep(["192.0.2.0/24", "fd00::/64"], scan_fn=network_utils._run_nmap_scan))
+    assert res == ipv4 + v6
+    assert [c.args[0] for c in nmap.call_args_list] == ["192.0.2.0/24"]
+    assert ndp.call_args.args == ("fd00::/64",)
+    assert ndp.call_args.kwargs["ipv4_hosts"] == ipv4
+
+    # small IPv6 ranges and custom scanners keep the block sweep
+    assert not network_utils.uses_ndp("fd00::/120")
+    calls = []
+    list(network_utils.iter_sweep("fd00::/64", scan_fn=lambda block, timeout: calls.append(block) or []))
+    assert calls == ["fd00::/64"]
+
+
+def test_ping_all_nodes_is_bounded():
+    try:
+        ifindex = socket.if_nametoindex("lo")
+        start = time.monotonic()
+        found = ndp_discovery.ping_all_nodes([("::1", ifindex)], window=0.3)
+    except OSError as e:
+        pytest.skip(f"raw ICMPv6 not available: {e}")
+    assert time.monotonic() - start < 1.5
+    assert isinstance(found, dict)
+
+
+def test_read_neighbours_dump():
+    if not hasattr(socket, "AF_NETLINK"):
+        pytest.skip("no netlink")
+    entries = ndp_discovery.read_neighbours(socket.AF_INET)
+    assert all(":" in mac and "." in ip and state for ip, mac, state in entries)
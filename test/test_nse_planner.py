@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+import nse_planner
+import port_scan
+from scan_records import PortResult
+
+
+def _xml(ports):
+    items = "".join(
+        f"<port protocol='tcp' portid='{p}'><state state='{state}'/><service name='{name}'/></port>"
+        for p, state, name in ports
+    )
+    return f"<nmaprun><host><ports>{items}</ports></host></nmaprun>"
+
+
+def test_scripts_follow_services():
+    assert nse_planner.scripts_for_port(PortResult(445, "open", "microsoft-ds")) == (
+        "vuln and (smb-vuln-* or smb2-vuln-* or samba-vuln-*)"
+    )
+    assert nse_planner.scripts_for_port({"port": "8081", "state": "open", "service": "http"}) == "vuln and (http-*)"
+    # TLS-wrapped HTTP reported as "http" on 443 gets both families
+    assert nse_planner.scripts_for_port(PortResult(443, "open", "http")) == (
+        "vuln and (ssl-* or sslv2-* or tls-* or http-*)"
+    )
+    # unknown services keep the whole category
+    assert nse_planner.scripts_for_port(PortResult(9100, "open", "jetdirect")) == "vuln"
+
+
+def test_plan_groups_open_ports():
+    groups = nse_planner.plan_scripts(
+        [
+            PortResult(80, "open", "http"),
+            PortResult(8080, "open", "http-proxy"),
+            PortResult(445, "open", "microsoft-ds"),
+            PortResult(22, "closed", "ssh"),
+        ]
+    )
+    assert [(g.scripts, g.ports) for g in groups] == [
+        ("vuln and (http-*)", [80, 8080]),
+        ("vuln and (smb-vuln-* or smb2-vuln-* or samba-vuln-*)", [445]),
+    ]
+    assert nse_planner.plan_scripts([PortResult(22, "closed")]) == []
+
+
+def test_run_scan_auto_runs_one_pass_per_group():
+    first = _xml([("80", "open", "http"), ("445", "open", "microsoft-ds"), ("23", "closed", "telnet")])
+    outputs = iter([first, _xml([("80", "open", "http")]), _xml([("445", "open", "microsoft-ds")])])
+    with patch("port_scan._exec_nmap", side_effect=lambda cmd, *args: next(outputs)) as m:
+        res = port_scan.run_scan("10.0.0.2", ["23", "80", "445"], scripts=["auto"])
+    cmds = [c.args[0] for c in m.call_args_list]
+    assert "--script" not in cmds[0] and "-sV" in cmds[0]
+    assert cmds[1][cmds[1].index("--script") + 1] == "vuln and (http-*)"
+    assert cmds[1][cmds[1].index("-p") + 1] == "80"
+    assert cmds[2][cmds[2].index("-p") + 1] == "445"
+    assert sorted(p["port"] for p in res["ports"]) == ["23", "445", "80"]
+
+
+def test_run_scan_auto_uses_fingerprints():
+    with patch("port_scan._exec_nmap", return_value=_xml([("3389", "open", "ms-wbt-server")])) as m:
+        res = port_scan.run_scan(
+            "10.0.0.2", ["3389"], scripts=["auto"], fingerprints=[{"port": "3389", "state": "open", "service": "ms-wbt-server"}]
+        )
+    assert m.call_count == 1
+    cmd = m.call_args.args[0]
+    assert cmd[cmd.index("--script") + 1] == "vuln and (rdp-*)"
+    assert res["ports"][0]["port"] == "3389"
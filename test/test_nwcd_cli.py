@@ -0,0 +1,82 @@
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+import nwcd_cli
+
+
+def test_lan_scan_ndjson_streams_one_line_per_host():
+    records = [
+        {"ip": "192.168.1.2", "mac": "", "vendor": "", "os": "", "ports": []},
+        {"ip": "192.168.1.3", "mac": "", "vendor": "", "os": "", "ports": []},
+    ]
+    out = io.StringIO()
+    with patch("nwcd_cli.iter_scan_hosts", return_value=iter(records)), patch("sys.stdout", out):
+        nwcd_cli.main(["lan-scan", "--subnet", "192.168.1.0/24", "--ndjson"])
+    lines = out.getvalue().splitlines()
+    assert [json.loads(line) for line in lines] == records
+
+
+def test_discover_hosts_ndjson():
+    hosts = [{"ip": "10.0.0.2", "mac": "", "vendor": "", "hostname": ""}]
+    out = io.StringIO()
+    with patch("nwcd_cli.iter_discover_hosts", return_value=iter(hosts)) as m, patch("sys.stdout", out):
+        nwcd_cli.main(["discover-hosts", "10.0.0.0/24", "--ndjson"])
+    m.assert_called_once_with("10.0.0.0/24")
+    assert json.loads(out.getvalue()) == hosts[0]
+
+
+def test_profile_writes_artifact(tmp_path):
+    import pstats
+
+    def slow_discover(subnet):
+        sum(range(10000))
+        return iter([])
+
+    out = tmp_path / "run.pstats"
+    with patch("nwcd_cli.iter_discover_hosts", side_effect=slow_discover), patch("sys.stdout", io.StringIO()):
+        nwcd_cli.main(["--profile", "cprofile", "--profile-out", str(out), "discover-hosts", "10.0.0.0/24", "--ndjson"])
+    stats = pstats.Stats(str(out))
+    assert any(func[2] == "slow_discover" for func in stats.stats)
+
+
+def test_lan_scan_pipeline_uses_baseline(tmp_path):
+    baseline = tmp_path / "prev.json"
+    baseline.write_text(json.dumps({"devices": [{"ip": "10.0.0.2", "mac": "AA:BB:CC:DD:EE:FF"}]}))
+    out = io.StringIO()
+    result = {"devices": [], "scan_phases": {"discovery": 0.1, "sweep": 0.2, "deep_scan": 0.0}}
+    with patch("nwcd_cli.scan_pipeline", return_value=result) as m, patch("sys.stdout", out):
+        nwcd_cli.main(
+            ["lan-scan", "--subnet", "10.0.0.0/24", "--pipeline", "--baseline", str(baseline), "--escalate-ports", "22,445"]
+        )
+    rules = m.call_args.args[2]
+    assert rules.known == {"10.0.0.2": "aa:bb:cc:dd:ee:ff"}
+    assert rules.danger_ports == {"22", "445"}
+    assert json.loads(out.getvalue()) == result
+
+
+def test_lan_scan_pipeline_passes_deep_scan_options():
+    result = {"devices": [], "scan_phases": {}}
+    with patch("nwcd_cli.scan_pipeline", return_value=result) as m, patch("sys.stdout", io.StringIO()):
+        nwcd_cli.main(["lan-scan", "--subnet", "10.0.0.0/24", "--pipeline", "--service"])
+    assert m.call_args.kwargs["service"] is True
+    assert m.call_args.kwargs["os_detect"] is False
+
+
+@pytest.mark.parametrize("option", [["--ndjson"], ["--journal", "x.journal"], ["--resume", "x.journal"]])
+def test_lan_scan_pipeline_rejects_unsupported_options(option):
+    with patch("nwcd_cli.scan_pipeline") as m, patch("sys.stderr", io.StringIO()), \
+            pytest.raises(SystemExit) as exc:
+        nwcd_cli.main(["lan-scan", "--subnet", "10.0.0.0/24", "--pipeline", *option])
+    assert exc.value.code == 2
+    m.assert_not_called()
+
+
+def test_all_networks_rejects_explicit_subnet():
+    with patch("nwcd_cli.discover_hosts") as m, patch("sys.stderr", io.StringIO()), \
+            pytest.raises(SystemExit) as exc:
+        nwcd_cli.main(["discover-hosts", "10.0.0.0/24", "--all-networks"])
+    assert exc.value.code == 2
+    m.assert_not_called()
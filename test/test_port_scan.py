@@ -1,3 +1,7 @@
+import os
+import threading
+import time
+import sys
 import unittest
 import subprocess
 from unittest.mock import patch
@@ -83,5 +87,57 @@ class PortScanScriptTest(unittest.TestCase):
             with self.assertRaises(RuntimeError):
                 port_scan.run_scan('1.1.1.1', [], progress_timeout=None)
 
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'checks processes through /proc')
+class ExecNmapCancelTest(unittest.TestCase):
+    def test_cancel_kills_process_group(self):
+        import tempfile
+
+        cancel = threading.Event()
+        pid_file = os.path.join(tempfile.mkdtemp(), 'pid')
+
+        def watch():
+            while not os.path.exists(pid_file) or not open(pid_file).read().strip():
+                time.sleep(0.01)
+            cancel.set()
+
+        threading.Thread(target=watch, daemon=True).start()
+        # the shell's background child must die with it
+        cmd = ['sh', '-c', f'sleep 30 & echo $! > {pid_file}; wait']
+        start = time.monotonic()
+        with patch('port_scan.KILL_GRACE', 0.5):
+            with self.assertRaises(port_scan.ScanCancelled):
+                port_scan._exec_nmap(cmd, None, cancel)
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual(port_scan.active_processes(), 0)
+        child = int(open(pid_file).read())
+        for _ in range(100):
+            try:
+                # killed but not yet reaped by init counts as gone
+                with open(f'/proc/{child}/stat') as f:
+                    if f.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                        break
+            except FileNotFoundError:
+                break
+            time.sleep(0.01)
+        else:
+            self.fail('background child survived cancellation')
+
+    def test_run_scan_passes_cancel(self):
+        cancel = threading.Event()
+        with patch('port_scan._exec_nmap', return_value='<nmaprun></nmaprun>') as m:
+            port_scan.run_scan('1.1.1.1', ['22'], scripts=[], cancel=cancel)
+        self.assertIs(m.call_args[0][2], cancel)
+
+    def test_run_scan_records(self):
+        xml = ("<nmaprun><host><ports><port protocol='tcp' portid='22'><state state='open'/>"
+               "<service name='ssh'/></port></ports></host></nmaprun>")
+        with patch('port_scan._exec_nmap', return_value=xml):
+            res = port_scan.run_scan('1.1.1.1', ['22'], scripts=[], records=True)
+            plain = port_scan.run_scan('1.1.1.1', ['22'], scripts=[])
+        self.assertEqual(res['ports'], [port_scan.PortResult(22, 'open', 'ssh')])
+        self.assertEqual(plain['ports'], [{'port': '22', 'state': 'open', 'service': 'ssh'}])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,80 @@
+import pstats
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import profiling
+import src.api as api
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_wall_profile_collapses_worker_stacks(tmp_path):
+    out = tmp_path / "wall.folded"
+
+    def work():
+        stop = threading.Event()
+        t = threading.Thread(target=_busy, args=(stop,), name="scan-worker")
+        t.start()
+        time.sleep(0.2)
+        stop.set()
+        t.join()
+
+    profiling.profile_call("wall", work, out)
+    lines = out.read_text().splitlines()
+    assert any(line.startswith("scan-worker;") and "_busy (test_profiling.py" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_cprofile_includes_worker_threads(tmp_path):
+    out = tmp_path / "run.pstats"
+
+    def work():
+        stop = threading.Event()
+        t = threading.Thread(target=_busy, args=(stop,), name="scan-worker")
+        t.start()
+        time.sleep(0.1)
+        stop.set()
+        t.join()
+        return "done"
+
+    assert profiling.profile_call("cprofile", work, out) == "done"
+    names = {func[2] for func in pstats.Stats(str(out)).stats}
+    assert {"work", "_busy"} <= names
+    assert threading.getprofile() is None
+
+
+def test_alloc_profile_lists_sites(tmp_path):
+    out = tmp_path / "alloc.txt"
+    result = profiling.profile_call("alloc", lambda: [bytes(1024) for _ in range(100)], out)
+    assert len(result) == 100
+    assert out.read_text().startswith("Total allocated:")
+
+
+def test_debug_profile_requires_token(monkeypatch):
+    client = TestClient(api.app)
+    monkeypatch.delenv("NWCD_DEBUG_TOKEN", raising=False)
+    assert client.post("/debug/profile").status_code == 404
+    monkeypatch.setenv("NWCD_DEBUG_TOKEN", "secret")
+    assert client.post("/debug/profile", headers={"X-Debug-Token": "wrong"}).status_code == 403
+
+
+def test_debug_profile_samples_scan_loop(monkeypatch):
+    monkeypatch.setenv("NWCD_DEBUG_TOKEN", "secret")
+    stop = threading.Event()
+    monkeypatch.setattr(api, "_scan_thread", threading.Thread(target=_busy, args=(stop,), daemon=True))
+    api._scan_thread.start()
+    try:
+        res = TestClient(api.app).post(
+            "/debug/profile?seconds=0.2&mode=wall", headers={"X-Debug-Token": "secret"}
+        )
+    finally:
+        stop.set()
+        api._scan_thread.join()
+    assert res.status_code == 200
+    assert "_busy (test_profiling.py" in res.text
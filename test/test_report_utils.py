@@ -38,6 +38,21 @@ class ReportUtilsGenerateTopologyTest(unittest.TestCase):
             self.assertTrue(output_path.exists())
 
 
+def test_export_topology_json(tmp_path):
+    from unittest.mock import patch
+
+    import generate_topology
+    from report_utils import exportTopologyJson
+
+    input_path = tmp_path / "scan.json"
+    input_path.write_text(json.dumps({"hosts": [{"ip": "192.168.1.2"}]}))
+    raw = json.dumps({"bb": "0,0,10,10", "objects": [], "edges": []})
+    with patch.object(generate_topology.Graph, "pipe", return_value=raw):
+        out = exportTopologyJson(str(input_path), str(tmp_path / "t.json"))
+    assert json.loads(Path(out).read_text())["bbox"] == [0, 0, 10, 10]
+    with pytest.raises(ValueError):
+        exportTopologyJson(str(input_path), str(tmp_path / "t.svg"))
+
+
 if __name__ == "__main__":
     unittest.main()
-
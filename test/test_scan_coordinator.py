@@ -0,0 +1,142 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+import scan_coordinator
+
+
+def fake_scan(subnet, ports, **kwargs):
+    base = subnet.split("/")[0].rsplit(".", 1)[0]
+    last = int(subnet.split("/")[0].rsplit(".", 1)[1])
+    return [
+        {
+            "ip": f"{base}.{last + 1}",
+            "mac": "",
+            "vendor": "",
+            "os": "",
+            "ports": [{"port": p, "state": "open", "service": ""} for p in ports],
+        }
+    ]
+
+
+def hanging_scan(subnet, ports, **kwargs):
+    time.sleep(60)
+    return []
+
+
+def _start(targets, **kwargs):
+    ready = threading.Event()
+    box = {}
+
+    def on_ready(url):
+        box["url"] = url
+        ready.set()
+
+    def target():
+        box["results"] = scan_coordinator.run_coordinator(
+            targets,
+            ["22"],
+            listen=("127.0.0.1", 0),
+            on_ready=on_ready,
+            timeout=20,
+            **kwargs,
+        )
+
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    assert ready.wait(5)
+    return t, box
+
+
+def test_split_targets():
+    shards = scan_coordinator.split_targets(["10.0.0.0/24", "10.0.1.5"], prefix=26)
+    assert shards == [
+        "10.0.0.0/26",
+        "10.0.0.64/26",
+        "10.0.0.128/26",
+        "10.0.0.192/26",
+        "10.0.1.5/32",
+    ]
+    assert scan_coordinator.split_targets(["fd00::/119"]) == ["fd00::/120", "fd00::100/120"]
+
+
+def test_shard_queue_requeues_expired_lease():
+    queue = scan_coordinator.ShardQueue(["a", "b"], lease_timeout=0.05)
+    lease_a, shard_a = queue.lease("w1")
+    lease_b, _ = queue.lease("w1")
+    assert queue.lease("w2") is None
+    time.sleep(0.1)
+    lease_c, shard_c = queue.lease("w2")
+    assert shard_c == shard_a
+    assert not queue.heartbeat(lease_a)
+    assert not queue.complete(lease_a, [{"ip": "1"}])
+    assert queue.complete(lease_c, [{"ip": "1"}])
+    assert not queue.done()
+
+
+def test_shard_gives_up_after_max_attempts():
+    queue = scan_coordinator.ShardQueue(["a"], max_attempts=2)
+    for _ in range(2):
+        lease, _ = queue.lease("w")
+        queue.fail(lease, "boom")
+    assert queue.done()
+    assert queue.errors == {"a": "boom"}
+    assert queue.results() == []
+
+
+def test_threaded_workers_merge_results():
+    t, box = _start(["10.0.0.0/24"], shard_prefix=26, heartbeat_interval=0.1)
+    workers = [
+        threading.Thread(
+            target=scan_coordinator.run_worker,
+            args=(box["url"], f"w{i}"),
+            kwargs={"scan_fn": fake_scan, "poll_interval": 0.05},
+        )
+        for i in range(3)
+    ]
+    for w in workers:
+        w.start()
+    t.join(10)
+    for w in workers:
+        w.join(5)
+    ips = [h["ip"] for h in box["results"]]
+    assert ips == ["10.0.0.1", "10.0.0.65", "10.0.0.129", "10.0.0.193"]
+    assert box["results"][0]["ports"][0]["port"] == "22"
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="requires fork"
+)
+def test_dead_worker_process_shard_is_requeued():
+    ctx = multiprocessing.get_context("fork")
+    t, box = _start(
+        ["10.0.0.0/25"], shard_prefix=26, lease_timeout=0.5, heartbeat_interval=0.1
+    )
+    stuck = ctx.Process(
+        target=scan_coordinator.run_worker,
+        args=(box["url"], "stuck"),
+        kwargs={"scan_fn": hanging_scan, "poll_interval": 0.05},
+    )
+    stuck.start()
+    # Let the stuck worker lease a shard before killing it mid-scan
+    time.sleep(0.5)
+    stuck.kill()
+    stuck.join()
+
+    healthy = [
+        ctx.Process(
+            target=scan_coordinator.run_worker,
+            args=(box["url"], f"w{i}"),
+            kwargs={"scan_fn": fake_scan, "poll_interval": 0.05},
+        )
+        for i in range(2)
+    ]
+    for p in healthy:
+        p.start()
+    t.join(15)
+    for p in healthy:
+        p.join(5)
+        assert p.exitcode == 0
+    assert [h["ip"] for h in box["results"]] == ["10.0.0.1", "10.0.0.65"]
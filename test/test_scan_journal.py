@@ -0,0 +1,152 @@
+import io
+import json
+from unittest.mock import patch
+
+import lan_port_scan
+import nwcd_cli
+from scan_journal import ScanJournal, read_journal
+
+HOSTS = [{"ip": f"10.0.0.{i}", "mac": "", "vendor": ""} for i in range(2, 6)]
+PARAMS = lan_port_scan.sweep_params("10.0.0.0/24", ["22"])
+
+
+def _ok(ip, ports, **kwargs):
+    return {"os": "", "ports": [{"port": "22", "state": "open", "service": "ssh"}]}
+
+
+def test_journal_round_trip_and_torn_line(tmp_path):
+    path = str(tmp_path / "scan.journal")
+    with ScanJournal.open(path, PARAMS) as journal:
+        journal.record_failure("10.0.0.3", "boom", 1, False)
+        journal.record_host("10.0.0.2", {"ip": "10.0.0.2", "ports": []})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"type": "host", "ip": "10.0.0.9", "res')
+    state = read_journal(path)
+    assert state.params == PARAMS
+    assert list(state.hosts) == ["10.0.0.2"]
+    assert state.failures == {"10.0.0.3": ["boom"]}
+    assert not state.done
+
+    # a resumed journal appends after the torn line on a fresh line
+    with ScanJournal.open(path, PARAMS) as journal:
+        assert list(journal.state.hosts) == ["10.0.0.2"]
+        journal.record_host("10.0.0.4", {"ip": "10.0.0.4", "ports": []})
+        journal.finish()
+    state = read_journal(path)
+    assert list(state.hosts) == ["10.0.0.2", "10.0.0.4"] and state.done
+
+    # finished journals and other parameters start over
+    with ScanJournal.open(path, PARAMS) as journal:
+        assert journal.state.hosts == {}
+
+
+def test_fsync_is_batched(tmp_path):
+    path = str(tmp_path / "scan.journal")
+    with patch("scan_journal.os.fsync") as fsync:
+        journal = ScanJournal.open(path, PARAMS, sync_every=10, sync_interval=60)
+        fsync.reset_mock()
+        for i in range(25):
+            journal.record_host(f"10.0.1.{i}", {})
+        assert fsync.call_count == 2
+        journal.close()
+        assert fsync.call_count == 3
+
+
+@patch("lan_port_scan.gather_hosts", return_value=HOSTS)
+def test_resume_skips_finished_hosts(mock_gather, tmp_path):
+    path = str(tmp_path / "scan.journal")
+    with ScanJournal.open(path, PARAMS) as journal:
+        gen = lan_port_scan.iter_scan_hosts(**PARAMS, max_workers=1, journal=journal)
+        with patch("lan_port_scan.run_scan", side_effect=_ok):
+            first = [next(gen), next(gen)]
+            gen.close()
+    assert not read_journal(path).done
+
+    scanned = []
+    with ScanJournal.open(path, PARAMS) as journal:
+        with patch("lan_port_scan.run_scan", side_effect=lambda ip, *a, **k: scanned.append(ip) or _ok(ip, a)):
+            res = lan_port_scan.scan_hosts(**PARAMS, journal=journal)
+    assert sorted(h["ip"] for h in res) == [h["ip"] for h in HOSTS]
+    assert not set(scanned) & {h["ip"] for h in first}
+    assert read_journal(path).done
+
+
+@patch("lan_port_scan.RETRY_BACKOFF", 0.01)
+@patch("lan_port_scan.gather_hosts", return_value=HOSTS[:2])
+def test_failures_are_retried_and_recorded(mock_gather, tmp_path):
+    attempts = {}
+
+    def flaky(ip, ports, **kwargs):
+        attempts[ip] = attempts.get(ip, 0) + 1
+        if ip == "10.0.0.2" and attempts[ip] < 2:
+            raise RuntimeError("nmap scan stalled")
+        if ip == "10.0.0.3":
+            raise RuntimeError("host down")
+        return _ok(ip, ports)
+
+    path = str(tmp_path / "scan.journal")
+    with ScanJournal.open(path, PARAMS) as journal, patch("lan_port_scan.run_scan", side_effect=flaky):
+        res = lan_port_scan.scan_hosts(**PARAMS, journal=journal, retries=2)
+    by_ip = {h["ip"]: h for h in res}
+    assert attempts == {"10.0.0.2": 2, "10.0.0.3": 3}
+    assert "error" not in by_ip["10.0.0.2"]
+    assert by_ip["10.0.0.3"]["error"] == "host down"
+    state = read_journal(path)
+    assert state.failures == {"10.0.0.3": ["host down"] * 3}
+    assert list(state.hosts) == ["10.0.0.2"]
+    assert not state.done
+
+    # resuming rescans only the host that failed
+    with ScanJournal.open(path, PARAMS) as journal, patch("lan_port_scan.run_scan", side_effect=_ok) as m:
+        res = lan_port_scan.scan_hosts(**PARAMS, journal=journal)
+    assert [c.args[0] for c in m.call_args_list] == ["10.0.0.3"]
+    assert sorted(h["ip"] for h in res) == ["10.0.0.2", "10.0.0.3"]
+    state = read_journal(path)
+    assert state.done and state.failures == {}
+
+
+def test_permanent_errors_are_not_retried():
+    with patch("lan_port_scan.run_scan", side_effect=FileNotFoundError("nmap")) as m:
+        res = lan_port_scan._scan_host(HOSTS[0], ["22"], {}, 3, 0, None, None)
+    assert res == (None, "nmap")
+    assert m.call_count == 1
+
+
+def test_cli_resume_uses_journal_params(tmp_path):
+    path = str(tmp_path / "scan.journal")
+    params = lan_port_scan.sweep_params("10.9.0.0/24", ["80"], service=True)
+    with ScanJournal.open(path, params) as journal:
+        journal.record_host("10.9.0.2", {"ip": "10.9.0.2", "ports": []})
+    out = io.StringIO()
+    with patch("nwcd_cli.scan_hosts", return_value=[]) as m, patch("sys.stdout", out):
+        nwcd_cli.main(["lan-scan", "--resume", path])
+    kwargs = m.call_args.kwargs
+    assert kwargs["subnet"] == "10.9.0.0/24" and kwargs["service"] is True
+    assert list(kwargs["journal"].state.hosts) == ["10.9.0.2"]
+
+    with ScanJournal.open(path, params) as journal:
+        journal.finish()
+    out = io.StringIO()
+    with patch("nwcd_cli.scan_hosts") as m, patch("sys.stdout", out):
+        nwcd_cli.main(["lan-scan", "--resume", path])
+    m.assert_not_called()
+    assert json.loads(out.getvalue()) == [{"ip": "10.9.0.2", "ports": []}]
+
+
+def test_cli_resume_missing_journal_starts_sweep(tmp_path):
+    path = str(tmp_path / "new.journal")
+    with patch("nwcd_cli.scan_hosts", return_value=[]) as m, patch("sys.stdout", io.StringIO()):
+        nwcd_cli.main(["lan-scan", "--subnet", "10.8.0.0/24", "--ports", "22", "--resume", path])
+    assert m.call_args.kwargs["subnet"] == "10.8.0.0/24"
+    assert read_journal(path).params == lan_port_scan.sweep_params("10.8.0.0/24", ["22"])
+
+
+@patch("lan_port_scan.gather_hosts", return_value=HOSTS[:1])
+def test_failures_of_vanished_hosts_are_dropped(mock_gather, tmp_path):
+    path = str(tmp_path / "scan.journal")
+    with ScanJournal.open(path, PARAMS) as journal:
+        journal.record_failure("10.0.0.3", "host down", 1, True)
+    with ScanJournal.open(path, PARAMS) as journal, patch("lan_port_scan.run_scan", side_effect=_ok) as m:
+        lan_port_scan.scan_hosts(**PARAMS, journal=journal)
+    assert [c.args[0] for c in m.call_args_list] == ["10.0.0.2"]
+    assert read_journal(path).done
@@ -0,0 +1,95 @@
+"""End-to-end tests running the scan pipeline against the synthetic nmap."""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+FAKEBIN = ROOT / "benchmarks" / "fakebin"
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="fake nmap needs a POSIX shebang")
+
+
+@pytest.fixture
+def fake_nmap(monkeypatch, tmp_path):
+    monkeypatch.setenv("PATH", str(FAKEBIN) + os.pathsep + os.environ.get("PATH", ""))
+    monkeypatch.setenv("FAKE_NMAP_NETWORK", "10.0.0.0/16")
+    monkeypatch.setenv("FAKE_NMAP_HOSTS", "12")
+    monkeypatch.setenv("FAKE_NMAP_LATENCY_MS", "1")
+    monkeypatch.setenv("FAKE_NMAP_LOG", str(tmp_path / "nmap.log"))
+    # the virtual LAN only exists for nmap; skip the probes that use sockets
+    monkeypatch.setenv("NWCD_NATIVE_PROBES", "0")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "nmap.log"
+
+
+def test_discovery_and_lan_scan(fake_nmap):
+    import discover_hosts
+    import lan_port_scan
+
+    hosts = discover_hosts.discover_hosts("10.0.0.0/28")
+    assert [h["ip"] for h in hosts] == [f"10.0.0.{i}" for i in range(1, 13)]
+    assert all(h["vendor"] for h in hosts)
+
+    results = lan_port_scan.scan_hosts("10.0.0.0/28", ["22", "445"], max_workers=4)
+    assert sorted(r["ip"] for r in results) == sorted(h["ip"] for h in hosts)
+    assert all({p["port"] for p in r["ports"]} == {"22", "445"} for r in results)
+    # one discovery run per sweep plus one port scan per host
+    assert len(fake_nmap.read_text().splitlines()) == 2 + len(hosts)
+
+
+def test_lan_check_parses_fake_outputs(fake_nmap, monkeypatch):
+    import lan_security_check
+
+    monkeypatch.setenv("FAKE_NMAP_DHCP_SERVERS", "2")
+    monkeypatch.setenv("FAKE_NMAP_SMBV1_RATE", "1")
+    monkeypatch.setenv("FAKE_NMAP_PORTS", "445:1")
+    res = lan_security_check.run_checks("10.0.0.0/28")
+    assert res["dhcp"]["status"] == "warning"
+    assert res["smb_protocol"]["status"] == "warning"
+    assert res["netbios"]["status"] == "warning"
+
+
+def test_stalled_scan_is_killed(fake_nmap, monkeypatch):
+    import port_scan
+
+    monkeypatch.setenv("FAKE_NMAP_STALL_RATE", "1")
+    monkeypatch.setenv("FAKE_NMAP_STALL_S", "30")
+    with pytest.raises(RuntimeError, match="stalled"):
+        port_scan.run_scan("10.0.0.2", ["22"], scripts=[], progress_timeout=1)
+
+
+def test_load_harness_reports_metrics():
+    sys.path.insert(0, str(ROOT / "benchmarks"))
+    try:
+        import bench_scan_load
+    finally:
+        sys.path.pop(0)
+    res = bench_scan_load.run_scenario("discovery", 10)
+    assert res["result_count"] == 10
+    assert res["nmap_processes"] == 1
+    assert res["peak_rss_kb"] > 0
+
+
+def test_load_gate_normalises_wall_time():
+    sys.path.insert(0, str(ROOT / "benchmarks"))
+    try:
+        import bench_scan_load
+    finally:
+        sys.path.pop(0)
+
+    def row(scenario, wall, procs=1, count=10):
+        return {"scenario": scenario, "hosts": 10, "wall_s": wall, "peak_rss_kb": 1000,
+                "nmap_processes": procs, "result_count": count}
+
+    baseline = [row("discovery", 0.2), row("lan-scan", 1.0), row("lan-check", 0.5)]
+    # a runner three times slower everywhere passes
+    slow = [row("discovery", 0.6), row("lan-scan", 3.0), row("lan-check", 1.5)]
+    assert bench_scan_load.compare(slow, baseline, 0.5) == []
+    # one scenario slowing down relative to the others does not
+    outlier = [row("discovery", 0.2), row("lan-scan", 1.0), row("lan-check", 6.0)]
+    assert [p.split(":")[0] for p in bench_scan_load.compare(outlier, baseline, 0.5)] == ["lan-check@10"]
+    # counters are compared exactly
+    counters = [row("discovery", 0.2, procs=2), row("lan-scan", 1.0, count=9), row("lan-check", 0.5)]
+    assert len(bench_scan_load.compare(counters, baseline, 0.5)) == 2
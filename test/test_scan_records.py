@@ -0,0 +1,54 @@
+import sys
+
+from scan_records import Host, PortResult, as_dict, open_port_list
+import lan_port_scan
+from unittest.mock import patch
+
+
+def test_port_result_round_trip():
+    p = PortResult.from_dict({"port": "443", "state": "open", "service": "https", "service_info": "nginx 1.25"})
+    assert p.port == 443
+    assert p.to_dict() == {"port": "443", "state": "open", "service": "https", "service_info": "nginx 1.25"}
+    assert not hasattr(p, "__dict__")
+
+
+def test_strings_are_interned():
+    a = PortResult(22, "".join(["op", "en"]), "".join(["ss", "h"]))
+    b = PortResult(23, "open", "ssh")
+    assert a.state is b.state
+    assert a.service is b.service is sys.intern("ssh")
+
+
+def test_host_to_dict_matches_existing_formats():
+    discovered = Host("192.168.1.2", "AA:BB", "Acme", "nas")
+    assert discovered.to_dict() == {"ip": "192.168.1.2", "mac": "AA:BB", "vendor": "Acme", "hostname": "nas"}
+    scanned = Host.from_scan(
+        {"ip": "192.168.1.2", "mac": "AA:BB", "vendor": "Acme"},
+        {"os": "Linux", "ports": [{"port": "22", "state": "open", "service": "ssh"}]},
+    )
+    assert scanned.to_dict() == {
+        "ip": "192.168.1.2",
+        "mac": "AA:BB",
+        "vendor": "Acme",
+        "os": "Linux",
+        "ports": [{"port": "22", "state": "open", "service": "ssh"}],
+    }
+    assert Host.from_dict(scanned.to_dict()) == scanned
+
+
+def test_open_port_list_accepts_all_shapes():
+    host = Host("1.1.1.1", ports=[PortResult(22, "open"), PortResult(23, "closed")])
+    assert open_port_list(host) == ["22"]
+    assert open_port_list(host.to_dict()) == ["22"]
+    assert open_port_list({"open_ports": [80, "443"]}) == ["80", "443"]
+    assert as_dict({"ip": "x"}) == {"ip": "x"}
+
+
+@patch("lan_port_scan.run_scan")
+@patch("lan_port_scan._run_nmap_scan")
+def test_scan_hosts_records(mock_nmap, mock_scan):
+    mock_nmap.return_value = [{"ip": "192.168.1.2", "mac": "aa", "vendor": "X"}]
+    mock_scan.return_value = {"os": "", "ports": [{"port": "22", "state": "open", "service": "ssh"}]}
+    res = lan_port_scan.scan_hosts("192.168.1.0/24", ["22"], records=True)
+    assert isinstance(res[0], Host)
+    assert res[0].open_ports() == [22]
@@ -0,0 +1,168 @@
+import socket
+import struct
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import lan_security_check
+import smb_probe
+
+
+def _smb1_response(index):
+    header = b"\xffSMB" + bytes([0x72]) + b"\0" * 4 + bytes([0x98]) + b"\0" * 22
+    body = header + bytes([17]) + struct.pack("<H", index) + b"\0" * 32 + b"\0\0"
+    return struct.pack(">I", len(body)) + body
+
+
+def _smb2_response(revision):
+    header = b"\xfeSMB" + struct.pack("<HH", 64, 0) + b"\0" * 56
+    body = header + struct.pack("<HHH", 65, 1, revision) + b"\0" * 58
+    return struct.pack(">I", len(body)) + body
+
+
+class StubSmbServer:
+    """Answers NEGOTIATE like a server with or without SMBv1 enabled."""
+
+    def __init__(self, host, port, smb1, smb2_revision=0x02FF, silent=False):
+        self.smb1 = smb1
+        self.smb2_revision = smb2_revision
+        self.silent = silent
+        self.requests = []
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            data = conn.recv(4096)
+            if self.silent:
+                time.sleep(3)
+                return
+            dialects = [d.decode() for d in data[4 + 35:].split(b"\0") if d]
+            dialects = [d.lstrip("\x02") for d in dialects]
+            self.requests.append(dialects)
+            if "SMB 2.???" in dialects:
+                conn.sendall(_smb2_response(self.smb2_revision))
+            elif self.smb1 and "NT LM 0.12" in dialects:
+                conn.sendall(_smb1_response(dialects.index("NT LM 0.12")))
+            # without SMBv1 the connection is dropped
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def servers():
+    first = StubSmbServer("127.0.0.2", 0, smb1=True, smb2_revision=0x0202)
+    port = first.port
+    others = [
+        StubSmbServer("127.0.0.3", port, smb1=False),
+        StubSmbServer("127.0.0.5", port, smb1=False, silent=True),
+    ]
+    yield port, [first, *others]
+    for s in [first, *others]:
+        s.close()
+
+
+def test_build_negotiate_lists_dialects():
+    packet = smb_probe.build_negotiate(["NT LM 0.12"])
+    assert struct.unpack(">I", packet[:4])[0] == len(packet) - 4
+    assert packet[4:9] == b"\xffSMBr"
+    assert packet.endswith(b"\x02NT LM 0.12\0")
+
+
+def test_parse_negotiate_response():
+    assert smb_probe.parse_negotiate_response(_smb1_response(5)[4:], smb_probe.SMB1_DIALECTS) == "NT LM 0.12"
+    assert smb_probe.parse_negotiate_response(_smb1_response(0xFFFF)[4:], smb_probe.SMB1_DIALECTS) is None
+    assert smb_probe.parse_negotiate_response(_smb2_response(0x0311)[4:], smb_probe.SMB2_DIALECTS) == "SMB 3.1.1"
+    assert smb_probe.parse_negotiate_response(b"junk", smb_probe.SMB1_DIALECTS) is None
+
+
+def test_expand_targets():
+    assert smb_probe.expand_targets("10.0.0.0/30") == ["10.0.0.1", "10.0.0.2"]
+    assert smb_probe.expand_targets(["10.0.0.5", "10.0.0.4/31", "10.0.0.5"]) == ["10.0.0.5", "10.0.0.4"]
+    # oversized ranges are rejected without building the host list
+    start = time.monotonic()
+    assert smb_probe.expand_targets(["10.0.0.0/8", "fd00::/64"], limit=4096) == []
+    assert time.monotonic() - start < 0.5
+    assert smb_probe.expand_targets("10.0.0.0/30", limit=4) == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_probe_hosts_reports_per_host_dialects(servers):
+    port, stubs = servers
+    start = time.monotonic()
+    results = smb_probe.probe_hosts(
+        ["127.0.0.2", "127.0.0.3", "127.0.0.4", "127.0.0.5"], port=port, timeout=0.5
+    )
+    elapsed = time.monotonic() - start
+    by_ip = {r.ip: r for r in results}
+    assert by_ip["127.0.0.2"].smb1_dialect == "NT LM 0.12"
+    assert by_ip["127.0.0.2"].smb2_dialect == "SMB 2.0.2"
+    assert by_ip["127.0.0.3"].open and not by_ip["127.0.0.3"].smb1
+    assert by_ip["127.0.0.3"].smb2_dialect == "SMB 2.???"
+    assert not by_ip["127.0.0.4"].open and by_ip["127.0.0.4"].error
+    assert by_ip["127.0.0.5"].error == "timeout"
+    # hosts are probed in parallel: one timeout, not one per host
+    assert elapsed < 1.5
+    assert stubs[0].requests[0] == list(smb_probe.SMB1_DIALECTS)
+
+
+def test_connection_limit_is_respected(servers):
+    port, _ = servers
+    open_now = peak = 0
+    real = smb_probe._negotiate
+
+    async def counting(ip, port, dialects):
+        nonlocal open_now, peak
+        open_now += 1
+        peak = max(peak, open_now)
+        try:
+            return await real(ip, port, dialects)
+        finally:
+            open_now -= 1
+
+    with patch("smb_probe._negotiate", counting):
+        smb_probe.probe_hosts(["127.0.0.2", "127.0.0.3"] * 3, port=port, limit=2, timeout=1)
+    assert peak <= 2
+
+
+def test_check_smb_protocol_names_smb1_hosts():
+    results = [
+        smb_probe.SmbResult("10.0.0.5", open=True, smb1_dialect="NT LM 0.12", smb2_dialect="SMB 2.???"),
+        smb_probe.SmbResult("10.0.0.6", open=True, smb2_dialect="SMB 2.???"),
+        smb_probe.SmbResult("10.0.0.7", error="timeout"),
+    ]
+    with patch("lan_security_check.smb_probe.probe_hosts", return_value=results) as probe, \
+            patch("lan_security_check.subprocess.run") as run:
+        res = lan_security_check.check_smb_protocol("10.0.0.0/29")
+    run.assert_not_called()
+    assert probe.call_args.args[0] == [f"10.0.0.{i}" for i in range(1, 7)]
+    assert res["status"] == "warning"
+    assert res["details"] == "SMBv1 enabled on 10.0.0.5"
+    assert [h["ip"] for h in res["hosts"]] == ["10.0.0.5", "10.0.0.6"]
+
+
+def test_check_smb_protocol_uses_nmap_for_large_ranges():
+    with patch("lan_security_check.smb_probe.probe_hosts") as probe, \
+            patch("lan_security_check.subprocess.run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = "NT LM 0.12 (SMBv1)"
+        res = lan_security_check.check_smb_protocol("10.0.0.0/16")
+        start = time.monotonic()
+        lan_security_check.check_smb_protocol(["10.0.0.0/8", "fd00::/64"])
+        assert time.monotonic() - start < 0.5
+    probe.assert_not_called()
+    assert res["status"] == "warning"
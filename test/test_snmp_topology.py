@@ -0,0 +1,158 @@
+import os
+import socket
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import snmp_client  # noqa: E402
+import topology_builder  # noqa: E402
+from snmp_client import SnmpSession, parse_oid  # noqa: E402
+from snmp_topology import SnmpTopology  # noqa: E402
+
+MAC = (0x00, 0x11, 0x22, 0x33, 0x44, 0x55)
+
+
+class StubAgent:
+    """Tiny SNMPv2c agent answering GET and GETBULK from a dict of OIDs."""
+
+    def __init__(self, host, port, objects, community="public"):
+        self.objects = sorted((parse_oid(k), v) for k, v in objects.items())
+        self.community = community
+        self.requests = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(65535)
+            except OSError:
+                return
+            community, pdu, rid, f1, f2, varbinds = snmp_client.decode_message(data)
+            if community != self.community:
+                continue
+            self.requests += 1
+            out = []
+            for oid, _ in varbinds:
+                if pdu == snmp_client.GET_REQUEST:
+                    out.append((oid, dict(self.objects).get(oid, snmp_client.NO_SUCH)))
+                    continue
+                after = [(o, v) for o, v in self.objects if o > oid][:f2]
+                out.extend(after or [(oid, snmp_client.END_OF_MIB)])
+            reply = snmp_client.encode_message(community, snmp_client.GET_RESPONSE, rid, out)
+            self.sock.sendto(reply, addr)
+
+    def close(self):
+        self.sock.close()
+
+
+def _mac_index(mac):
+    return ".".join(str(b) for b in mac)
+
+
+@pytest.fixture
+def network():
+    router = StubAgent("127.0.0.2", 0, {
+        "1.3.6.1.2.1.1.5.0": "gw",
+        "1.3.6.1.2.1.4.22.1.2.1.10.0.0.5": bytes(MAC),
+        "1.0.8802.1.1.2.1.4.1.1.9.0.1.1": "core",
+        "1.0.8802.1.1.2.1.4.2.1.3.0.1.1.1.4.127.0.0.3": 2,
+    })
+    port = router.port
+    core = StubAgent("127.0.0.3", port, {
+        "1.3.6.1.2.1.1.5.0": "core",
+        f"1.3.6.1.2.1.17.4.3.1.2.{_mac_index(MAC)}": 2,
+        "1.3.6.1.2.1.17.1.4.1.2.1": 1,
+        "1.3.6.1.2.1.17.1.4.1.2.2": 2,
+        "1.3.6.1.2.1.31.1.1.1.1.1": "Te1/1",
+        "1.3.6.1.2.1.31.1.1.1.1.2": "Te1/2",
+        "1.0.8802.1.1.2.1.4.1.1.9.0.1.1": "gw",
+        "1.0.8802.1.1.2.1.4.1.1.9.0.2.1": "access",
+        "1.0.8802.1.1.2.1.4.2.1.3.0.2.1.1.4.127.0.0.4": 2,
+    })
+    access = StubAgent("127.0.0.4", port, {
+        "1.3.6.1.2.1.1.5.0": "access",
+        f"1.3.6.1.2.1.17.4.3.1.2.{_mac_index(MAC)}": 7,
+        "1.3.6.1.2.1.17.1.4.1.2.1": 10001,
+        "1.3.6.1.2.1.17.1.4.1.2.7": 10007,
+        "1.3.6.1.2.1.31.1.1.1.1.10001": "Gi0/1",
+        "1.3.6.1.2.1.31.1.1.1.1.10007": "Gi0/7",
+        "1.0.8802.1.1.2.1.4.1.1.9.0.1.1": "core",
+        "1.0.8802.1.1.2.1.4.2.1.3.0.1.1.1.4.127.0.0.3": 2,
+    })
+    yield port, (router, core, access)
+    for agent in (router, core, access):
+        agent.close()
+
+
+def test_ber_roundtrip():
+    oid = parse_oid("1.0.8802.1.1.2.1.4.1.1.9.0.300.1")
+    packet = snmp_client.encode_message("secret", snmp_client.GET_BULK_REQUEST, 4242, [(oid, None), (oid, -129)], 0, 25)
+    community, pdu, rid, f1, f2, varbinds = snmp_client.decode_message(packet)
+    assert (community, pdu, rid, f1, f2) == ("secret", snmp_client.GET_BULK_REQUEST, 4242, 0, 25)
+    assert varbinds == [(oid, None), (oid, -129)]
+    long_value = b"x" * 300
+    tag, value, end = snmp_client.decode_tlv(snmp_client.encode_value(long_value))
+    assert (tag, value, end) == (snmp_client.OCTET_STRING, long_value, 304)
+
+
+def test_bulk_walk_uses_getbulk_pages():
+    objects = {f"1.3.6.1.2.1.31.1.1.1.1.{i}": f"if{i}" for i in range(1, 31)}
+    objects["1.3.6.1.2.1.31.1.1.1.2.1"] = 0
+    agent = StubAgent("127.0.0.1", 0, objects)
+    try:
+        with SnmpSession("127.0.0.1", port=agent.port, timeout=1.0) as session:
+            rows = list(session.bulk_walk("1.3.6.1.2.1.31.1.1.1.1"))
+    finally:
+        agent.close()
+    assert len(rows) == 30
+    assert rows[0] == (parse_oid("1.3.6.1.2.1.31.1.1.1.1.1"), b"if1")
+    assert agent.requests == 2
+
+
+def test_session_times_out_without_agent():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    try:
+        with SnmpSession("127.0.0.1", port=sock.getsockname()[1], timeout=0.05, retries=0) as session:
+            with pytest.raises(snmp_client.SnmpError):
+                session.get("1.3.6.1.2.1.1.5.0")
+    finally:
+        sock.close()
+
+
+def test_poll_follows_lldp_and_resolves_l2_path(network):
+    port, agents = network
+    topo = SnmpTopology(port=port, timeout=1.0)
+    found = topo.poll(["127.0.0.2"])
+    assert set(found) == {"127.0.0.2", "127.0.0.3", "127.0.0.4"}
+    assert found["127.0.0.2"].arp == {"10.0.0.5": "00:11:22:33:44:55"}
+    assert topo.l2_path("10.0.0.5") == ["core", "access:Gi0/7"]
+    assert topo.l2_path("10.0.0.99") == []
+
+
+def test_poll_reuses_cached_agents(network):
+    port, agents = network
+    topo = SnmpTopology(port=port, timeout=1.0)
+    topo.poll(["127.0.0.2"])
+    before = [a.requests for a in agents]
+    topo.poll(["127.0.0.2", "127.0.0.3"])
+    assert [a.requests for a in agents] == before
+    topo.ttl = -1
+    topo.poll(["127.0.0.2"])
+    assert all(a.requests > b for a, b in zip(agents, before))
+
+
+def test_build_paths_inserts_switches(network):
+    port, _ = network
+    hosts = [{"ip": "10.0.0.5"}]
+    with patch("topology_builder.trace_hosts", return_value={"10.0.0.5": ["127.0.0.2", "10.0.0.5"]}):
+        data = topology_builder.build_paths(hosts, use_snmp=True, snmp=SnmpTopology(port=port, timeout=1.0))
+    assert data == {"paths": [{"ip": "10.0.0.5", "path": ["LAN", "gw", "core", "access:Gi0/7", "Host"]}]}
@@ -0,0 +1,201 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+import lan_security_check
+import ssdp_probe
+
+IGD_XML = b"""<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:InternetGatewayDevice:1</deviceType>
+    <friendlyName>Home Router</friendlyName>
+    <manufacturer>Acme</manufacturer>
+    <modelName>R100</modelName>
+    <serviceList>
+      <service><serviceType>urn:schemas-upnp-org:service:Layer3Forwarding:1</serviceType></service>
+    </serviceList>
+    <deviceList>
+      <device>
+        <deviceType>urn:schemas-upnp-org:device:WANConnectionDevice:1</deviceType>
+        <serviceList>
+          <service><serviceType>urn:schemas-upnp-org:service:WANIPConnection:1</serviceType></service>
+        </serviceList>
+      </device>
+    </deviceList>
+  </device>
+</root>"""
+TV_XML = b"""<root xmlns="urn:schemas-upnp-org:device-1-0"><device>
+<deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType><friendlyName>TV</friendlyName>
+<serviceList><service><serviceType>urn:schemas-upnp-org:service:AVTransport:1</serviceType></service></serviceList>
+</device></root>"""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    docs = {"/igd.xml": IGD_XML, "/tv.xml": TV_XML}
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        body = self.docs.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def lan():
+    http = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    http.connections = 0
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{http.server_address[1]}"
+    replies = [
+        (f"{base}/igd.xml", "urn:schemas-upnp-org:device:InternetGatewayDevice:1"),
+        (f"{base}/tv.xml", "urn:schemas-upnp-org:device:MediaRenderer:1"),
+        ("http://10.255.255.1:49152/desc.xml", "urn:schemas-upnp-org:service:WANPPPConnection:1"),
+        (f"{base}/missing.xml", "upnp:rootdevice"),
+    ]
+    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp.bind(("127.0.0.1", 0))
+    searches = []
+
+    def respond():
+        while True:
+            try:
+                data, addr = udp.recvfrom(2048)
+            except OSError:
+                return
+            searches.append(data)
+            for location, st in replies:
+                msg = (
+                    "HTTP/1.1 200 OK\r\nCACHE-CONTROL: max-age=1800\r\n"
+                    f"LOCATION: {location}\r\nSERVER: Linux UPnP/1.0 test/1\r\nST: {st}\r\n"
+                    f"USN: uuid:1::{st}\r\n\r\n"
+                )
+                try:
+                    udp.sendto(msg.encode(), addr)
+                except OSError:
+                    return
+
+    threading.Thread(target=respond, daemon=True).start()
+    yield udp.getsockname(), http, searches
+    udp.close()
+    http.shutdown()
+    http.server_close()
+
+
+def test_parse_ssdp_response():
+    data = b"HTTP/1.1 200 OK\r\nLocation: http://192.168.1.1:1900/igd.xml\r\nST: upnp:rootdevice\r\n\r\n"
+    assert ssdp_probe.parse_ssdp_response(data) == {
+        "location": "http://192.168.1.1:1900/igd.xml",
+        "st": "upnp:rootdevice",
+    }
+    assert ssdp_probe.parse_ssdp_response(b"NOTIFY * HTTP/1.1\r\n\r\n") is None
+
+
+def test_parse_description_collects_embedded_services():
+    device = ssdp_probe.parse_description(IGD_XML, "192.168.1.1", "http://192.168.1.1/igd.xml")
+    assert device.friendly_name == "Home Router"
+    assert device.model == "R100"
+    assert device.services == [
+        "urn:schemas-upnp-org:service:Layer3Forwarding:1",
+        "urn:schemas-upnp-org:service:WANIPConnection:1",
+    ]
+    assert device.port_mapping is True
+
+
+def test_discover_fetches_descriptions_over_pooled_connection(lan):
+    target, http, searches = lan
+    start = time.monotonic()
+    devices = ssdp_probe.discover(0.3, target=target)
+    assert time.monotonic() - start < 2
+    assert len(searches) == 2
+    by_location = {d.location.rsplit("/", 1)[-1]: d for d in devices}
+    assert by_location["igd.xml"].friendly_name == "Home Router"
+    assert by_location["igd.xml"].port_mapping is True
+    assert by_location["tv.xml"].port_mapping is False
+    # the LOCATION of another host is not fetched, but its ST is kept
+    remote = by_location["desc.xml"]
+    assert remote.friendly_name == ""
+    assert remote.services == ["urn:schemas-upnp-org:service:WANPPPConnection:1"]
+    assert remote.port_mapping is True
+    assert by_location["missing.xml"].services == []
+    # three descriptions from one host, fetched concurrently over at most three connections
+    assert 1 <= http.connections <= 3
+
+
+def test_http_pool_reuses_connection(lan):
+    import asyncio
+
+    _, http, _ = lan
+    base = f"http://127.0.0.1:{http.server_address[1]}"
+
+    async def fetch():
+        pool = ssdp_probe.HttpPool()
+        try:
+            first = await pool.get(f"{base}/igd.xml")
+            second = await pool.get(f"{base}/tv.xml")
+        finally:
+            pool.close()
+        return first, second, pool.connections_opened
+
+    first, second, opened = asyncio.run(fetch())
+    assert (first, second) == (IGD_XML, TV_XML)
+    assert opened == 1
+    assert http.connections == 1
+
+
+def test_check_upnp_reports_igd_exposure():
+    devices = [
+        ssdp_probe.UpnpDevice("192.168.1.1", "http://192.168.1.1/igd.xml", friendly_name="Home Router",
+                              services=["urn:schemas-upnp-org:service:WANIPConnection:1"], port_mapping=True),
+    ]
+    with patch("lan_security_check.ssdp_probe.discover", return_value=devices), \
+            patch("lan_security_check.subprocess.run") as run:
+        res = lan_security_check.check_upnp("192.168.1.0/24")
+    run.assert_not_called()
+    assert res["status"] == "warning"
+    assert "IGD port mapping exposed by 192.168.1.1" in res["details"]
+    assert res["devices"][0]["name"] == "Home Router"
+
+    with patch("lan_security_check.ssdp_probe.discover", return_value=[]):
+        assert lan_security_check.check_upnp("192.168.1.0/24") == {"status": "ok", "devices": []}
+
+    # devices on the link but outside the checked subnet are not reported
+    with patch("lan_security_check.ssdp_probe.discover", return_value=devices):
+        assert lan_security_check.check_upnp("10.0.0.0/24") == {"status": "ok", "devices": []}
+
+
+def test_check_upnp_native_probes_disabled(monkeypatch):
+    monkeypatch.setenv("NWCD_NATIVE_PROBES", "0")
+    with patch("lan_security_check.ssdp_probe.discover") as probe, \
+            patch("lan_security_check.subprocess.run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = ""
+        assert lan_security_check.check_upnp("192.168.1.0/24") == {"status": "ok"}
+    probe.assert_not_called()
+
+
+def test_check_upnp_falls_back_to_scanners():
+    with patch("lan_security_check.ssdp_probe.discover", side_effect=OSError("no multicast")), \
+            patch("lan_security_check.subprocess.run") as run:
+        run.return_value.returncode = 0
+        run.return_value.stdout = "Found UPnP devices"
+        res = lan_security_check.check_upnp("192.168.1.0/24")
+    assert run.call_args.args[0] == ["upnpc", "-l"]
+    assert res["status"] == "warning"
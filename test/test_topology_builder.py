@@ -1,9 +1,17 @@
 from subprocess import CompletedProcess
 from unittest.mock import patch
 
+import pytest
+
 import topology_builder
 
 
+@pytest.fixture(autouse=True)
+def subprocess_traceroute(monkeypatch):
+    # These tests cover the traceroute subprocess path
+    monkeypatch.setattr(topology_builder, "NATIVE_TRACEROUTE", False)
+
+
 def test_build_paths_traceroute_parsing():
     hosts = [{"ip": "192.168.1.2"}]
     traceroute_output = (
@@ -36,6 +44,7 @@ def test_classify_hops_handles_empty_and_multiple():
 def test_build_paths_uses_snmp_augmentation():
     hosts = [{"ip": "192.168.1.2"}]
     with patch("topology_builder.traceroute", return_value=["192.168.1.1", "192.168.1.2"]), \
+        patch("topology_builder.SnmpTopology.poll", return_value={}), \
         patch("topology_builder._augment_with_snmp", return_value=["LAN", "Router", "Host", "SNMP"]) as mock_snmp:
         data = topology_builder.build_paths(hosts, use_snmp=True)
     mock_snmp.assert_called_once()
@@ -52,3 +61,121 @@ def test_traceroute_uses_windows_command():
         ["tracert", "-d", "1.1.1.1"], capture_output=True, text=True, timeout=30
     )
 
+
+
+def test_ip_re_matches_addresses_only():
+    from discover_hosts import IP_RE
+
+    assert IP_RE.fullmatch("192.168.1.1")
+    assert IP_RE.fullmatch("fe80::1")
+    assert not IP_RE.fullmatch("ms")
+    assert not IP_RE.fullmatch("12:30")
+
+
+def test_siblings_reuse_cached_prefix():
+    calls = []
+
+    def fake_traceroute(ip, *, timeout=30, first_ttl=None, silent=None):
+        calls.append((ip, first_ttl))
+        if first_ttl:
+            return [ip]
+        return ["10.0.0.1", "172.16.0.1", ip]
+
+    hosts = [{"ip": f"192.168.5.{i}"} for i in range(2, 12)] + [{"ip": "192.168.6.2"}]
+    with patch("topology_builder.traceroute", side_effect=fake_traceroute), \
+        patch("topology_builder.os.name", "posix"):
+        data = topology_builder.build_paths(hosts, max_workers=4)
+
+    full = [ip for ip, ttl in calls if ttl is None]
+    assert sorted(full) == ["192.168.5.2", "192.168.6.2"]
+    assert all(ttl == 3 for ip, ttl in calls if ip not in full)
+    assert [p["ip"] for p in data["paths"]] == [h["ip"] for h in hosts]
+    assert all(p["path"] == ["LAN", "Router", "Router", "Host"] for p in data["paths"])
+
+
+def test_failed_leader_releases_siblings_together():
+    import threading
+    import time
+
+    lock = threading.Lock()
+    active = peak = 0
+
+    def fake_traceroute(ip, *, timeout=30, first_ttl=None, silent=None):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        raise RuntimeError("unreachable")
+
+    hosts = [{"ip": f"192.168.7.{i}"} for i in range(2, 10)]
+    with patch("topology_builder.traceroute", side_effect=fake_traceroute), \
+        patch("topology_builder.os.name", "posix"):
+        data = topology_builder.build_paths(hosts, max_workers=4)
+
+    assert peak == 4
+    assert data == {"paths": []}
+
+
+def test_silent_hop_keeps_the_tail_ttl():
+    calls = []
+
+    def fake_traceroute(ip, *, timeout=30, first_ttl=None, silent=None):
+        calls.append(first_ttl)
+        if first_ttl:
+            return [ip]
+        # the second hop does not answer
+        return ["10.0.0.1", silent, "172.16.0.1", ip]
+
+    hosts = [{"ip": "192.168.5.2"}, {"ip": "192.168.5.3"}]
+    with patch("topology_builder.traceroute", side_effect=fake_traceroute), \
+        patch("topology_builder.os.name", "posix"):
+        data = topology_builder.build_paths(hosts, max_workers=1)
+    assert calls == [None, 4]
+    assert all(p["path"] == ["LAN", "Router", "Router", "Host"] for p in data["paths"])
+
+
+def test_parse_traceroute_output_keeps_silent_hops():
+    output = (
+        "traceroute to 192.168.1.2 (192.168.1.2)\n"
+        " 1  192.168.1.1  1 ms\n"
+        " 2  * * *\n"
+        " 3  192.168.1.2  2 ms\n"
+        " 4  * * *\n"
+    )
+    assert topology_builder._parse_traceroute_output(output) == ["192.168.1.1", "192.168.1.2"]
+    assert topology_builder._parse_traceroute_output(output, "*") == ["192.168.1.1", "*", "192.168.1.2"]
+
+
+def test_changed_route_falls_back_to_full_trace():
+    cache = topology_builder.HopCache()
+    cache.learn("192.168.5.2", ["10.0.0.1", "192.168.5.2"])
+
+    def fake_traceroute(ip, *, timeout=30, first_ttl=None, silent=None):
+        return ["10.0.0.9"] if first_ttl else ["10.0.0.2", ip]
+
+    with patch("topology_builder.traceroute", side_effect=fake_traceroute) as m, \
+        patch("topology_builder.os.name", "posix"):
+        data = topology_builder.build_paths([{"ip": "192.168.5.3"}], cache=cache)
+    assert m.call_count == 2
+    assert data["paths"][0]["path"] == ["LAN", "Router", "Host"]
+    assert cache.get("192.168.5.9") == ["10.0.0.2"]
+
+
+def test_deadline_and_failures_skip_hosts():
+    import time
+
+    def fake_traceroute(ip, *, timeout=30, first_ttl=None, silent=None):
+        if ip.endswith(".2"):
+            raise RuntimeError("unreachable")
+        time.sleep(0.5 if ip.startswith("10.9.") else 0)
+        return [ip]
+
+    hosts = [{"ip": "10.1.0.2"}, {"ip": "10.2.0.3"}, {"ip": "10.9.0.3"}]
+    start = time.monotonic()
+    with patch("topology_builder.traceroute", side_effect=fake_traceroute):
+        data = topology_builder.build_paths(hosts, deadline=0.2)
+    assert time.monotonic() - start < 0.45
+    assert data == {"paths": [{"ip": "10.2.0.3", "path": ["LAN", "Host"]}]}
@@ -0,0 +1,114 @@
+import socket
+import struct
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+import topology_builder
+import traceroute_engine
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs IP_RECVERR")
+
+
+def _cmsg(level, ctype, origin, icmp_type, code, addr):
+    ee = struct.pack("=IBBBBII", 113, origin, icmp_type, code, 0, 0, 0)
+    if ":" in addr:
+        sa = struct.pack("=HHI", socket.AF_INET6, 0, 0) + socket.inet_pton(socket.AF_INET6, addr) + b"\0" * 4
+    else:
+        sa = struct.pack("=HH", socket.AF_INET, 0) + socket.inet_aton(addr) + b"\0" * 8
+    return [(level, ctype, ee + sa)]
+
+
+def test_parse_error_time_exceeded_and_unreachable():
+    hop = _cmsg(socket.IPPROTO_IP, traceroute_engine.IP_RECVERR, 2, 11, 0, "10.0.0.1")
+    assert traceroute_engine._parse_error(hop) == ("10.0.0.1", False)
+    dest = _cmsg(socket.IPPROTO_IP, traceroute_engine.IP_RECVERR, 2, 3, 3, "10.0.5.9")
+    assert traceroute_engine._parse_error(dest) == ("10.0.5.9", True)
+    v6 = _cmsg(socket.IPPROTO_IPV6, traceroute_engine.IPV6_RECVERR, 3, 1, 4, "fd00::9")
+    assert traceroute_engine._parse_error(v6) == ("fd00::9", True)
+    assert traceroute_engine._parse_error([(1, 2, b"x")]) is None
+
+
+def test_result_keeps_silent_hop_positions():
+    trace = traceroute_engine._Trace("10.0.5.9", 2)
+    trace.hops = {2: "10.0.0.1", 4: "10.0.5.9", 6: "10.0.9.9"}
+    trace.reached = 4
+    assert trace.result() == ["10.0.0.1", "10.0.5.9"]
+    assert trace.result("*") == ["10.0.0.1", "*", "10.0.5.9"]
+
+
+@linux_only
+def test_trace_loopback_stops_when_destination_answers():
+    start = time.monotonic()
+    result = traceroute_engine.trace_many(["127.0.0.1", "127.0.0.2", "::1"], timeout=2)
+    assert result == {"127.0.0.1": ["127.0.0.1"], "127.0.0.2": ["127.0.0.2"], "::1": ["::1"]}
+    assert time.monotonic() - start < 1
+
+
+@linux_only
+def test_trace_many_respects_socket_budget():
+    targets = [f"127.0.0.{i}" for i in range(1, 41)]
+    result = traceroute_engine.trace_many(targets, max_hops=8, max_sockets=16, timeout=2)
+    assert all(result[t] == [t] for t in targets)
+
+
+@linux_only
+def test_build_paths_uses_native_engine(monkeypatch):
+    monkeypatch.setattr(topology_builder, "NATIVE_TRACEROUTE", True)
+    with patch("topology_builder.subprocess.run") as run:
+        data = topology_builder.build_paths([{"ip": "127.0.0.1"}, {"ip": "127.0.0.2"}])
+    run.assert_not_called()
+    assert data == {
+        "paths": [
+            {"ip": "127.0.0.1", "path": ["LAN", "Host"]},
+            {"ip": "127.0.0.2", "path": ["LAN", "Host"]},
+        ]
+    }
+
+
+def test_native_siblings_verify_past_cached_prefix(monkeypatch):
+    monkeypatch.setattr(topology_builder, "NATIVE_TRACEROUTE", True)
+    monkeypatch.setattr(traceroute_engine, "available", lambda: True)
+    rounds = []
+
+    def fake_trace_many(targets, **kwargs):
+        rounds.append(dict(targets))
+        return {ip: (["10.0.0.1", ip] if ttl == 1 else [ip]) for ip, ttl in targets.items()}
+
+    monkeypatch.setattr(traceroute_engine, "trace_many", fake_trace_many)
+    hosts = [{"ip": f"192.168.7.{i}"} for i in range(2, 6)]
+    data = topology_builder.build_paths(hosts)
+    assert rounds == [{"192.168.7.2": 1}, {f"192.168.7.{i}": 2 for i in range(3, 6)}]
+    assert all(p["path"] == ["LAN", "Router", "Host"] for p in data["paths"])
+
+
+def test_native_tail_starts_after_silent_hop(monkeypatch):
+    monkeypatch.setattr(topology_builder, "NATIVE_TRACEROUTE", True)
+    monkeypatch.setattr(traceroute_engine, "available", lambda: True)
+    rounds = []
+
+    def fake_trace_many(targets, silent=None, **kwargs):
+        rounds.append(dict(targets))
+        return {ip: (["10.0.0.1", silent, ip] if ttl == 1 else [ip]) for ip, ttl in targets.items()}
+
+    monkeypatch.setattr(traceroute_engine, "trace_many", fake_trace_many)
+    data = topology_builder.build_paths([{"ip": "192.168.7.2"}, {"ip": "192.168.7.3"}])
+    assert rounds == [{"192.168.7.2": 1}, {"192.168.7.3": 3}]
+    assert all(p["path"] == ["LAN", "Router", "Host"] for p in data["paths"])
+
+
+def test_native_falls_back_to_subprocess_on_permission_error(monkeypatch):
+    monkeypatch.setattr(topology_builder, "NATIVE_TRACEROUTE", True)
+    monkeypatch.setattr(traceroute_engine, "available", lambda: True)
+    monkeypatch.setattr(topology_builder.os, "name", "posix")
+
+    def denied(*args, **kwargs):
+        raise PermissionError(1, "Operation not permitted")
+
+    monkeypatch.setattr(traceroute_engine, "trace_many", denied)
+    with patch("topology_builder.traceroute", return_value=["10.0.0.1", "192.168.7.2"]) as tr:
+        data = topology_builder.build_paths([{"ip": "192.168.7.2"}])
+    tr.assert_called_once()
+    assert data["paths"][0]["path"] == ["LAN", "Router", "Host"]
@@ -1,31 +1,110 @@
+import ipaddress
 import json
 import os
 import subprocess
-from typing import List, Dict
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Dict, Optional
 
+import traceroute_engine
 from discover_hosts import IP_RE
+from snmp_topology import SnmpTopology
 
+# Probe with the built-in parallel-TTL engine on Linux instead of starting
+# the traceroute tool; tests turn this off to exercise the subprocess path.
+NATIVE_TRACEROUTE = True
 
-def traceroute(ip: str, *, timeout: int = 30) -> List[str]:
-    """Run traceroute/tracert command for given IP and return list of hop IPs."""
-    cmd = ["tracert", "-d", ip] if os.name == "nt" else ["traceroute", "-n", ip]
+# Per-host traceroute timeout in seconds
+TRACE_TIMEOUT = 30
+# Concurrent traceroute processes started by build_paths
+TRACE_WORKERS = 16
+# Overall time budget of build_paths in seconds (None disables it)
+BUILD_DEADLINE: Optional[float] = 300
+# Hosts in the same /24 (IPv4) or /64 (IPv6) share their path up to the last hop
+HOP_CACHE_PREFIX_V4 = 24
+HOP_CACHE_PREFIX_V6 = 64
+# Seconds a learned prefix path is reused
+HOP_CACHE_TTL = 300
+# Placeholder for a hop that did not answer, used while counting TTLs
+SILENT_HOP = "*"
+# Extra SNMP agents (comma separated) and community used with use_snmp
+SNMP_AGENTS_ENV = "NWCD_SNMP_AGENTS"
+SNMP_COMMUNITY_ENV = "NWCD_SNMP_COMMUNITY"
+
+
+def traceroute(
+    ip: str,
+    *,
+    timeout: float = TRACE_TIMEOUT,
+    first_ttl: int | None = None,
+    silent: str | None = None,
+) -> List[str]:
+    """Run traceroute/tracert command for given IP and return list of hop IPs.
+
+    ``first_ttl`` starts probing at that hop (``traceroute -f``) so that only
+    the hops beyond a known prefix are traced. ``tracert`` has no such option
+    and always traces the full path. Hops that did not answer are left out,
+    or returned as ``silent`` when it is given. On Linux the built-in engine
+    of :mod:`traceroute_engine` is used unless :data:`NATIVE_TRACEROUTE` is
+    off.
+    """
+    if _use_native([ip]):
+        try:
+            return traceroute_engine.trace(
+                ip,
+                first_ttl=first_ttl or 1,
+                timeout=min(timeout, traceroute_engine.PROBE_TIMEOUT),
+                silent=silent,
+            )
+        except OSError:
+            pass
+    if os.name == "nt":
+        cmd = ["tracert", "-d", ip]
+    elif first_ttl and first_ttl > 1:
+        cmd = ["traceroute", "-n", "-f", str(first_ttl), ip]
+    else:
+        cmd = ["traceroute", "-n", ip]
     proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
     if proc.returncode != 0:
         raise RuntimeError(proc.stderr.strip())
-    return _parse_traceroute_output(proc.stdout)
+    return _parse_traceroute_output(proc.stdout, silent)
+
 
+def _use_native(ips: List[str]) -> bool:
+    if not NATIVE_TRACEROUTE or os.name == "nt" or not traceroute_engine.available():
+        return False
+    try:
+        for ip in ips:
+            ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return True
 
-def _parse_traceroute_output(output: str) -> List[str]:
-    """Extract hop IPs from traceroute command output."""
+
+def _parse_traceroute_output(output: str, silent: str | None = None) -> List[str]:
+    """Extract hop IPs from traceroute command output.
+
+    Hop lines without an address (``* * *``) are skipped, or kept as
+    ``silent`` up to the last hop that answered.
+    """
     hops: List[str] = []
     for line in output.splitlines():
         line = line.strip()
         if line.lower().startswith("traceroute") or line.lower().startswith("tracing route"):
             continue
-        for token in line.split():
+        tokens = line.split()
+        for token in tokens:
             if IP_RE.fullmatch(token) and ("." in token or ":" in token):
                 hops.append(token)
                 break
+        else:
+            if silent is not None and tokens and tokens[0].isdigit():
+                hops.append(silent)
+    while hops and hops[-1] == silent:
+        hops.pop()
     return hops
 
 
@@ -37,40 +116,257 @@ def _classify_hops(hops: List[str]) -> List[str]:
     return path
 
 
-def _augment_with_snmp(path: List[str], ip: str) -> List[str]:
-    """Augment path information using SNMP/LLDP if pysnmp is available.
+def _augment_with_snmp(
+    path: List[str],
+    ip: str,
+    hops: Optional[List[str]] = None,
+    topology: Optional[SnmpTopology] = None,
+) -> List[str]:
+    """Augment ``path`` with SNMP/LLDP data from ``topology``.
 
-    Currently this function acts as a placeholder and returns the path
-    unchanged when SNMP data cannot be retrieved.
+    Router hops answering SNMP are labelled with their sysName and the
+    switches between the last router and the host, taken from the bridge
+    forwarding tables and LLDP adjacency, are inserted before ``Host``. The
+    path is returned unchanged when nothing is known about ``ip``.
     """
-    try:
-        from pysnmp.hlapi import SnmpEngine  # type: ignore
-    except Exception:
+    if topology is None or not path:
         return path
-    # Placeholder for SNMP/LLDP augmentation logic
-    return path
+    path = list(path)
+    for i, hop in enumerate((hops or [])[:-1], 1):
+        if i < len(path) - 1:
+            path[i] = topology.name_of(hop) or path[i]
+    switches = [s for s in topology.l2_path(ip) if s not in path]
+    return path[:-1] + switches + path[-1:]
+
+
+def _answered(hops: List[str]) -> List[str]:
+    return [h for h in hops if h != SILENT_HOP]
+
+
+def _snmp_seeds(hops_by_ip: Dict[str, List[str]]) -> List[str]:
+    """Return configured agents followed by every router seen in the traces."""
+    seeds = [a.strip() for a in os.environ.get(SNMP_AGENTS_ENV, "").split(",") if a.strip()]
+    for hops in hops_by_ip.values():
+        seeds.extend(hops[:-1])
+    return list(dict.fromkeys(seeds))
+
+
+def _subnet_key(ip: str) -> str:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    prefix = HOP_CACHE_PREFIX_V4 if addr.version == 4 else HOP_CACHE_PREFIX_V6
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+class HopCache:
+    """Known hop prefixes (the path up to the last hop) per host subnet.
+
+    Prefixes keep a :data:`SILENT_HOP` for every hop that did not answer, so
+    ``len(prefix) + 1`` is the TTL of the last hop.
+    """
+
+    def __init__(self, ttl: float = HOP_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._paths: Dict[str, tuple[List[str], float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, ip: str) -> Optional[List[str]]:
+        key = _subnet_key(ip)
+        with self._lock:
+            entry = self._paths.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl:
+                del self._paths[key]
+                return None
+            return list(entry[0])
+
+    def learn(self, ip: str, hops: List[str]) -> None:
+        """Remember the prefix of a completed trace to ``ip``."""
+        if not hops or hops[-1] != ip:
+            return
+        with self._lock:
+            self._paths[_subnet_key(ip)] = (hops[:-1], time.monotonic())
+
+
+def _trace_host(ip: str, cache: HopCache, end: Optional[float]) -> List[str]:
+    """Trace ``ip``, reusing the cached prefix of its subnet when possible.
+
+    With a cached prefix only the hops past it are probed; if that tail does
+    not end at ``ip`` the route has changed and a full trace is made.
+    """
+    timeout: float = TRACE_TIMEOUT
+    if end is not None:
+        timeout = max(1.0, min(TRACE_TIMEOUT, end - time.monotonic()))
+    prefix = cache.get(ip)
+    if prefix and os.name != "nt":
+        tail = traceroute(ip, timeout=timeout, first_ttl=len(prefix) + 1, silent=SILENT_HOP)
+        if tail and tail[-1] == ip:
+            return _answered(prefix + tail)
+    hops = traceroute(ip, timeout=timeout, silent=SILENT_HOP)
+    cache.learn(ip, hops)
+    return _answered(hops)
+
+
+def _trace_hosts_native(ips: List[str], cache: HopCache, end: Optional[float]) -> Dict[str, List[str]]:
+    """Trace ``ips`` with :func:`traceroute_engine.trace_many` in three rounds.
+
+    Round one traces one host per uncached subnet, round two probes siblings
+    past the cached prefix and round three fully traces hosts whose tail did
+    not reach them.
+    """
+
+    def run(targets: Dict[str, int]) -> Dict[str, List[str]]:
+        if not targets:
+            return {}
+        timeout = traceroute_engine.PROBE_TIMEOUT
+        if end is not None:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                print(f"traceroute deadline reached, {len(targets)} hosts skipped", file=sys.stderr)
+                return {}
+            timeout = min(timeout, remaining)
+        return traceroute_engine.trace_many(targets, timeout=timeout, silent=SILENT_HOP)
+
+    unique = list(dict.fromkeys(ips))
+    leaders: Dict[str, str] = {}
+    for ip in unique:
+        key = _subnet_key(ip)
+        if key not in leaders and cache.get(ip) is None:
+            leaders[key] = ip
+    hops_by_ip = run({ip: 1 for ip in leaders.values()})
+    for ip, hops in hops_by_ip.items():
+        cache.learn(ip, hops)
+
+    prefixes: Dict[str, List[str]] = {}
+    full: Dict[str, int] = {}
+    for ip in unique:
+        if ip in hops_by_ip:
+            continue
+        prefix = cache.get(ip)
+        if prefix:
+            prefixes[ip] = prefix
+        else:
+            full[ip] = 1
+    tails = run({ip: len(prefix) + 1 for ip, prefix in prefixes.items()})
+    for ip, tail in tails.items():
+        if tail and tail[-1] == ip:
+            hops_by_ip[ip] = prefixes[ip] + tail
+        else:
+            full[ip] = 1
+    for ip, hops in run(full).items():
+        cache.learn(ip, hops)
+        hops_by_ip[ip] = hops
+    return {ip: _answered(hops) for ip, hops in hops_by_ip.items()}
+
+
+def trace_hosts(
+    ips: List[str],
+    *,
+    max_workers: int = TRACE_WORKERS,
+    deadline: Optional[float] = BUILD_DEADLINE,
+    cache: Optional[HopCache] = None,
+) -> Dict[str, List[str]]:
+    """Trace ``ips`` concurrently and return hops per reachable IP.
+
+    One host per subnet is traced first; its siblings are released when it
+    finishes and only verify the final hop if its prefix was cached. Hosts
+    whose trace fails, or that are not finished within ``deadline`` seconds,
+    are left out.
+    With the native engine all hosts of a round share one event loop instead
+    of a thread pool.
+    """
+    cache = cache if cache is not None else HopCache()
+    end = time.monotonic() + deadline if deadline is not None else None
+    if _use_native(ips):
+        try:
+            return _trace_hosts_native(ips, cache, end)
+        except OSError as e:
+            print(f"native traceroute unavailable ({e}), using traceroute", file=sys.stderr)
+    ready: deque[str] = deque()
+    waiting: Dict[str, deque[str]] = {}
+    for ip in dict.fromkeys(ips):
+        key = _subnet_key(ip)
+        if key in waiting:
+            waiting[key].append(ip)
+        else:
+            waiting[key] = deque()
+            ready.append(ip)
+
+    hops_by_ip: Dict[str, List[str]] = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    running = {}
+    try:
+        while ready or running:
+            while ready and len(running) < max_workers:
+                ip = ready.popleft()
+                running[executor.submit(_trace_host, ip, cache, end)] = ip
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                print(f"traceroute deadline reached, {len(running) + len(ready)} hosts skipped", file=sys.stderr)
+                break
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                ip = running.pop(fut)
+                try:
+                    hops_by_ip[ip] = fut.result()
+                except Exception as e:
+                    print(f"traceroute to {ip} failed: {e}", file=sys.stderr)
+                siblings = waiting.get(_subnet_key(ip))
+                if not siblings:
+                    continue
+                # Without a usable prefix the siblings trace the full path,
+                # still in parallel up to max_workers
+                ready.extend(siblings)
+                siblings.clear()
+    finally:
+        for fut in running:
+            fut.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return hops_by_ip
 
 
-def build_paths(hosts: List[Dict[str, str]], use_snmp: bool = False) -> Dict[str, List[Dict[str, List[str]]]]:
+def build_paths(
+    hosts: List[Dict[str, str]],
+    use_snmp: bool = False,
+    *,
+    max_workers: int = TRACE_WORKERS,
+    deadline: Optional[float] = BUILD_DEADLINE,
+    cache: Optional[HopCache] = None,
+    snmp: Optional[SnmpTopology] = None,
+) -> Dict[str, List[Dict[str, List[str]]]]:
     """Build network topology paths for given hosts.
 
     Args:
         hosts: List of host dictionaries returned by ``discover_hosts``.
         use_snmp: When True, attempt to augment hop data using SNMP/LLDP.
+        max_workers: Maximum number of concurrent traceroutes.
+        deadline: Overall time budget in seconds; unfinished hosts are left out.
+        cache: Hop cache to share between calls.
+        snmp: SNMP poller to share between calls; its per-agent cache
+            avoids re-walking agents. By default a new one is created with
+            the community from ``NWCD_SNMP_COMMUNITY``.
 
     Returns:
         A dictionary containing a ``paths`` array suitable for JSON
         serialization.
     """
+    ips = [h["ip"] for h in hosts if h.get("ip")]
+    hops_by_ip = trace_hosts(ips, max_workers=max_workers, deadline=deadline, cache=cache)
+    if use_snmp:
+        if snmp is None:
+            snmp = SnmpTopology(os.environ.get(SNMP_COMMUNITY_ENV) or "public")
+        snmp.poll(_snmp_seeds(hops_by_ip))
     results = []
-    for host in hosts:
-        ip = host.get("ip")
-        if not ip:
+    for ip in ips:
+        hops = hops_by_ip.get(ip)
+        if hops is None:
             continue
-        hops = traceroute(ip)
         path = _classify_hops(hops)
         if use_snmp:
-            path = _augment_with_snmp(path, ip)
+            path = _augment_with_snmp(path, ip, hops, snmp)
         results.append({"ip": ip, "path": path})
     return {"paths": results}
 
@@ -79,7 +375,8 @@ def main() -> None:
     from discover_hosts import discover_hosts
 
     hosts = discover_hosts()
-    data = build_paths(hosts)
+    use_snmp = bool(os.environ.get(SNMP_AGENTS_ENV) or os.environ.get(SNMP_COMMUNITY_ENV))
+    data = build_paths(hosts, use_snmp=use_snmp)
     print(json.dumps(data, ensure_ascii=False))
 
 
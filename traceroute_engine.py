@@ -0,0 +1,233 @@
+"""Parallel-TTL traceroute using unprivileged UDP sockets (Linux only).
+
+Every hop of a destination is probed at once: one UDP socket per TTL with
+``IP_RECVERR``/``IPV6_RECVERR`` enabled, so ICMP time-exceeded and
+destination-unreachable replies are queued on the socket's error queue
+together with the address of the router that sent them. All sockets of all
+destinations are served by one selector loop. A destination is finished as
+soon as it answers (port unreachable) and every lower TTL has answered, or
+when its probe timeout expires. Silent hops are left out of the result, as
+``traceroute -n`` output parsing does, unless a ``silent`` placeholder is
+given to keep the position of every hop.
+"""
+from __future__ import annotations
+
+import errno
+import ipaddress
+import os
+import selectors
+import socket
+import struct
+import sys
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Highest TTL probed
+MAX_HOPS = 30
+# Seconds to wait for replies of one destination
+PROBE_TIMEOUT = 3.0
+# Upper bound of probe sockets open at once
+MAX_SOCKETS = 512
+# First destination port, incremented by TTL as traceroute does
+BASE_PORT = 33434
+
+IP_RECVERR = getattr(socket, "IP_RECVERR", 11)
+IPV6_RECVERR = getattr(socket, "IPV6_RECVERR", 25)
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+ICMP_DEST_UNREACH = 3
+ICMP6_DST_UNREACH = 1
+
+_EE = struct.Struct("=IBBBBII")
+_FATAL_ERRNOS = {errno.EPERM, errno.EACCES, errno.EAFNOSUPPORT, errno.ENOPROTOOPT, errno.EMFILE, errno.ENFILE}
+
+
+def available() -> bool:
+    """Return True when the native engine can be used on this platform."""
+    return sys.platform.startswith("linux") and os.name == "posix"
+
+
+def _parse_error(ancdata: List[Tuple[int, int, bytes]]) -> Optional[Tuple[str, bool]]:
+    """Return ``(router, terminal)`` from ``recvmsg`` ancillary data.
+
+    ``terminal`` is True for destination-unreachable replies, which end the
+    path (port unreachable from the target itself, or a router giving up).
+    """
+    for level, ctype, data in ancdata:
+        if (level, ctype) not in ((socket.IPPROTO_IP, IP_RECVERR), (socket.IPPROTO_IPV6, IPV6_RECVERR)):
+            continue
+        if len(data) < _EE.size + 2:
+            continue
+        _, origin, icmp_type, _, _, _, _ = _EE.unpack_from(data)
+        offender = data[_EE.size:]
+        family = struct.unpack_from("=H", offender)[0]
+        if family == socket.AF_INET and len(offender) >= 8:
+            addr = socket.inet_ntop(socket.AF_INET, offender[4:8])
+        elif family == socket.AF_INET6 and len(offender) >= 24:
+            addr = socket.inet_ntop(socket.AF_INET6, offender[8:24])
+        else:
+            continue
+        terminal = (origin == SO_EE_ORIGIN_ICMP and icmp_type == ICMP_DEST_UNREACH) or (
+            origin == SO_EE_ORIGIN_ICMP6 and icmp_type == ICMP6_DST_UNREACH
+        )
+        return addr, terminal
+    return None
+
+
+class _Trace:
+    __slots__ = ("dest", "family", "first_ttl", "started", "hops", "reached", "pending")
+
+    def __init__(self, dest: str, first_ttl: int) -> None:
+        self.dest = dest
+        self.family = socket.AF_INET6 if ipaddress.ip_address(dest).version == 6 else socket.AF_INET
+        self.first_ttl = max(1, first_ttl)
+        self.started = 0.0
+        self.hops: Dict[int, str] = {}
+        self.reached: Optional[int] = None
+        self.pending: Dict[socket.socket, int] = {}
+
+    def done(self, now: float, timeout: float) -> bool:
+        if not self.pending:
+            return True
+        if self.reached is not None and all(ttl > self.reached for ttl in self.pending.values()):
+            return True
+        return now - self.started >= timeout
+
+    def result(self, silent: Optional[str] = None) -> List[str]:
+        if silent is None:
+            return [
+                self.hops[ttl]
+                for ttl in sorted(self.hops)
+                if self.reached is None or ttl <= self.reached
+            ]
+        if not self.hops:
+            return []
+        last = self.reached if self.reached is not None else max(self.hops)
+        return [self.hops.get(ttl, silent) for ttl in range(self.first_ttl, last + 1)]
+
+
+def _open_probe(trace: _Trace, ttl: int) -> socket.socket:
+    sock = socket.socket(trace.family, socket.SOCK_DGRAM)
+    try:
+        sock.setblocking(False)
+        if trace.family == socket.AF_INET6:
+            sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ttl)
+        else:
+            sock.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+        sock.connect((trace.dest, BASE_PORT + ttl))
+        sock.send(b"\x00" * 32)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def trace_many(
+    targets: Iterable[str] | Mapping[str, int],
+    *,
+    max_hops: int = MAX_HOPS,
+    timeout: float = PROBE_TIMEOUT,
+    max_sockets: int = MAX_SOCKETS,
+    silent: Optional[str] = None,
+) -> Dict[str, List[str]]:
+    """Trace all ``targets`` from one event loop and return hop IPs per target.
+
+    ``targets`` may map each destination to the first TTL to probe, so that
+    hops already known from a sibling host are skipped. With ``silent``,
+    hops that did not answer are returned as that placeholder, so the list
+    starts at the first TTL and has one entry per TTL. Destinations are
+    started as long as fewer than ``max_sockets`` probes are outstanding.
+    Raises ``OSError`` when probe sockets cannot be created or configured
+    (no permission, address family not supported).
+    """
+    if isinstance(targets, Mapping):
+        first = dict(targets)
+    else:
+        first = dict.fromkeys(targets, 1)
+    queue = deque(_Trace(dest, ttl) for dest, ttl in first.items())
+    results: Dict[str, List[str]] = {}
+    active: List[_Trace] = []
+    open_count = 0
+    sel = selectors.DefaultSelector()
+
+    def close(trace: _Trace, sock: socket.socket) -> None:
+        nonlocal open_count
+        trace.pending.pop(sock, None)
+        sel.unregister(sock)
+        sock.close()
+        open_count -= 1
+
+    try:
+        while queue or active:
+            while queue:
+                need = max(1, max_hops - queue[0].first_ttl + 1)
+                if active and open_count + need > max_sockets:
+                    break
+                trace = queue.popleft()
+                trace.started = time.monotonic()
+                for ttl in range(trace.first_ttl, max_hops + 1):
+                    try:
+                        sock = _open_probe(trace, ttl)
+                    except OSError as e:
+                        if e.errno in _FATAL_ERRNOS:
+                            raise
+                        # e.g. no route to the destination: nothing to probe
+                        continue
+                    sel.register(sock, selectors.EVENT_READ, (trace, ttl))
+                    trace.pending[sock] = ttl
+                    open_count += 1
+                active.append(trace)
+
+            now = time.monotonic()
+            wait = min(t.started + timeout for t in active) - now
+            for key, _ in sel.select(max(0.0, wait)):
+                trace, ttl = key.data
+                sock = key.fileobj
+                if sock not in trace.pending:
+                    # closed earlier in this round after the target answered
+                    continue
+                try:
+                    _, ancdata, _, _ = sock.recvmsg(512, 512, socket.MSG_ERRQUEUE)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    close(trace, sock)
+                    continue
+                reply = _parse_error(ancdata)
+                close(trace, sock)
+                if reply is None:
+                    continue
+                router, terminal = reply
+                trace.hops[ttl] = router
+                if terminal and (trace.reached is None or ttl < trace.reached):
+                    trace.reached = ttl
+                    for other, other_ttl in list(trace.pending.items()):
+                        if other_ttl > ttl:
+                            close(trace, other)
+
+            now = time.monotonic()
+            for trace in [t for t in active if t.done(now, timeout)]:
+                for sock in list(trace.pending):
+                    close(trace, sock)
+                active.remove(trace)
+                results[trace.dest] = trace.result(silent)
+    finally:
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+    return {dest: results.get(dest, []) for dest in first}
+
+
+def trace(
+    dest: str,
+    *,
+    first_ttl: int = 1,
+    max_hops: int = MAX_HOPS,
+    timeout: float = PROBE_TIMEOUT,
+    silent: Optional[str] = None,
+) -> List[str]:
+    """Trace a single destination; see :func:`trace_many`."""
+    return trace_many({dest: first_ttl}, max_hops=max_hops, timeout=timeout, silent=silent)[dest]